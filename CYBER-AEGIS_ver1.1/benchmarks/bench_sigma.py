@@ -0,0 +1,194 @@
+# CYBER-AEGIS/benchmarks/bench_sigma.py
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+import subprocess
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.threat_intel.sigma_analyzer import SigmaAnalyzer
+from benchmarks.event_generator import SyntheticEventGenerator
+
+# --baseline で比較する指標と、値が大きいほど良いかどうか
+COMPARED_METRICS = {
+    ('load', 'cold_seconds'): False,
+    ('load', 'warm_seconds'): False,
+    ('throughput', 'events_per_second'): True,
+    ('latency_us', 'p50'): False,
+    ('latency_us', 'p99'): False,
+}
+
+
+def percentile(sorted_values, q):
+    """昇順に並んだ値のq分位点 (最近傍法)"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_analyzer(rule_dir, cache_path, logsource_filter):
+    """ルールセットを読み込み、(analyzer, 秒数)を返す。ルール読み込み時の出力は表示しない"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer = SigmaAnalyzer(rule_dirs=[rule_dir], logsource_filter=logsource_filter, cache_path=cache_path)
+    return analyzer, time.perf_counter() - start
+
+
+def measure_throughput(analyzer, events, batch_size, repeat):
+    """analyze_batchでまとめて評価した場合の events/s を repeat 回計り、各回の値を返す"""
+    rates = []
+    matches = 0
+    for _ in range(repeat):
+        matches = 0
+        start = time.perf_counter()
+        for i in range(0, len(events), batch_size):
+            matches += sum(len(m) for m in analyzer.analyze_batch(events[i:i + batch_size]))
+        elapsed = time.perf_counter() - start
+        rates.append(len(events) / elapsed if elapsed > 0 else 0.0)
+    return rates, matches
+
+
+def measure_latency(analyzer, events):
+    """1件ずつ analyze_log_entry を呼んだ場合の1件あたりの処理時間(マイクロ秒)を昇順で返す"""
+    clock = time.perf_counter_ns
+    latencies = []
+    for event in events:
+        start = clock()
+        analyzer.analyze_log_entry(event)
+        latencies.append((clock() - start) / 1000.0)
+    latencies.sort()
+    return latencies
+
+
+def compare(result, baseline):
+    """基準の結果からの変化率を表示する"""
+    for (section, metric), higher_is_better in COMPARED_METRICS.items():
+        current = result.get(section, {}).get(metric)
+        previous = baseline.get(section, {}).get(metric)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous * 100
+        better = change > 0 if higher_is_better else change < 0
+        verdict = 'better' if better else 'worse' if abs(change) >= 1 else 'same'
+        print(f"  {section}.{metric}: {previous} -> {current} ({change:+.1f}%, {verdict})")
+
+
+def run(args):
+    rule_dir = os.path.join(project_root, args.rules)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # キャッシュの無い初回読み込み(全ルールのパースとコンパイル)と、キャッシュからの読み込みを分けて計る
+        cache_path = os.path.join(cache_dir, 'sigma_rules.cache')
+        _, cold_seconds = load_analyzer(rule_dir, cache_path, args.logsource_filter)
+        analyzer, warm_seconds = load_analyzer(rule_dir, cache_path, args.logsource_filter)
+
+    generator = SyntheticEventGenerator(analyzer.rules, match_ratio=args.match_ratio,
+                                        cardinality=args.cardinality, seed=args.seed)
+    # ルールから組み立てた雛形のうち、実際にマッチするものだけを使う
+    templates = len(generator.templates)
+    generator.templates = [t for t in generator.templates
+                           if analyzer.analyze_log_entry(generator.event_from_template(t))]
+    events = generator.generate(args.events)
+
+    analyzer.analyze_batch(events[:args.warmup])
+    rates, matches = measure_throughput(analyzer, events, args.batch_size, args.repeat)
+    latencies = measure_latency(analyzer, events[:args.latency_events] if args.latency_events else events)
+    matched_events = sum(1 for m in analyzer.analyze_batch(events) if m)
+
+    return {
+        'benchmark': 'sigma_analyzer',
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'git_revision': _git_revision(),
+        },
+        'parameters': {
+            'rules': args.rules,
+            'events': args.events,
+            'match_ratio': args.match_ratio,
+            'cardinality': args.cardinality,
+            'seed': args.seed,
+            'batch_size': args.batch_size,
+            'repeat': args.repeat,
+            'logsource_filter': args.logsource_filter,
+        },
+        'ruleset': {
+            'rules': len(analyzer.compiled_rules),
+            'skipped': analyzer.ruleset.skipped,
+            'matching_templates': len(generator.templates),
+            'templates_tried': templates,
+        },
+        'load': {
+            'cold_seconds': round(cold_seconds, 3),
+            'warm_seconds': round(warm_seconds, 3),
+        },
+        'throughput': {
+            'events_per_second': round(statistics.median(rates), 1),
+            'runs': [round(rate, 1) for rate in rates],
+            'matches': matches,
+            'matched_events': matched_events,
+            'observed_match_ratio': round(matched_events / len(events), 4) if events else 0.0,
+        },
+        'latency_us': {
+            'samples': len(latencies),
+            'p50': round(percentile(latencies, 50), 1),
+            'p90': round(percentile(latencies, 90), 1),
+            'p99': round(percentile(latencies, 99), 1),
+            'max': round(latencies[-1], 1) if latencies else 0.0,
+            'mean': round(statistics.fmean(latencies), 1) if latencies else 0.0,
+        },
+        'index': analyzer.get_index_stats(),
+    }
+
+
+def main():
+    """合成ログでSigmaAnalyzerの読み込み時間・スループット・1件あたりの遅延を計測し、JSONで出力するCLI"""
+    parser = argparse.ArgumentParser(description="Benchmark SigmaAnalyzer against the rule tree with synthetic Windows events.")
+    parser.add_argument('--rules', default='rules/sigma', help="SIGMA rule directory (relative to the project root)")
+    parser.add_argument('--events', type=int, default=10000, help="number of synthetic events")
+    parser.add_argument('--match-ratio', type=float, default=0.01, help="fraction of events built to match a rule")
+    parser.add_argument('--cardinality', type=int, default=200, help="distinct values per field (images, users, hosts, ...)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=256, help="events per analyze_batch call")
+    parser.add_argument('--repeat', type=int, default=3, help="throughput runs (the median is reported)")
+    parser.add_argument('--warmup', type=int, default=1000, help="events evaluated before measuring")
+    parser.add_argument('--latency-events', type=int, default=2000, help="events timed one by one (0 = all)")
+    parser.add_argument('--logsource-filter', action='store_true', help="enable the logsource pre-filter")
+    parser.add_argument('--output', help="write the result JSON to this file")
+    parser.add_argument('--baseline', help="result JSON of an earlier run to compare with")
+    args = parser.parse_args()
+
+    result = run(args)
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.baseline} ({baseline.get('environment', {}).get('git_revision')}):")
+        compare(result, baseline)
+
+
+if __name__ == '__main__':
+    main()
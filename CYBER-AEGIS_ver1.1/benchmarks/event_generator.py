@@ -0,0 +1,240 @@
+# CYBER-AEGIS/benchmarks/event_generator.py
+import random
+import datetime
+
+from src.threat_intel.sigma_compiler import split_wildcards
+
+# SIGMAのlogsource(category / service)と、それを記録するチャンネル・イベントID
+SYSMON_CHANNEL = 'Microsoft-Windows-Sysmon/Operational'
+POWERSHELL_CHANNEL = 'Microsoft-Windows-PowerShell/Operational'
+CATEGORY_EVENTS = {
+    'process_creation': (SYSMON_CHANNEL, 1),
+    'network_connection': (SYSMON_CHANNEL, 3),
+    'driver_load': (SYSMON_CHANNEL, 6),
+    'image_load': (SYSMON_CHANNEL, 7),
+    'create_remote_thread': (SYSMON_CHANNEL, 8),
+    'process_access': (SYSMON_CHANNEL, 10),
+    'file_event': (SYSMON_CHANNEL, 11),
+    'registry_add': (SYSMON_CHANNEL, 12),
+    'registry_delete': (SYSMON_CHANNEL, 12),
+    'registry_set': (SYSMON_CHANNEL, 13),
+    'registry_event': (SYSMON_CHANNEL, 13),
+    'create_stream_hash': (SYSMON_CHANNEL, 15),
+    'pipe_created': (SYSMON_CHANNEL, 17),
+    'dns_query': (SYSMON_CHANNEL, 22),
+    'file_delete': (SYSMON_CHANNEL, 23),
+    'ps_module': (POWERSHELL_CHANNEL, 4103),
+    'ps_script': (POWERSHELL_CHANNEL, 4104),
+}
+SERVICE_CHANNELS = {
+    'security': 'Security',
+    'system': 'System',
+    'application': 'Application',
+    'powershell': POWERSHELL_CHANNEL,
+    'sysmon': SYSMON_CHANNEL,
+}
+
+# マッチ用のログを作れない(値から文字列を組み立てられない)修飾子
+_UNSUPPORTED_MODIFIERS = {'re', 'base64', 'base64offset', 'cidr', 'windash', 'expand', 'fieldref',
+                          'gt', 'gte', 'lt', 'lte', 'utf16', 'utf16le', 'utf16be', 'wide'}
+
+_SYSTEM_IMAGES = [
+    'C:\\Windows\\System32\\svchost.exe', 'C:\\Windows\\explorer.exe', 'C:\\Windows\\System32\\RuntimeBroker.exe',
+    'C:\\Windows\\System32\\taskhostw.exe', 'C:\\Windows\\System32\\conhost.exe', 'C:\\Windows\\System32\\dllhost.exe',
+    'C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe', 'C:\\Program Files\\Microsoft Office\\root\\Office16\\OUTLOOK.EXE',
+]
+_PROVIDERS = {
+    'Security': 'Microsoft-Windows-Security-Auditing',
+    SYSMON_CHANNEL: 'Microsoft-Windows-Sysmon',
+    POWERSHELL_CHANNEL: 'Microsoft-Windows-PowerShell',
+}
+
+
+class SyntheticEventGenerator:
+    """
+    EventLogCollectorが書き出す形式(winlog.channel / event_id / event_data)の合成ログを作る。
+    Security(4624 / 4625 / 4688)、Sysmon(1 / 3 / 11 / 13)、PowerShell(4104)の通常のログに、
+    ルールの検知条件から組み立てたマッチするはずのログを match_ratio の割合で混ぜる。
+    cardinalityは各フィールド(プロセス、ユーザー、ホスト、宛先など)が取りうる値の種類の数。
+    """
+
+    def __init__(self, rules=None, match_ratio=0.01, cardinality=200, seed=0):
+        self.random = random.Random(seed)
+        self.match_ratio = match_ratio
+        self.cardinality = max(1, cardinality)
+        self.record_id = 0
+        self.clock = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        self._build_pools()
+        self.templates = self.matching_templates(rules) if rules else []
+
+    def _build_pools(self):
+        r, n = self.random, self.cardinality
+        images = list(_SYSTEM_IMAGES)
+        images += [f"C:\\Program Files\\Vendor{i % 37}\\App{i}\\app{i}.exe" for i in range(max(0, n - len(images)))]
+        self.images = images[:n]
+        self.users = [f"user{i:04d}" for i in range(n)]
+        self.hosts = [f"WS-{i:05d}" for i in range(n)]
+        self.ips = [f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in range(1, n + 1)]
+        self.domains = [f"svc{i}.example.com" for i in range(n)]
+        self.files = [f"C:\\Users\\user{i % 97:04d}\\Documents\\report_{i}.docx" for i in range(n)]
+        self.registry_keys = [f"HKLM\\SOFTWARE\\Vendor{i % 37}\\App{i}\\Settings" for i in range(n)]
+        self.scripts = [f"Get-ChildItem -Path C:\\Data\\{i} | Measure-Object -Property Length -Sum" for i in range(n)]
+        self.arguments = [f"--profile {i} --log-level info" for i in range(n)]
+        r.shuffle(self.images)
+
+    def _next_header(self, channel, event_id):
+        self.record_id += 1
+        self.clock += datetime.timedelta(milliseconds=self.random.randint(1, 50))
+        return {
+            "@timestamp": self.clock.isoformat().replace('+00:00', 'Z'),
+            "winlog": {
+                "channel": channel,
+                "provider_name": _PROVIDERS.get(channel, channel),
+                "event_id": event_id,
+                "record_id": self.record_id,
+                "event_data": {},
+            },
+        }
+
+    def _benign(self):
+        r = self.random
+        kind = r.random()
+        image = r.choice(self.images)
+        user = r.choice(self.users)
+        host = r.choice(self.hosts)
+        if kind < 0.15:
+            event = self._next_header('Security', 4624)
+            event['winlog']['event_data'] = {
+                'TargetUserName': user, 'TargetDomainName': 'CORP', 'LogonType': str(r.choice([2, 3, 10])),
+                'IpAddress': r.choice(self.ips), 'WorkstationName': host,
+                'LogonProcessName': 'NtLmSsp', 'AuthenticationPackageName': 'NTLM',
+                'ProcessName': 'C:\\Windows\\System32\\lsass.exe',
+            }
+        elif kind < 0.2:
+            event = self._next_header('Security', 4625)
+            event['winlog']['event_data'] = {
+                'TargetUserName': user, 'TargetDomainName': 'CORP', 'LogonType': '3',
+                'IpAddress': r.choice(self.ips), 'WorkstationName': host, 'Status': '0xc000006d', 'SubStatus': '0xc000006a',
+            }
+        elif kind < 0.3:
+            event = self._next_header('Security', 4688)
+            event['winlog']['event_data'] = {
+                'NewProcessName': image, 'CommandLine': f'"{image}" {r.choice(self.arguments)}',
+                'ParentProcessName': r.choice(self.images), 'SubjectUserName': user, 'TokenElevationType': '%%1938',
+            }
+        elif kind < 0.6:
+            event = self._next_header(SYSMON_CHANNEL, 1)
+            parent = r.choice(self.images)
+            event['winlog']['event_data'] = {
+                'Image': image, 'CommandLine': f'"{image}" {r.choice(self.arguments)}',
+                'ParentImage': parent, 'ParentCommandLine': f'"{parent}"', 'User': f'CORP\\{user}',
+                'IntegrityLevel': 'Medium', 'CurrentDirectory': 'C:\\Windows\\System32\\',
+                'OriginalFileName': image.rsplit('\\', 1)[-1], 'Company': 'Example Corp', 'Product': 'Example App',
+                'Hashes': f"SHA256={r.getrandbits(256):064X}",
+            }
+        elif kind < 0.75:
+            event = self._next_header(SYSMON_CHANNEL, 3)
+            event['winlog']['event_data'] = {
+                'Image': image, 'User': f'CORP\\{user}', 'Protocol': 'tcp', 'Initiated': 'true',
+                'SourceIp': r.choice(self.ips), 'SourcePort': str(r.randint(49152, 65535)),
+                'DestinationIp': r.choice(self.ips), 'DestinationPort': str(r.choice([80, 443, 445, 8080])),
+                'DestinationHostname': r.choice(self.domains),
+            }
+        elif kind < 0.85:
+            event = self._next_header(SYSMON_CHANNEL, 11)
+            event['winlog']['event_data'] = {'Image': image, 'TargetFilename': r.choice(self.files), 'User': f'CORP\\{user}'}
+        elif kind < 0.95:
+            event = self._next_header(SYSMON_CHANNEL, 13)
+            event['winlog']['event_data'] = {
+                'Image': image, 'EventType': 'SetValue', 'TargetObject': r.choice(self.registry_keys),
+                'Details': f"DWORD (0x{r.randint(0, 255):08x})",
+            }
+        else:
+            event = self._next_header(POWERSHELL_CHANNEL, 4104)
+            event['winlog']['event_data'] = {
+                'MessageNumber': '1', 'MessageTotal': '1', 'ScriptBlockText': r.choice(self.scripts),
+                'ScriptBlockId': f"{r.getrandbits(128):032x}", 'Path': '',
+            }
+        return event
+
+    @staticmethod
+    def _literal(value):
+        """エスケープを外し、ワイルドカードを任意の1文字に置き換えた値"""
+        return ''.join(text if kind == 'literal' else 'x' for kind, text in split_wildcards(str(value)))
+
+    def _value_for(self, modifiers, values):
+        """修飾子付きの検知条件を満たす文字列を作る。作れなければNone"""
+        if any(m in _UNSUPPORTED_MODIFIERS for m in modifiers):
+            return None
+        values = values if isinstance(values, list) else [values]
+        values = [v for v in values if v is not None and not isinstance(v, (dict, list))]
+        if not values:
+            return None
+        if 'all' in modifiers:
+            return ' '.join(self._literal(v) for v in values)
+        value = self._literal(self.random.choice(values))
+        if 'contains' in modifiers:
+            return f"C:\\Temp\\{value} -q"
+        if 'endswith' in modifiers:
+            return f"C:\\Temp\\{value}"
+        if 'startswith' in modifiers:
+            return f"{value} -q"
+        return value
+
+    def _template_for(self, rule):
+        logsource = rule.get('logsource') or {}
+        detection = rule.get('detection')
+        if not isinstance(detection, dict):
+            return None
+        channel, event_id = CATEGORY_EVENTS.get(logsource.get('category'), (None, None))
+        if channel is None:
+            channel = SERVICE_CHANNELS.get(logsource.get('service'))
+        if channel is None:
+            return None
+
+        event_data = {}
+        for name, selection in detection.items():
+            if name == 'condition' or name.startswith('filter') or not isinstance(selection, dict):
+                continue
+            for key, values in selection.items():
+                field, *modifiers = key.split('|')
+                if field == 'EventID':
+                    candidates = values if isinstance(values, list) else [values]
+                    if candidates and isinstance(candidates[0], int):
+                        event_id = candidates[0]
+                    continue
+                value = self._value_for(modifiers, values)
+                if value is None:
+                    return None
+                event_data[field] = value
+        if not event_data:
+            return None
+        return channel, event_id or 0, event_data
+
+    def matching_templates(self, rules):
+        """ルールの検知条件から、マッチするはずのログの雛形 (チャンネル, イベントID, event_data) を作る"""
+        templates = []
+        for rule in rules:
+            try:
+                template = self._template_for(rule)
+            except Exception:
+                template = None
+            if template is not None:
+                templates.append(template)
+        return templates
+
+    def event_from_template(self, template):
+        channel, event_id, event_data = template
+        event = self._next_header(channel, event_id)
+        event['winlog']['event_data'] = dict(event_data)
+        return event
+
+    def generate(self, count):
+        """count件のログを返す"""
+        events = []
+        for _ in range(count):
+            if self.templates and self.random.random() < self.match_ratio:
+                events.append(self.event_from_template(self.random.choice(self.templates)))
+            else:
+                events.append(self._benign())
+        return events
@@ -181,6 +181,7 @@ class DashboardView(QWidget):
         if clear_existing: self.model.removeRows(0, self.model.rowCount())
         threat_colors = {"LOW": QColor("#2ecc71"), "MEDIUM": QColor("#f1c40f"), "HIGH": QColor("#e67e22"), "CRITICAL": QColor("#c0392b")}
         auto_defense_enabled = self.config_manager.get_boolean('Automation', 'auto_defense_enabled')
+        new_incidents = []
         for conn in reversed(connections):
             is_new_event = 'id' not in conn
             if is_new_event:
@@ -195,7 +196,7 @@ class DashboardView(QWidget):
                         notifier.show_notification(title=f"🛡️ ネットワーク脅威を自動ブロックしました", message=f"プロセス '{conn.get('name')}' から '{ip_to_block}' への通信をブロックリストに追加しました。")
                 elif conn.get("threat_level") == "CRITICAL":
                     notifier.show_notification(title=f"🚨 CRITICALなネットワーク脅威を検知", message=f"プロセス '{conn.get('name')}' が '{conn.get('destination')}' へ接続しました。")
-                self.db_manager.add_network_incident(conn)
+                new_incidents.append(conn)
             
             row = [QStandardItem(conn.get("id", "N/A")), QStandardItem(conn.get("name", "N/A")), QStandardItem(conn.get("time")), QStandardItem(conn.get("destination")), QStandardItem(conn.get("threat_level")), QStandardItem(conn.get("status"))]
             threat_item = row[4]
@@ -203,6 +204,12 @@ class DashboardView(QWidget):
             threat_item.setBackground(threat_colors.get(conn.get("threat_level"), QColor("gray")))
             if clear_existing: self.model.appendRow(row)
             else: self.model.insertRow(0, row)
+        # 今回の更新で検知した通信は1回のトランザクションでまとめて保存する。
+        # 1件ずつの add_network_incident と違い、保存済みのIDと重複したものは例外にならず読み飛ばされる
+        if new_incidents:
+            inserted = self.db_manager.add_network_incident_many(new_incidents)
+            if len(inserted) < len(new_incidents):
+                print(f"[Dashboard] {len(new_incidents) - len(inserted)} network incidents were already stored and were skipped.")
         if not clear_existing: self.incident_table.sortByColumn(0, Qt.SortOrder.DescendingOrder)
 
     def on_incident_selected(self, index):
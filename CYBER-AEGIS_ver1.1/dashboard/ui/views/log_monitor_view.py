@@ -42,7 +42,7 @@ class SigmaTableModel(QAbstractTableModel):
     def __init__(self, data, parent=None):
         super().__init__(parent)
         self._data = data
-        self.headers = ["ID", "検知時刻", "ルールタイトル", "脅威レベル"]
+        self.headers = ["ID", "検知時刻", "ルールタイトル", "脅威レベル", "件数"]
 
     def rowCount(self, parent=None):
         return len(self._data)
@@ -61,6 +61,7 @@ class SigmaTableModel(QAbstractTableModel):
             if col == 1: return row_data.timestamp.strftime('%Y-%m-%d %H:%M:%S') if row_data.timestamp else ""
             if col == 2: return row_data.rule_title
             if col == 3: return row_data.rule_level.upper() if row_data.rule_level else ""
+            if col == 4: return str(row_data.hit_count or 1) # 抑制ウィンドウ内で集約された同じアラートの数
             return None
 
         if role == Qt.ItemDataRole.BackgroundRole and col == 3:
@@ -119,6 +120,7 @@ class LogMonitorView(QWidget):
         header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
         header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
         header.setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(4, QHeaderView.ResizeMode.ResizeToContents)
         
         self.refresh_button = QPushButton("手動更新")
         self.refresh_button.clicked.connect(self.load_data)
@@ -199,6 +201,7 @@ class LogMonitorView(QWidget):
                 "タイムスタンプ": match.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
                 "ルールタイトル": match.rule_title,
                 "深刻度": match.rule_level.upper() if match.rule_level else "",
+                "検知回数": match.hit_count or 1,
                 "元ログ": match.log_entry
             }
             self.start_ai_analysis()
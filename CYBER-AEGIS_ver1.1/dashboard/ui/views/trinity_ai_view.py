@@ -160,7 +160,10 @@ class TrinityAIView(QWidget):
 
     def load_history(self):
         self.history_list.clear()
-        simulations = self.db_manager.get_all_trinity_simulations()
+        # 一覧には出力本文は不要なため、IDと実行時刻だけを新しい順に読む
+        simulations = self.db_manager.get_trinity_simulations_page(
+            limit=500, sort='simulation_time', columns=('id', 'simulation_time')
+        )['items']
         for sim in simulations:
             item = QListWidgetItem(f"ID:{sim['id']}: {sim['simulation_time']}")
             item.setData(Qt.ItemDataRole.UserRole, sim['id'])
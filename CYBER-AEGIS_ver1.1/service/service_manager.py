@@ -71,9 +71,11 @@ class ServiceManager:
         if log_monitor_enabled:
             print("[ServiceManager] Log Monitoring service is enabled.")
             log_file = self.config.get('log_monitoring', 'log_file', fallback='logs/security_events.log')
+            # log_files にカンマ区切りでパスやglobパターン(例: logs/hosts/*.jsonl)を書くと、まとめて1つのワーカーで監視する
+            log_files = self.config.get_list('log_monitoring', 'log_files') or [log_file]
             sigma_rules_path = 'rules/sigma'
             
-            self.log_monitor_worker = LogMonitorWorker(log_file, sigma_rules_path)
+            self.log_monitor_worker = LogMonitorWorker(log_files, sigma_rules_path)
             log_thread = threading.Thread(target=self.log_monitor_worker.start, daemon=True, name="LogMonitor")
             self.threads.append(log_thread)
 
@@ -27,15 +27,18 @@ class SNSManager:
         all_collected_text = []
         if 'github' in keywords_map and keywords_map.get('github'):
             gh_leaks = self.github_collector.fetch_leaks(keywords_map['github'])
+            # ソースごとに1回のトランザクションでまとめて登録する
+            new_gh_leaks = self.db.add_github_leak_many(gh_leaks)
             for leak in gh_leaks:
-                self.db.add_github_leak(leak)
                 all_collected_text.append(leak.get('repository', ''))
                 all_collected_text.extend(leak.get('matches', []))
+            print(f"[SNSManager] GitHub: {len(new_gh_leaks)} new of {len(gh_leaks)} leaks.")
         if self.x_enabled and 'x' in keywords_map and keywords_map.get('x'):
             x_leaks = self.x_collector.fetch_leaks(keywords_map['x'])
+            new_x_leaks = self.db.add_x_leak_many(x_leaks)
             for leak in x_leaks:
-                self.db.add_x_leak(leak)
                 all_collected_text.append(leak.get('tweet_text', ''))
+            print(f"[SNSManager] X: {len(new_x_leaks)} new of {len(x_leaks)} leaks.")
         
         if all_collected_text:
             self._discover_and_add_discord_invites(all_collected_text)
@@ -43,9 +46,8 @@ class SNSManager:
         if 'pastebin' in keywords_map and keywords_map['pastebin']:
             print(f"[SNSManager] Scanning Pastebin...")
             pastebin_leaks = run_pastebin_collector_sync()
-            for leak in pastebin_leaks:
-                self.db.add_pastebin_leak(leak)
-            print(f"[SNSManager] Found {len(pastebin_leaks)} potential leaks on Pastebin.")
+            new_pastebin_leaks = self.db.add_pastebin_leak_many(pastebin_leaks)
+            print(f"[SNSManager] Found {len(pastebin_leaks)} potential leaks on Pastebin ({len(new_pastebin_leaks)} new).")
 
         all_discord_invites = self.config.get_list('SNS_MONITOR', 'discord_server_invites')
         if not all_discord_invites:
@@ -56,6 +58,7 @@ class SNSManager:
         
         print(f"[SNSManager] Starting prioritized Discord analysis for a batch of {len(batch_to_scan)} servers...")
         all_server_data = run_discord_collector_sync(batch_to_scan)
+        discord_leaks = []
         
         for server_data in all_server_data:
             server_info = server_data['server_info']
@@ -85,13 +88,17 @@ class SNSManager:
                 for message in messages:
                     for keyword in personal_keywords:
                         if keyword.lower() in message['message_text'].lower():
-                            self.db.add_discord_leak({
+                            discord_leaks.append({
                                 "timestamp": datetime.now(timezone.utc).isoformat(), "source": "Discord", "keyword": keyword,
                                 "server": server_info['name'], "channel": message['channel_name'], "author": message['author'], 
                                 "message_text": message['message_text'],
                                 "url": f"https://discord.com/channels/{server_info.get('id', 'N/A')}/{message.get('channel_id', 'N/A')}/{message.get('message_id', 'N/A')}"
                             })
                             break
+
+        if discord_leaks:
+            new_discord_leaks = self.db.add_discord_leak_many(discord_leaks)
+            print(f"[SNSManager] Discord: {len(new_discord_leaks)} new of {len(discord_leaks)} leaks.")
         
         print(f"[SNSManager] Scan batch complete. Full knowledge base contains {len(all_discord_invites)} servers.")
 
@@ -105,12 +112,14 @@ class SNSManager:
                 print(f"[SNSManager] Discovered {len(new_codes)} new Discord invite codes.")
                 self.config.add_to_list('SNS_MONITOR', 'discord_server_invites', new_codes)
 
-    def get_all_leaks_unified(self, sort_by_relevance=True):
-        gh_leaks = self.db.get_all_github_leaks()
-        x_leaks = self.db.get_all_x_leaks() if self.x_enabled else []
-        discord_leaks = self.db.get_all_discord_leaks()
-        pastebin_leaks = self.db.get_all_pastebin_leaks()
-        all_leaks = gh_leaks + x_leaks + discord_leaks + pastebin_leaks
+    def get_all_leaks_unified(self, sort_by_relevance=True, limit_per_source=None):
+        # 全件を読むと表示が止まるため、ソースごとに新しいものから limit_per_source 件までを読む
+        if limit_per_source is None:
+            limit_per_source = int(self.config.get('SNS_MONITOR', 'leak_list_limit', fallback='1000'))
+        sources = ['github', 'x', 'discord', 'pastebin'] if self.x_enabled else ['github', 'discord', 'pastebin']
+        all_leaks = []
+        for source in sources:
+            all_leaks.extend(self.db.get_leaks_page(source, limit=limit_per_source, sort='timestamp')['items'])
         if sort_by_relevance and all_leaks:
             network_events = self.db.get_all_network_incidents(limit=200)
             file_events = self.db.get_all_file_events(limit=500)
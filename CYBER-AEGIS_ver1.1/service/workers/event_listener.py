@@ -0,0 +1,343 @@
+import os
+import re
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+logger = logging.getLogger(__name__)
+
+# RFC5424: <PRI>VERSION TIMESTAMP HOSTNAME APP-NAME PROCID MSGID STRUCTURED-DATA [MSG]
+_SYSLOG_HEADER = re.compile(r'<(\d{1,3})>(\d{1,2}) (\S+) (\S+) (\S+) (\S+) (\S+) ')
+_SD_PARAM = re.compile(r'\s*([^\s=\]"]+)="((?:[^"\\]|\\.)*)"')
+_SD_UNESCAPE = re.compile(r'\\(["\\\]])')
+# RFC6587のoctet-counting形式 ("長さ SP メッセージ")
+_OCTET_COUNT = re.compile(rb'(\d{1,6}) ')
+
+
+def parse_address(value):
+    """'host:port' を (host, port) に変換する"""
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def _parse_structured_data(text):
+    """STRUCTURED-DATA部分を {SD-ID: {名前: 値}} と、その後ろの残り(MSG)に分ける"""
+    data = {}
+    pos = 0
+    while pos < len(text) and text[pos] == '[':
+        end_id = pos + 1
+        while end_id < len(text) and text[end_id] not in ' ]':
+            end_id += 1
+        params = data.setdefault(text[pos + 1:end_id], {})
+        pos = end_id
+        while True:
+            match = _SD_PARAM.match(text, pos)
+            if not match:
+                break
+            params[match.group(1)] = _SD_UNESCAPE.sub(r'\1', match.group(2))
+            pos = match.end()
+        if pos >= len(text) or text[pos] != ']':
+            return None, text
+        pos += 1
+    return data, text[pos:]
+
+
+def _nil(value):
+    return None if value == '-' else value
+
+
+def parse_syslog(line):
+    """
+    RFC5424形式の1行をログのdictに変換する。本文がJSONオブジェクトならそれをログ本体とし、
+    そうでなければ 'message' に入れる。ヘッダーの項目は 'syslog' にまとめる。形式が違えばNoneを返す。
+    """
+    header = _SYSLOG_HEADER.match(line)
+    if not header:
+        return None
+    pri, _, timestamp, hostname, app_name, procid, msgid = header.groups()
+    rest = line[header.end():]
+    if rest.startswith('-'):
+        structured, message = None, rest[1:]
+    else:
+        structured, message = _parse_structured_data(rest)
+    message = message[1:] if message.startswith(' ') else message
+    if message.startswith('\ufeff'):
+        message = message[1:]
+
+    event = None
+    if message.startswith('{'):
+        try:
+            event = json.loads(message)
+        except json.JSONDecodeError:
+            event = None
+    if not isinstance(event, dict):
+        event = {'message': message}
+
+    pri = int(pri)
+    event['syslog'] = {
+        'facility': pri >> 3,
+        'severity': pri & 7,
+        'hostname': _nil(hostname),
+        'appname': _nil(app_name),
+        'procid': _nil(procid),
+        'msgid': _nil(msgid),
+        'structured_data': structured,
+    }
+    if _nil(timestamp) and '@timestamp' not in event:
+        event['@timestamp'] = timestamp
+    return event
+
+
+def parse_event_line(line):
+    """1行のNDJSONまたはRFC5424 syslogをログのdictに変換する。解釈できなければNoneを返す"""
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        return event if isinstance(event, dict) else None
+    if line.startswith('<'):
+        return parse_syslog(line)
+    return None
+
+
+class _TcpProtocol(asyncio.Protocol):
+    """1つのTCP接続。改行区切り(NDJSON/syslog)とoctet-counting形式の両方を受け付ける"""
+
+    def __init__(self, listener):
+        self.listener = listener
+        self.buffer = b''
+        self.source = None
+
+    def connection_made(self, transport):
+        peer = transport.get_extra_info('peername')
+        self.source = f"tcp://{peer[0]}" if peer else "tcp://unknown"
+        self.listener.connections += 1
+
+    def connection_lost(self, exc):
+        self.listener.connections -= 1
+        if self.buffer.strip():
+            self.listener.receive(self.source, [self.buffer])
+        self.buffer = b''
+
+    def data_received(self, data):
+        buffer = self.buffer + data
+        lines = []
+        pos = 0
+        while pos < len(buffer):
+            counted = _OCTET_COUNT.match(buffer, pos)
+            if counted:
+                end = counted.end() + int(counted.group(1))
+                if end > len(buffer):
+                    break
+                lines.append(buffer[counted.end():end])
+                pos = end
+                continue
+            newline = buffer.find(b'\n', pos)
+            if newline < 0:
+                break
+            lines.append(buffer[pos:newline])
+            pos = newline + 1
+        self.buffer = buffer[pos:]
+        if len(self.buffer) > self.listener.max_line:
+            # 改行の無い巨大な入力は捨てる
+            self.listener.invalid += 1
+            self.buffer = b''
+        if lines:
+            self.listener.receive(self.source, lines)
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    """UDPは1データグラムに1行以上のログが入っているものとして扱う"""
+
+    def __init__(self, listener):
+        self.listener = listener
+
+    def datagram_received(self, data, addr):
+        self.listener.receive(f"udp://{addr[0]}", data.split(b'\n'))
+
+
+class EventListener:
+    """
+    TCP/UDPでNDJSONとRFC5424 syslogを受信し、送信元ごとに batch_size 件か flush_interval_ms ごとに
+    まとめてsinkに渡すasyncioのリスナー。イベントループは専用のスレッドで動く。
+    sink(ログのリスト, 送信元)はこのスレッドから呼ばれ、待たされている間は受信も止まる
+    (TCPは送信側が待たされ、UDPはOSの受信バッファがあふれた分が失われる)。
+    """
+
+    def __init__(self, sink, tcp=None, udp=None, batch_size=500, flush_interval_ms=50, max_line=1 << 20,
+                 udp_buffer=8 << 20):
+        self.sink = sink
+        self.tcp = parse_address(tcp) if isinstance(tcp, str) else tcp
+        self.udp = parse_address(udp) if isinstance(udp, str) else udp
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(1, flush_interval_ms) / 1000.0
+        self.max_line = max_line
+        self.udp_buffer = udp_buffer
+        self._buffers = {}
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._startup_error = None
+        self._stopped = None
+        self.started_at = None
+        self.connections = 0
+        self.received = 0
+        self.events = 0
+        self.invalid = 0
+        self.batches = 0
+        self.sink_errors = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="EventListener", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._startup_error:
+            self._thread.join()
+            raise self._startup_error
+
+    def stop(self):
+        """受信済みのログをsinkに渡してから止める"""
+        if self._loop and self._stopped and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        finally:
+            self._loop.close()
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        servers = []
+        try:
+            if self.tcp:
+                servers.append(await loop.create_server(lambda: _TcpProtocol(self), *self.tcp))
+                print(f"[EventListener] Listening for TCP events on {self.tcp[0]}:{self.tcp[1]}")
+            if self.udp:
+                transport, _ = await loop.create_datagram_endpoint(lambda: _UdpProtocol(self), local_addr=self.udp)
+                try:
+                    # 一時的に処理が遅れても取りこぼさないよう、受信バッファを大きくしておく
+                    transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.udp_buffer)
+                except OSError:
+                    pass
+                servers.append(transport)
+                print(f"[EventListener] Listening for UDP events on {self.udp[0]}:{self.udp[1]}")
+        except OSError as e:
+            for server in servers:
+                server.close()
+            self._startup_error = e
+            self._ready.set()
+            return
+
+        self.started_at = time.perf_counter()
+        self._ready.set()
+        try:
+            while not self._stopped.is_set():
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.flush()
+        finally:
+            for server in servers:
+                server.close()
+            self.flush()
+
+    def receive(self, source, lines):
+        """受信した行をパースして送信元ごとのバッファに加え、batch_size に達したらsinkに渡す"""
+        buffer = self._buffers.get(source)
+        if buffer is None:
+            buffer = self._buffers[source] = []
+        for line in lines:
+            if not line.strip():
+                continue
+            self.received += 1
+            event = parse_event_line(line.decode('utf-8', errors='replace'))
+            if event is None:
+                self.invalid += 1
+                continue
+            buffer.append(event)
+            if len(buffer) >= self.batch_size:
+                self._emit(source, buffer)
+                buffer = self._buffers[source] = []
+
+    def flush(self):
+        for source, buffer in list(self._buffers.items()):
+            if buffer:
+                self._emit(source, buffer)
+        self._buffers = {}
+
+    def _emit(self, source, events):
+        try:
+            self.sink(events, source)
+        except Exception as e:
+            self.sink_errors += 1
+            print(f"[EventListener] Failed to hand over {len(events)} events from {source}: {e}")
+            logger.error(f"Failed to hand over {len(events)} events from {source}: {e}", exc_info=True)
+            return
+        self.events += len(events)
+        self.batches += 1
+
+    def get_stats(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'connections': self.connections,
+            'received': self.received,
+            'events': self.events,
+            'invalid': self.invalid,
+            'batches': self.batches,
+            'sink_errors': self.sink_errors,
+            'events_per_second': round(self.events / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+def main():
+    """受信だけを行い(SIGMA評価なし)、受信性能を確認するためのCLI。負荷は event_loadgen で与える"""
+    parser = argparse.ArgumentParser(description="Run the event listener with a counting sink and report throughput.")
+    parser.add_argument('--tcp', help="TCP address to listen on (host:port)")
+    parser.add_argument('--udp', help="UDP address to listen on (host:port)")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=0, help="stop after this many seconds (0 = until Ctrl+C)")
+    args = parser.parse_args()
+    if not args.tcp and not args.udp:
+        parser.error("specify --tcp and/or --udp")
+
+    listener = EventListener(lambda events, source: None, tcp=args.tcp, udp=args.udp, batch_size=args.batch_size)
+    listener.start()
+    deadline = time.monotonic() + args.duration if args.duration > 0 else None
+    last_events, last_time = 0, time.perf_counter()
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(1)
+            now = time.perf_counter()
+            stats = listener.get_stats()
+            rate = (stats['events'] - last_events) / (now - last_time)
+            last_events, last_time = stats['events'], now
+            if rate:
+                print(f"[EventListener] {rate:,.0f} events/s (total {stats['events']}, invalid {stats['invalid']}, "
+                      f"connections {stats['connections']})")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()
+    print(json.dumps(listener.get_stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import time
+import socket
+import random
+import argparse
+import datetime
+import threading
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from service.workers.event_listener import parse_address
+
+_SAMPLE_EVENTS = [
+    {"winlog": {"channel": "Security", "event_id": 4688, "computer_name": "WS01",
+                "event_data": {"NewProcessName": "C:\\Windows\\System32\\cmd.exe",
+                               "CommandLine": "cmd.exe /c whoami", "ParentProcessName": "C:\\Windows\\explorer.exe"}}},
+    {"winlog": {"channel": "Microsoft-Windows-Sysmon/Operational", "event_id": 1, "computer_name": "WS02",
+                "event_data": {"Image": "C:\\Windows\\System32\\WindowsPowerShell\\v1.0\\powershell.exe",
+                               "CommandLine": "powershell -nop -w hidden -enc SQBFAFgA",
+                               "ParentImage": "C:\\Windows\\System32\\cmd.exe"}}},
+    {"winlog": {"channel": "Security", "event_id": 4624, "computer_name": "DC01",
+                "event_data": {"TargetUserName": "alice", "LogonType": "3", "IpAddress": "10.0.0.15"}}},
+]
+
+
+def load_events(path):
+    events = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('{'):
+                events.append(json.loads(line))
+    return events
+
+
+def encode_events(events, fmt, count):
+    """送信するデータを事前に組み立てておく (生成側がボトルネックにならないように)"""
+    lines = []
+    for i in range(count):
+        event = dict(events[i % len(events)])
+        event['@timestamp'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        body = json.dumps(event, ensure_ascii=False)
+        if fmt == 'syslog':
+            body = f"<134>1 {event['@timestamp']} loadgen aegis-loadgen {os.getpid()} - - {body}"
+        lines.append(body.encode('utf-8') + b'\n')
+    return lines
+
+
+def send_tcp(address, lines, rate, batch, results, index):
+    sent = 0
+    with socket.create_connection(address) as sock:
+        start = time.perf_counter()
+        for i in range(0, len(lines), batch):
+            chunk = lines[i:i + batch]
+            sock.sendall(b''.join(chunk))
+            sent += len(chunk)
+            if rate:
+                # 指定レートを超えないよう、予定時刻まで待つ
+                delay = start + sent / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    results[index] = sent
+
+
+def send_udp(address, lines, rate, batch, results, index):
+    sent = 0
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        start = time.perf_counter()
+        for i, line in enumerate(lines, 1):
+            sock.sendto(line, address)
+            sent += 1
+            if rate and i % batch == 0:
+                delay = start + sent / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    results[index] = sent
+
+
+def main():
+    """EventListenerにNDJSONまたはRFC5424 syslogのイベントを送り込むローカル負荷生成ツール"""
+    parser = argparse.ArgumentParser(description="Send synthetic events to the event listener.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--tcp', help="listener TCP address (host:port)")
+    target.add_argument('--udp', help="listener UDP address (host:port)")
+    parser.add_argument('--format', choices=['json', 'syslog'], default='json')
+    parser.add_argument('--count', type=int, default=100000, help="events per connection")
+    parser.add_argument('--connections', type=int, default=1)
+    parser.add_argument('--rate', type=float, default=0, help="events/s per connection (0 = as fast as possible)")
+    parser.add_argument('--batch', type=int, default=100, help="events per send")
+    parser.add_argument('--events', help="JSONL file to take event bodies from (default: built-in samples)")
+    args = parser.parse_args()
+
+    events = load_events(args.events) if args.events else _SAMPLE_EVENTS
+    random.shuffle(events)
+    lines = encode_events(events, args.format, args.count)
+    address = parse_address(args.tcp or args.udp)
+    sender = send_tcp if args.tcp else send_udp
+
+    results = [0] * args.connections
+    threads = [threading.Thread(target=sender, args=(address, lines, args.rate, args.batch, results, i))
+               for i in range(args.connections)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = sum(results)
+    print(f"[EventLoadGen] Sent {total} {args.format} events over {args.connections} "
+          f"{'TCP' if args.tcp else 'UDP'} connection(s) in {elapsed:.2f}s ({total / elapsed:,.0f} events/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,9 @@
 import win32evtlog
 import time
 import os
-import xml.etree.ElementTree as ET
 import json
 import sys
+import datetime
 
 # プロジェクトのルートディレクトリをPythonのパスに追加
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -11,6 +11,8 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from src.utils.config_manager import ConfigManager
+from src.threat_intel.winlog_parser import parse_event_xml
+from service.workers.latency_tracer import COLLECTED_FIELD
 
 class EventLogCollector:
     def __init__(self):
@@ -45,7 +47,9 @@ class EventLogCollector:
                 events = win32evtlog.EvtNext(query_handle, 1)
                 if events:
                     xml_content = win32evtlog.EvtRender(events[0], win32evtlog.EvtRenderEventXml)
-                    self.last_record_ids[channel] = int(ET.fromstring(xml_content).find('{http://schemas.microsoft.com/win/2004/08/events/event}System').find('{http://schemas.microsoft.com/win/2004/08/events/event}EventRecordID').text)
+                    parsed_event = self.parse_event_xml(xml_content, channel)
+                    if parsed_event:
+                        self.last_record_ids[channel] = parsed_event["winlog"]["record_id"]
             except win32evtlog.error:
                 pass # チャンネルが存在しない場合は何もしない
 
@@ -69,11 +73,14 @@ class EventLogCollector:
                     break
                 
                 for event in events:
+                    # XMLへの変換とパースはイベントごとに1回だけ行い、結果をそのまま書き出しに使う
                     xml_content = win32evtlog.EvtRender(event, win32evtlog.EvtRenderEventXml)
-                    record_id = int(ET.fromstring(xml_content).find('{http://schemas.microsoft.com/win/2004/08/events/event}System').find('{http://schemas.microsoft.com/win/2004/08/events/event}EventRecordID').text)
+                    parsed_event = self.parse_event_xml(xml_content, channel)
+                    if parsed_event is None:
+                        continue
                     
-                    if record_id > self.last_record_ids.get(channel, 0):
-                        events_to_process.append(event)
+                    if parsed_event["winlog"]["record_id"] > self.last_record_ids.get(channel, 0):
+                        events_to_process.append(parsed_event)
                     else:
                         break
                 else:
@@ -84,12 +91,12 @@ class EventLogCollector:
                 return
 
             latest_id_in_batch = 0
+            # 書き出した時刻を残し、LogMonitorWorker側で収集から検知までの遅延を計測できるようにする
+            collected_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
             with open(self.output_log_file, 'a', encoding='utf-8') as f:
-                for event in reversed(events_to_process):
-                    xml_content = win32evtlog.EvtRender(event, win32evtlog.EvtRenderEventXml)
-                    parsed_event = self.parse_event_xml(xml_content, channel)
-
+                for parsed_event in reversed(events_to_process):
                     if parsed_event:
+                        parsed_event[COLLECTED_FIELD] = collected_at
                         event_id = parsed_event.get("winlog", {}).get("event_id")
                         # --- ▼ここから修正 (フィルターロジックを確実に動作させる) ---
                         if self.include_event_ids:
@@ -112,39 +119,4 @@ class EventLogCollector:
             print(f"CRITICAL: チャンネル '{channel}' の処理中に予期せぬエラー: {e}")
 
     def parse_event_xml(self, xml_content, channel):
-        try:
-            root = ET.fromstring(xml_content)
-            ns = {'e': 'http://schemas.microsoft.com/win/2004/08/events/event'}
-            
-            system_part = root.find('e:System', ns)
-            event_id = int(system_part.find('e:EventID', ns).text)
-            record_id = int(system_part.find('e:EventRecordID', ns).text) # record_idを追加
-            provider = system_part.find('e:Provider', ns).get('Name')
-            
-            event_data_part = root.find('e:EventData', ns)
-            event_data = {}
-            if event_data_part is not None:
-                for data in event_data_part.findall('e:Data', ns):
-                    key = data.get('Name')
-                    value = data.text
-                    if key:
-                        event_data[key] = value
-
-            user_data_part = root.find('e:UserData', ns)
-            if user_data_part is not None:
-                 for elem in user_data_part.iter():
-                     if '}' in elem.tag:
-                         key = elem.tag.split('}')[-1]
-                         event_data[key] = elem.text
-
-            return {
-                "winlog": {
-                    "channel": channel,
-                    "provider_name": provider,
-                    "event_id": event_id,
-                    "record_id": record_id, # record_idを追加
-                    "event_data": event_data
-                }
-            }
-        except Exception:
-            return None
\ No newline at end of file
+        return parse_event_xml(xml_content, channel)
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.threat_intel.winlog_parser import parse_event_xml
+
+# EVTXの読み込みにはpython-evtxを使う。ライブのイベントログ収集(EventLogCollector)には不要なため任意の依存とする
+try:
+    from Evtx.Evtx import Evtx
+except ImportError:
+    Evtx = None
+
+logger = logging.getLogger(__name__)
+
+
+def _require_evtx():
+    if Evtx is None:
+        raise RuntimeError("python-evtx is required to read .evtx files (pip install python-evtx)")
+
+
+def chunk_count(path):
+    """EVTXファイルのチャンク(64KB単位でレコードを格納するブロック)の数"""
+    _require_evtx()
+    with Evtx(path) as log:
+        return log.get_file_header().chunk_count()
+
+
+def read_chunks(path, first, count, include_event_ids=None):
+    """
+    first番目からcount個のチャンクのレコードを読み、(ログのリスト, レコード数, 変換できなかった数)を返す。
+    プロセスプールの各プロセスで実行する。各レコードのXMLは1回だけパースする。
+    """
+    _require_evtx()
+    events = []
+    records = 0
+    errors = 0
+    with Evtx(path) as log:
+        for chunk in itertools.islice(log.chunks(), first, first + count):
+            for record in chunk.records():
+                records += 1
+                try:
+                    event = parse_event_xml(record.xml())
+                except Exception:
+                    event = None
+                if event is None:
+                    errors += 1
+                    continue
+                if include_event_ids and event['winlog']['event_id'] not in include_event_ids:
+                    continue
+                events.append(event)
+    return events, records, errors
+
+
+class EvtxReader:
+    """
+    EVTXファイルをチャンク単位に分け、プロセスプールで並列にレコードをEventLogCollectorと同じ形式のdictへ変換する。
+    結果はファイル内の順序どおりに (ファイル, ログのリスト) として順次返すため、全件をメモリに載せる必要はない。
+    processesが0ならこのプロセス内で順に読む。
+    """
+
+    def __init__(self, paths, processes=None, chunks_per_task=4, include_event_ids=None):
+        _require_evtx()
+        self.paths = paths
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.chunks_per_task = max(1, chunks_per_task)
+        self.include_event_ids = include_event_ids
+        self.stats = {'files': 0, 'chunks': 0, 'records': 0, 'events': 0, 'errors': 0}
+
+    def _tasks(self):
+        for path in self.paths:
+            try:
+                chunks = chunk_count(path)
+            except Exception as e:
+                print(f"[EvtxReader] Cannot open {path}: {e}")
+                logger.error(f"Cannot open {path}: {e}", exc_info=True)
+                continue
+            self.stats['files'] += 1
+            self.stats['chunks'] += chunks
+            for first in range(0, chunks, self.chunks_per_task):
+                yield path, first, min(self.chunks_per_task, chunks - first)
+
+    def iter_batches(self):
+        if self.processes <= 0:
+            for path, first, count in self._tasks():
+                yield self._collect(path, read_chunks(path, first, count, self.include_event_ids))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            # 先読みするタスク数を抑えて、読み込みが処理(SIGMA評価や書き出し)より先行しすぎないようにする
+            pending = []
+            tasks = self._tasks()
+            for path, first, count in tasks:
+                pending.append((path, executor.submit(read_chunks, path, first, count, self.include_event_ids)))
+                if len(pending) >= self.processes * 2:
+                    path, future = pending.pop(0)
+                    yield self._collect(path, future.result())
+            for path, future in pending:
+                yield self._collect(path, future.result())
+
+    def _collect(self, path, result):
+        events, records, errors = result
+        self.stats['records'] += records
+        self.stats['events'] += len(events)
+        self.stats['errors'] += errors
+        return path, events
+
+
+def main():
+    """エクスポートされたEVTXファイルを読み込み、JSONLに書き出すかSIGMAパイプラインで評価するCLI"""
+    parser = argparse.ArgumentParser(description="Convert exported .evtx files to JSONL or run them through the SIGMA pipeline.")
+    parser.add_argument('files', nargs='+', help=".evtx files")
+    parser.add_argument('--jsonl', help="write events to this JSONL file instead of running SIGMA rules")
+    parser.add_argument('--rules', default='rules/sigma', help="SIGMA rule directory (relative to the project root)")
+    parser.add_argument('--processes', type=int, default=None, help="parser processes (0 = in-process, default: CPU count)")
+    parser.add_argument('--chunks-per-task', type=int, default=4, help="EVTX chunks (64 KiB each) per parser task")
+    parser.add_argument('--event-ids', help="comma-separated event IDs to keep")
+    parser.add_argument('--since', help="only events at or after this time (ISO 8601 or UNIX time)")
+    parser.add_argument('--until', help="only events before this time (ISO 8601 or UNIX time)")
+    args = parser.parse_args()
+
+    include_event_ids = {int(eid) for eid in args.event_ids.split(',')} if args.event_ids else None
+    paths = [os.path.abspath(p) for p in args.files]
+    reader = EvtxReader(paths, processes=args.processes, chunks_per_task=args.chunks_per_task,
+                        include_event_ids=include_event_ids)
+
+    start = time.perf_counter()
+    if args.jsonl:
+        with open(args.jsonl, 'w', encoding='utf-8') as f:
+            for _, events in reader.iter_batches():
+                for event in events:
+                    f.write(json.dumps(event, ensure_ascii=False) + '\n')
+        result = dict(reader.stats)
+    else:
+        from service.workers.log_monitor import LogMonitorWorker
+
+        worker = LogMonitorWorker(paths[0], args.rules)
+        try:
+            result = worker.replay_events(reader.iter_batches(), since=args.since, until=args.until)
+        finally:
+            worker.stop()
+        result['evtx'] = dict(reader.stats)
+    elapsed = time.perf_counter() - start
+    print(f"[EvtxReader] {reader.stats['records']} records from {reader.stats['files']} files "
+          f"({reader.stats['chunks']} chunks) in {elapsed:.2f}s, {reader.stats['errors']} unparseable")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
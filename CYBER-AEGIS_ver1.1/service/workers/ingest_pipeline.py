@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import queue
+import logging
+import threading
+import collections
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class PipelineStage:
+    """
+    パイプラインの1段。入力キューからバッチを取り出してhandlerを適用し、結果を次段のキューに渡す。
+    キューには上限があるため、後段が詰まると put が待たされ、その影響は読み取り側まで順に伝わる。
+    handlerが例外を送出した場合は、同じバッチを retry_delay 秒おきに再試行する(その間は後続も待たされる)。
+    max_retries回再試行しても失敗するバッチ(入力によって必ず失敗するもの)は dead_letters に移して先へ進む。
+    その場合も読み取り位置は次段へ渡すため、同じバッチを読み直し続けることはない。max_retriesがNoneなら無制限に再試行する。
+    """
+
+    def __init__(self, name, handler, maxsize=8, retry_delay=5.0, max_retries=None, dead_letter_size=100):
+        self.name = name
+        self.handler = handler
+        self.inbox = queue.Queue(maxsize=maxsize)
+        self.next_stage = None
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        # 処理できなかったバッチの記録 (新しいものからdead_letter_size件)
+        self.dead_letters = collections.deque(maxlen=dead_letter_size)
+        self._thread = None
+        self._abort = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.dead_lettered = 0
+        self.blocked_puts = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.total_wait_ms = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"Pipeline-{self.name}", daemon=True)
+        self._thread.start()
+
+    def join(self):
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def put(self, batch, position=None):
+        """バッチを受け付ける。キューが満杯なら空くまで待つ"""
+        if self.inbox.full():
+            with self._stats_lock:
+                self.blocked_puts += 1
+        self.inbox.put((time.perf_counter(), batch, position))
+
+    def close(self):
+        """受付済みのバッチを処理し終えたら停止するよう伝える"""
+        self.inbox.put(_END)
+
+    def abort(self):
+        """失敗中のバッチの再試行を打ち切る (停止時用)"""
+        self._abort.set()
+
+    def _run(self):
+        dropped = False
+        while True:
+            item = self.inbox.get()
+            if item is _END:
+                if self.next_stage:
+                    self.next_stage.close()
+                return
+            if dropped:
+                # 破棄したバッチより後の位置を保存すると、その行が読み直されなくなるため後続も流さない
+                continue
+            enqueued_at, batch, position = item
+            started = time.perf_counter()
+            ok, result = self._handle(batch, position)
+            finished = time.perf_counter()
+            if not ok:
+                dropped = True
+                continue
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                elapsed_ms = (finished - started) * 1000
+                self.total_ms += elapsed_ms
+                self.max_ms = max(self.max_ms, elapsed_ms)
+                self.total_wait_ms += (started - enqueued_at) * 1000
+            if self.next_stage and (result is not None or position is not None):
+                self.next_stage.put(result if result is not None else [], position)
+
+    def _handle(self, batch, position):
+        attempts = 0
+        while True:
+            try:
+                return True, self.handler(batch, position)
+            except Exception as e:
+                attempts += 1
+                with self._stats_lock:
+                    self.errors += 1
+                print(f"[PipelineStage] Error in stage '{self.name}': {e}")
+                logger.error(f"Error in pipeline stage '{self.name}': {e}", exc_info=True)
+                if self.max_retries is not None and attempts > self.max_retries:
+                    self._dead_letter(batch, position, e)
+                    return True, None
+                # 停止中なら諦める。チェックポイントは進まないため、このバッチは次回起動時に読み直される
+                if self._abort.wait(self.retry_delay):
+                    return False, None
+
+    def _dead_letter(self, batch, position, error):
+        with self._stats_lock:
+            self.dead_lettered += 1
+            self.dead_letters.append({
+                'time': time.time(),
+                'items': len(batch),
+                'position': position,
+                'error': repr(error),
+                'sample': repr(batch[0])[:300] if batch else None,
+            })
+        print(f"[PipelineStage] Gave up on a batch of {len(batch)} items in stage '{self.name}': {error}")
+        logger.error(f"Dropped a batch of {len(batch)} items in pipeline stage '{self.name}' "
+                     f"after {self.max_retries} retries: {error}")
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self.inbox.qsize(),
+                'queue_capacity': self.inbox.maxsize,
+                'batches': self.batches,
+                'items': self.items,
+                'avg_ms': round(self.total_ms / self.batches, 2) if self.batches else 0.0,
+                'max_ms': round(self.max_ms, 2),
+                'avg_wait_ms': round(self.total_wait_ms / self.batches, 2) if self.batches else 0.0,
+                'blocked_puts': self.blocked_puts,
+                'errors': self.errors,
+                'dead_lettered': self.dead_lettered,
+            }
+
+
+class IngestPipeline:
+    """
+    読み取り → パース → 照合 → 保存 の各段を、上限付きキューでつないだパイプライン。
+    読み取りは呼び出し元のスレッドが put で行い、以降の各段はそれぞれ専用のスレッドで動く。
+    各段は受け取った順に処理するため、読み取り位置(position)も順番どおりに保存段まで届く。
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def put(self, batch, position=None):
+        self.stages[0].put(batch, position)
+
+    def put_to(self, name, batch, position=None):
+        """途中の段に直接バッチを渡す (パース済みのログを照合段から流す場合など)"""
+        for stage in self.stages:
+            if stage.name == name:
+                stage.put(batch, position)
+                return
+        raise KeyError(name)
+
+    def stop(self):
+        """受付済みのバッチを最後まで処理してから止める。失敗中のバッチは再試行せずに破棄する"""
+        for stage in self.stages:
+            stage.abort()
+        self.stages[0].close()
+        for stage in self.stages:
+            stage.join()
+
+    def get_stats(self):
+        return {stage.name: stage.get_stats() for stage in self.stages}
@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import logging
+import threading
+from collections import deque
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.threat_intel.sigma_correlation import parse_event_time
+
+logger = logging.getLogger(__name__)
+
+# EventLogCollectorがログファイルに書き出した時刻を記録するフィールド
+COLLECTED_FIELD = '@collected'
+
+# 区間名と、その始点・終点の時刻の名前。'event'と'collected'はログごと、それ以外はバッチごとの時刻
+SEGMENTS = (
+    ('collect', 'event', 'collected'),          # イベント発生 → EventLogCollectorの書き出し
+    ('poll', 'collected', 'read'),              # 書き出し → LogMonitorWorkerの読み取り
+    ('parse_queue', 'read', 'parse_start'),
+    ('parse', 'parse_start', 'parsed'),
+    ('match_queue', 'parsed', 'match_start'),
+    ('match', 'match_start', 'matched'),
+    ('persist_queue', 'matched', 'persist_start'),
+    ('persist', 'persist_start', 'committed'),  # 書き込みスレッドの待ち時間とコミットを含む
+)
+
+# ヒストグラムの区切り (ミリ秒)。0.1msから倍々で約1時間まで
+_BUCKET_BOUNDS_MS = tuple(0.1 * 2 ** i for i in range(26))
+
+
+class LatencyHistogram:
+    """対数間隔のバケットで遅延を数える。分位点はバケットの上限値で近似する"""
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, value_ms, count=1):
+        value_ms = max(0.0, value_ms)
+        self.counts[bisect.bisect_left(_BUCKET_BOUNDS_MS, value_ms)] += count
+        self.count += count
+        self.total_ms += value_ms * count
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= rank and bucket:
+                return min(_BUCKET_BOUNDS_MS[i], self.max_ms) if i < len(_BUCKET_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 2) if self.count else 0.0,
+            'p50_ms': round(self.percentile(50), 2),
+            'p90_ms': round(self.percentile(90), 2),
+            'p99_ms': round(self.percentile(99), 2),
+            'max_ms': round(self.max_ms, 2),
+        }
+
+
+class BatchTrace:
+    """
+    パイプラインを流れる1バッチの各段の時刻(UNIX時刻)。各段のスレッドが順に mark し、保存段のコミット後に
+    LatencyTracer.finish で集計する。プロセスプール内の処理時間は span で加える。
+    """
+    __slots__ = ('source', 'marks', 'events', 'spans', 'samples')
+
+    def __init__(self, source, read_at=None):
+        self.source = source
+        self.marks = {'read': read_at if read_at is not None else time.time()}
+        # ログごとの (イベント発生時刻, 書き出し時刻)
+        self.events = []
+        self.spans = []
+        # 全区間を記録するログ (バッチ内の位置, 識別情報)
+        self.samples = []
+
+    def mark(self, name, when=None):
+        self.marks[name] = when if when is not None else time.time()
+
+    def span(self, name, seconds, count=1):
+        self.spans.append((name, seconds, count))
+
+
+class LatencyTracer:
+    """
+    ログの発生から照合結果のコミットまでを区間ごとに計測し、区間ごとのヒストグラムに集計する。
+    sample_rate の割合のログについては全区間の時刻を保存し、get_traces で参照できる(trace_pathがあればJSONLにも追記する)。
+    集計は各段のスレッドから呼ばれるため、ロックで保護する。
+    """
+
+    def __init__(self, sample_rate=0.001, max_traces=200, trace_path=None):
+        self.sample_rate = sample_rate
+        self.trace_path = trace_path
+        self.traces = deque(maxlen=max(1, max_traces))
+        self.histograms = {name: LatencyHistogram() for name, _, _ in SEGMENTS}
+        self.histograms['total'] = LatencyHistogram()
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self.batches = 0
+
+    def start_batch(self, source, read_at=None):
+        return BatchTrace(source, read_at)
+
+    def add_events(self, trace, log_entries):
+        """パース済みのログから発生時刻と書き出し時刻を取り出し、記録対象のログを選ぶ"""
+        for i, entry in enumerate(log_entries):
+            trace.events.append((parse_event_time(entry.get('@timestamp')), parse_event_time(entry.get(COLLECTED_FIELD))))
+            if self.sample_rate > 0 and self._random.random() < self.sample_rate:
+                winlog = entry.get('winlog') if isinstance(entry.get('winlog'), dict) else {}
+                trace.samples.append((i, {
+                    'channel': winlog.get('channel'),
+                    'event_id': winlog.get('event_id'),
+                    'record_id': winlog.get('record_id'),
+                }))
+
+    def finish(self, trace):
+        """コミット済みのバッチの各区間を集計する"""
+        marks = trace.marks
+        count = len(trace.events) or 1
+        committed = marks.get('committed')
+        with self._lock:
+            self.batches += 1
+            for name, start, end in SEGMENTS[2:]:
+                if start in marks and end in marks:
+                    self.histograms[name].add((marks[end] - marks[start]) * 1000, count)
+            for name, seconds, span_count in trace.spans:
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = LatencyHistogram()
+                histogram.add(seconds * 1000, span_count)
+            for event_at, collected_at in trace.events:
+                if event_at is not None and collected_at is not None:
+                    self.histograms['collect'].add((collected_at - event_at) * 1000)
+                if collected_at is not None:
+                    self.histograms['poll'].add((marks['read'] - collected_at) * 1000)
+                origin = collected_at if collected_at is not None else event_at
+                if origin is not None and committed is not None:
+                    self.histograms['total'].add((committed - origin) * 1000)
+
+        if trace.samples:
+            self._record_samples(trace)
+
+    def _record_samples(self, trace):
+        records = []
+        for index, identity in trace.samples:
+            event_at, collected_at = trace.events[index] if index < len(trace.events) else (None, None)
+            stamps = {'event': event_at, 'collected': collected_at}
+            stamps.update(trace.marks)
+            segments = {}
+            for name, start, end in SEGMENTS:
+                if stamps.get(start) is not None and stamps.get(end) is not None:
+                    segments[name] = round((stamps[end] - stamps[start]) * 1000, 2)
+            for name, seconds, _ in trace.spans:
+                # プールのチャンクは並列に処理されるため、バッチ内で最も長かったものを採る
+                segments[name] = max(segments.get(name, 0.0), round(seconds * 1000, 2))
+            origin = collected_at if collected_at is not None else event_at
+            if origin is not None and stamps.get('committed') is not None:
+                segments['total'] = round((stamps['committed'] - origin) * 1000, 2)
+            records.append({'source': trace.source, **identity, 'stamps': stamps, 'segments_ms': segments})
+        with self._lock:
+            self.traces.extend(records)
+            if self.trace_path:
+                try:
+                    with open(self.trace_path, 'a', encoding='utf-8') as f:
+                        for record in records:
+                            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                except OSError as e:
+                    logger.error(f"Failed to write latency traces to {self.trace_path}: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self.histograms.items() if histogram.count}
+
+    def get_traces(self, limit=None):
+        """直近に記録したログごとの全区間の時刻を新しい順に返す"""
+        with self._lock:
+            traces = list(self.traces)
+        traces.reverse()
+        return traces[:limit] if limit else traces
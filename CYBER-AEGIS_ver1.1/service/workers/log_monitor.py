@@ -3,127 +3,560 @@ import os
 import json
 import sys
 import logging
-import datetime
-import traceback
+import threading
+import argparse
+import itertools
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from src.database.db_manager import get_session
-from src.database.models import SigmaMatch
+from src.database.models import LogCheckpoint
 from src.threat_intel.sigma_analyzer import SigmaAnalyzer
+from src.threat_intel.sigma_cache import DEFAULT_CACHE_PATH
+from src.threat_intel.sigma_correlation import SigmaCorrelationEngine, event_time, parse_event_time
+from src.threat_intel.sigma_normalizer import normalize_event
+from src.utils.config_manager import ConfigManager
+from service.workers.sigma_pool import SigmaProcessPool
+from service.workers.sigma_rule_watcher import SigmaRuleWatcher
+from service.workers.log_tailer import MultiLogTailer
+from service.workers.match_writer import SigmaMatchWriter
+from src.threat_intel.sigma_suppression import DEFAULT_SUPPRESSION_FIELDS, SigmaSuppressor
+from service.workers.ingest_pipeline import IngestPipeline, PipelineStage
+from service.workers.event_listener import EventListener
+from service.workers.latency_tracer import LatencyTracer
 
 logger = logging.getLogger(__name__)
 
-# --- ▼▼▼【最終修正点】▼▼▼ ---
-# json.dumpsが日付オブジェクトを文字列に変換できるようにするためのヘルパー関数
-def json_serial_converter(o):
-    """日付や時刻オブジェクトをISO形式の文字列に変換します。"""
-    if isinstance(o, (datetime.datetime, datetime.date)):
-        return o.isoformat()
-    # それ以外の変換できない型があった場合にエラーを出す
-    raise TypeError(f"Object of type {o.__class__.__name__} is not JSON serializable")
-# --- ▲▲▲ 修正はここまで ▲▲▲ ---
-
 class LogMonitorWorker:
     def __init__(self, log_file_path, sigma_rule_path):
-        if not os.path.dirname(log_file_path):
-            log_file_path = os.path.join('logs', log_file_path)
-
-        self.log_file_path = os.path.join(project_root, log_file_path)
+        # 1つのパス、またはパスとglobパターンのリストを受け付ける。すべて1つのスレッドで読み取る
+        log_paths = [log_file_path] if isinstance(log_file_path, str) else list(log_file_path)
+        self.log_paths = []
+        for path in log_paths:
+            if not os.path.dirname(path):
+                path = os.path.join('logs', path)
+            self.log_paths.append(os.path.join(project_root, path))
+        self.log_file_path = self.log_paths[0]
         self.sigma_rule_path = os.path.join(project_root, sigma_rule_path)
         
+        config = ConfigManager()
+        logsource_filter = config.get_boolean('log_monitoring', 'logsource_filter', fallback=False)
+        self.stats_interval = int(config.get('log_monitoring', 'stats_interval', fallback='1000'))
+        # 0ならこのスレッド内で評価し、1以上ならその数のプロセスで並列に評価する
+        self.worker_processes = int(config.get('log_monitoring', 'worker_processes', fallback='0'))
+        self.batch_size = int(config.get('log_monitoring', 'batch_size', fallback='256'))
+        # ファイル変更の通知が使えない場合の確認間隔(秒)
+        self.tail_poll_interval = float(config.get('log_monitoring', 'tail_poll_interval', fallback='1'))
+        # globパターンに一致する新しいファイルを探す間隔(秒)
+        self.log_rescan_interval = float(config.get('log_monitoring', 'log_rescan_interval', fallback='10'))
+        # 読み取り・パース・照合・保存の各段の間のキューに置けるバッチ数。満杯になると前段が待たされる
+        self.pipeline_queue_size = int(config.get('log_monitoring', 'pipeline_queue_size', fallback='8'))
+        self.pipeline = None
+        self.tailer = None
+        # ファイルを経由せずにTCP/UDPでNDJSONやRFC5424 syslogを受け取る (例: 127.0.0.1:5514。空なら無効)
+        self.listen_tcp = config.get('log_monitoring', 'listen_tcp', fallback='').strip()
+        self.listen_udp = config.get('log_monitoring', 'listen_udp', fallback='').strip()
+        self.listener_batch_size = int(config.get('log_monitoring', 'listener_batch_size', fallback='500'))
+        self.listener = None
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        # ルールディレクトリの変更を検知して、再起動せずにルールを差し替える
+        self.rule_hot_reload = config.get_boolean('log_monitoring', 'rule_hot_reload', fallback=True)
+        self.rule_reload_interval = float(config.get('log_monitoring', 'rule_reload_interval', fallback='30'))
+        self.rule_watcher = None
+
+        # 空文字を指定するとルールセットのキャッシュを使わない
+        rule_cache = config.get('log_monitoring', 'rule_cache', fallback=DEFAULT_CACHE_PATH)
+        cache_path = os.path.join(project_root, rule_cache) if rule_cache else None
+
+        # ログの発生からコミットまでの区間ごとの遅延を集計する。latency_sample_rate の割合のログは全区間の時刻を残し、
+        # latency_trace_path を指定するとJSONLにも追記する
+        self.tracer = None
+        if config.get_boolean('log_monitoring', 'latency_tracing', fallback=True):
+            trace_path = config.get('log_monitoring', 'latency_trace_path', fallback='').strip()
+            self.tracer = LatencyTracer(
+                sample_rate=float(config.get('log_monitoring', 'latency_sample_rate', fallback='0.001')),
+                trace_path=os.path.join(project_root, trace_path) if trace_path else None
+            )
         self.session = get_session()
-        self.analyzer = SigmaAnalyzer(rule_dirs=[self.sigma_rule_path])
+        # 同じルールが同じプロセス・コマンドライン・ホストで suppression_window 秒以内に繰り返しマッチした場合は、
+        # 1行にまとめてヒット数と最終検知時刻を更新する。0で無効
+        suppression_window = float(config.get('log_monitoring', 'suppression_window', fallback='60'))
+        suppressor = None
+        if suppression_window > 0:
+            suppressor = SigmaSuppressor(
+                window=suppression_window,
+                fields=config.get_list('log_monitoring', 'suppression_fields') or DEFAULT_SUPPRESSION_FIELDS,
+                max_keys=int(config.get('log_monitoring', 'suppression_max_keys', fallback='10000'))
+            )
+        # マッチの保存は専用スレッドでまとめて行う。writer_flush_rows 行か writer_flush_ms ミリ秒の早い方でコミットする
+        # writer_durability: full(既定) / normal / off (SQLiteのPRAGMA synchronous)
+        # writer_max_retries: コミットの再試行回数。超えたバッチは諦め、そのファイルのチェックポイントを進めない
+        self.writer = SigmaMatchWriter(
+            checkpoint_path=self.log_file_path,
+            flush_rows=int(config.get('log_monitoring', 'writer_flush_rows', fallback='500')),
+            flush_interval_ms=int(config.get('log_monitoring', 'writer_flush_ms', fallback='200')),
+            durability=config.get('log_monitoring', 'writer_durability', fallback='full').strip().lower(),
+            suppressor=suppressor,
+            tracer=self.tracer,
+            max_retries=int(config.get('log_monitoring', 'writer_max_retries', fallback='5'))
+        )
+        # ルールごとの評価時間・マッチ数を計測し、rule_profile_interval 秒ごとに rule_profile_path へJSONで書き出す
+        # 計測中はルールごとに時刻を取るため評価が遅くなる。既定では無効
+        rule_profiling = config.get_boolean('log_monitoring', 'rule_profiling', fallback=False)
+        rule_profile_path = config.get('log_monitoring', 'rule_profile_path', fallback='rule_profile.json')
+        self.rule_profile_path = os.path.join(project_root, rule_profile_path)
+        self.rule_profile_interval = float(config.get('log_monitoring', 'rule_profile_interval', fallback='300'))
+        self._last_profile_dump = time.monotonic()
+        self.analyzer = SigmaAnalyzer(rule_dirs=[self.sigma_rule_path], logsource_filter=logsource_filter,
+                                      cache_path=cache_path, profiling=rule_profiling)
+        # 相関ルールの時間窓集計。ウィンドウの分割数と、ルールごとに保持するグループ数の上限を設定できる
+        self.correlator = SigmaCorrelationEngine(
+            self.analyzer.ruleset.correlation_rules,
+            buckets=int(config.get('log_monitoring', 'correlation_buckets', fallback='12')),
+            max_groups=int(config.get('log_monitoring', 'correlation_max_groups', fallback='10000'))
+        )
         self.running = False
-        print(f"Log Monitor Worker initialized for: {self.log_file_path}")
+        self.processed_events = 0
+        print(f"Log Monitor Worker initialized for: {', '.join(self.log_paths)}")
         print(f"Loaded {len(self.analyzer.rules)} SIGMA rules.")
+        index_stats = self.analyzer.get_index_stats()
+        print(f"SIGMA rule index: {index_stats['indexed_keys']} field keys, "
+              f"{index_stats['unconstrained_rules']} always-evaluated rules, logsource filter={logsource_filter}")
+        correlation_stats = self.correlator.get_stats()
+        print(f"Loaded {correlation_stats['rules']} SIGMA correlation rules "
+              f"({correlation_stats['skipped_rules']} unsupported).")
 
     def start(self):
         self.running = True
+        if self.worker_processes > 0:
+            self.pool = SigmaProcessPool(self.analyzer, self.worker_processes)
+        if self.rule_hot_reload:
+            self.rule_watcher = SigmaRuleWatcher(self.analyzer, on_reload=self.on_rules_reloaded,
+                                                 poll_interval=self.rule_reload_interval)
+            self.rule_watcher.start()
+        self.writer.start()
         print("Log Monitor Worker started. Now polling for file changes...")
-        
-        last_position = 0
-        if os.path.exists(self.log_file_path):
-             with open(self.log_file_path, 'r', encoding='utf-8') as f:
-                f.seek(0, 2)
-                last_position = f.tell()
+        try:
+            self._poll_loop()
+        finally:
+            self.writer.stop()
+            if self.rule_watcher:
+                self.rule_watcher.stop()
+                self.rule_watcher = None
+            with self._pool_lock:
+                if self.pool:
+                    self.pool.shutdown()
+                    self.pool = None
 
-        while self.running:
+    def _poll_loop(self):
+        # ファイルごとに前回の停止位置から再開する。チェックポイントが無ければ従来どおりファイル末尾から監視する
+        self.tailer = MultiLogTailer(self.log_paths, checkpoint_loader=self._load_checkpoint,
+                                     poll_interval=self.tail_poll_interval, rescan_interval=self.log_rescan_interval)
+        # パースの失敗は入力によるもので再試行しても変わらないため、すぐに諦めて次のバッチへ進む。
+        # 照合の失敗(プールの障害など)と保存の失敗は一時的な状態による場合があるため、停止するまで再試行する。
+        # ここで諦めるとチェックポイントが進み、そのバッチのマッチが失われる
+        self.pipeline = IngestPipeline([
+            PipelineStage('parser', self._parse_stage, self.pipeline_queue_size, max_retries=0),
+            PipelineStage('matcher', self._match_stage, self.pipeline_queue_size),
+            PipelineStage('sink', self._sink_stage, self.pipeline_queue_size),
+        ])
+        self.tailer.start()
+        self.pipeline.start()
+        if self.listen_tcp or self.listen_udp:
+            self.listener = EventListener(self._receive_events, tcp=self.listen_tcp or None, udp=self.listen_udp or None,
+                                          batch_size=self.listener_batch_size)
             try:
-                if not os.path.exists(self.log_file_path):
-                    print(f"Log file not found at {self.log_file_path}. Waiting for it to be created.")
-                    time.sleep(2)
-                    continue
-
-                with open(self.log_file_path, 'r', encoding='utf-8') as f:
-                    f.seek(last_position)
-                    new_lines = f.readlines()
-                    if new_lines:
-                         last_position = f.tell()
-                
-                if new_lines:
-                    for line in new_lines:
-                        self.process_line(line)
-                
-                time.sleep(1) 
-            except Exception as e:
-                print(f"Error in LogMonitorWorker loop: {e}")
-                logger.error(f"Error in LogMonitorWorker loop: {e}", exc_info=True)
-                time.sleep(5)
-    
+                self.listener.start()
+            except OSError as e:
+                print(f"Failed to start the event listener: {e}")
+                logger.error(f"Failed to start the event listener: {e}", exc_info=True)
+                self.listener = None
+        try:
+            while self.running:
+                try:
+                    batches = self.tailer.read_batches()
+                    if not batches:
+                        if not any(os.path.exists(path) for path in self.tailer.tailers):
+                            print(f"Log file not found at {', '.join(self.log_paths)}. Waiting for it to be created.")
+                        self.tailer.wait()
+                        continue
+                    # 後段が詰まっている間はここで待たされ、その分だけファイルの読み取りが遅れる
+                    for path, lines, position in batches:
+                        trace = self.tracer.start_batch(path) if self.tracer else None
+                        self.pipeline.put(lines, (path, position, trace))
+                except Exception as e:
+                    print(f"Error in LogMonitorWorker loop: {e}")
+                    logger.error(f"Error in LogMonitorWorker loop: {e}", exc_info=True)
+                    time.sleep(5)
+        finally:
+            if self.listener:
+                self.listener.stop()
+            self.pipeline.stop()
+            self.tailer.stop()
+
+    def _load_checkpoint(self, path=None):
+        path = path or self.log_file_path
+        try:
+            checkpoint = self.session.get(LogCheckpoint, path)
+        except Exception as e:
+            logger.error(f"Failed to load log checkpoint: {e}", exc_info=True)
+            self.session.rollback()
+            return None
+        if checkpoint is None:
+            return None
+        print(f"Resuming {path} from byte offset {checkpoint.offset}.")
+        return checkpoint.inode, checkpoint.offset
+
     def process_line(self, line):
-        line = line.strip()
-        if not line:
+        self.process_lines([line])
+
+    def process_lines(self, lines, position=None):
+        """
+        複数行をまとめてパース・評価し、元の行順でマッチ結果を保存する。
+        positionを渡すと、マッチ結果と同じトランザクションでチェックポイントを更新する。
+        """
+        matched = self._match_stage(self._parse_lines(lines))
+        if matched or position is not None:
+            self.save_matches_batch(matched, position)
+
+    def _receive_events(self, events, source):
+        """受信したログはパース済みなので、照合段に直接渡す。チェックポイントは無い"""
+        trace = None
+        if self.tracer:
+            trace = self.tracer.start_batch(source)
+            self.tracer.add_events(trace, events)
+            trace.mark('parsed')
+        self.pipeline.put_to('matcher', events, (source, None, trace))
+
+    def _parse_stage(self, lines, cursor):
+        """パイプラインのパース段"""
+        trace = cursor[2]
+        if trace is None:
+            return self._parse_lines(lines)
+        trace.mark('parse_start')
+        log_entries = self._parse_lines(lines)
+        self.tracer.add_events(trace, log_entries)
+        trace.mark('parsed')
+        return log_entries
+
+    def _sink_stage(self, matched, cursor):
+        """パイプラインの保存段。cursorは(読み取り元のパス, (inode, offset), BatchTrace)"""
+        path, position, trace = cursor
+        if trace is not None:
+            trace.mark('persist_start')
+        self.save_matches_batch(matched, position, source=path, trace=trace)
+
+    def _match_stage(self, log_entries, cursor=None):
+        """パイプラインの照合段。batch_size件ずつ評価し、マッチしたログだけを(ログ, マッチ)の組で返す"""
+        trace = cursor[2] if cursor else None
+        if trace is not None:
+            trace.mark('match_start')
+        matched = []
+        for i in range(0, len(log_entries), self.batch_size):
+            batch = log_entries[i:i + self.batch_size]
+            results = self._analyze_entries(batch, trace)
+            matched.extend((entry, matches) for entry, matches in zip(batch, results) if matches)
+        if trace is not None:
+            trace.mark('matched')
+        return matched
+
+    def _parse_lines(self, lines, verbose=True):
+        log_entries = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                log_entry = json.loads(line)
+            except json.JSONDecodeError:
+                if verbose:
+                    print(f"Skipping non-JSON line: {line[:100]}")
+                continue
+            # 配列や数値など、オブジェクト以外のJSONはログとして扱えない
+            if not isinstance(log_entry, dict):
+                if verbose:
+                    print(f"Skipping non-object JSON line: {line[:100]}")
+                continue
+            log_entries.append(log_entry)
+        return log_entries
+
+    def _analyze_entries(self, log_entries, trace=None):
+        """SIGMA評価と相関処理を行い、ログごとのマッチ(相関アラートを含む)のリストを返す"""
+        with self._pool_lock:
+            if self.pool:
+                results = self.pool.analyze_batch(log_entries, trace)
+            else:
+                results = self.analyzer.analyze_batch(log_entries)
+
+        for i, (log_entry, matches) in enumerate(zip(log_entries, results)):
+            self.processed_events += 1
+            if self.stats_interval > 0 and self.processed_events % self.stats_interval == 0:
+                self.report_index_stats()
+            if matches:
+                # 相関アラートも通常のマッチと同じくSigmaMatchとして保存する
+                results[i] = matches + self.correlator.process(log_entry, matches)
+        if (self.analyzer.profiler is not None
+                and time.monotonic() - self._last_profile_dump >= self.rule_profile_interval):
+            self.dump_rule_profile()
+        return results
+
+    def replay(self, log_paths, offset=0, since=None, until=None):
+        """
+        既存のログファイル(JSONL)を先頭から最大速度で再処理する。待機は行わず、マッチはバッチ単位でまとめて保存する。
+        offsetは最初のファイルの読み始めのバイト位置、since/untilはイベント時刻(ISO形式またはUNIX時刻)の範囲。
+        時間範囲を指定した場合、時刻を持たないログは対象外になる。
+        """
+        stats = {'files': 0, 'lines': 0, 'end_offset': 0}
+
+        def batches():
+            for file_index, log_path in enumerate(log_paths):
+                if not self.running:
+                    break
+                with open(log_path, 'rb') as f:
+                    if file_index == 0 and offset > 0:
+                        # 行の途中から始まる場合は、その行の残りを読み飛ばす
+                        f.seek(offset - 1)
+                        if f.read(1) != b'\n':
+                            f.readline()
+                    while self.running:
+                        lines = [line.decode('utf-8', errors='replace') for line in itertools.islice(f, self.batch_size)]
+                        if not lines:
+                            break
+                        stats['lines'] += len(lines)
+                        yield log_path, self._parse_lines(lines, verbose=False)
+                    stats['end_offset'] = f.tell()
+                stats['files'] += 1
+
+        return self.replay_events(batches(), since=since, until=until, stats=stats)
+
+    def replay_events(self, batches, since=None, until=None, stats=None):
+        """
+        (読み取り元, ログのリスト)を順に返すイテラブルを、replayと同じく最大速度で評価・保存する。
+        ファイル以外の入力(EVTXなど)からパース済みのログを流し込むために使う。
+        """
+        since_ts = parse_event_time(since) if since is not None else None
+        until_ts = parse_event_time(until) if until is not None else None
+        stats = stats if stats is not None else {}
+        stats.update({'events': 0, 'filtered': 0, 'matched_events': 0, 'matches': 0})
+        sources = set()
+
+        self.running = True
+        if self.worker_processes > 0:
+            self.pool = SigmaProcessPool(self.analyzer, self.worker_processes)
+        # 再処理ではマッチごとの出力を行わない。位置を渡さないためチェックポイントも更新されない
+        writer_verbose, self.writer.verbose = self.writer.verbose, False
+        self.writer.start()
+        start = time.perf_counter()
+        try:
+            for source, log_entries in batches:
+                sources.add(source)
+                if since_ts is not None or until_ts is not None:
+                    selected = [entry for entry in log_entries
+                                if self._in_time_range(entry, since_ts, until_ts)]
+                    stats['filtered'] += len(log_entries) - len(selected)
+                    log_entries = selected
+                for i in range(0, len(log_entries), self.batch_size):
+                    self._replay_batch(log_entries[i:i + self.batch_size], stats, source=source)
+                if not self.running:
+                    break
+            self.writer.flush()
+        finally:
+            self.writer.stop()
+            self.writer.verbose = writer_verbose
+            with self._pool_lock:
+                if self.pool:
+                    self.pool.shutdown()
+                    self.pool = None
+            self.running = False
+
+        elapsed = time.perf_counter() - start
+        stats['wall_seconds'] = round(elapsed, 3)
+        stats['events_per_second'] = round(stats['events'] / elapsed, 1) if elapsed > 0 else 0.0
+        message = (f"Replayed {stats['events']} events from {len(sources)} sources in {elapsed:.2f}s "
+                   f"({stats['events_per_second']} events/s): {stats['matches']} matches in "
+                   f"{stats['matched_events']} events, {stats['filtered']} outside the time range")
+        print(message)
+        logger.info(message)
+        return stats
+
+    @staticmethod
+    def _in_time_range(log_entry, since_ts, until_ts):
+        timestamp = event_time(normalize_event(log_entry))
+        if timestamp is None:
+            return False
+        if since_ts is not None and timestamp < since_ts:
+            return False
+        if until_ts is not None and timestamp >= until_ts:
+            return False
+        return True
+
+    def _replay_batch(self, log_entries, stats, source=None):
+        """バッチ内のマッチを書き込みスレッドに渡す。コミットはwriterのグループコミットに任せる"""
+        matched = []
+        for log_entry, matches in zip(log_entries, self._analyze_entries(log_entries)):
+            stats['events'] += 1
+            if matches:
+                stats['matched_events'] += 1
+                stats['matches'] += len(matches)
+                matched.append((log_entry, matches))
+        if matched:
+            self.writer.submit(matched, source=source)
+
+    def save_matches(self, log_entry, matches):
+        if matches:
+            self.save_matches_batch([(log_entry, matches)])
+
+    def save_matches_batch(self, matched, position=None, source=None, trace=None):
+        """
+        (ログ, マッチ)の組を保存する。positionがあれば読み取り位置も同じトランザクションで記録するため、
+        クラッシュ後もコミット済みの行の直後から欠落・重複なく再開できる。
+        書き込みスレッドの動作中はそちらに渡してグループコミットし、停止中はこの場でコミットする。
+        この場でのコミットに失敗した場合、positionがあれば例外を送出する。sourceは読み取り元のファイル(省略時は監視対象の先頭)。
+        """
+        if self.writer.running:
+            self.writer.submit(matched, position, source, trace)
+            return
+        try:
+            self.writer.write_now(matched, position, source, trace)
+        except Exception:
+            if position is not None:
+                raise
+
+    def on_rules_reloaded(self, result):
+        """ルール再読み込み後に呼ばれる。相関ルールを読み直し、プロセスプール使用時は新しいルールセットを読むプールに差し替える"""
+        self.correlator.load(self.analyzer.ruleset.correlation_rules)
+        if not self.pool:
             return
+        new_pool = SigmaProcessPool(self.analyzer, self.worker_processes)
+        with self._pool_lock:
+            old_pool, self.pool = self.pool, new_pool
+        if old_pool:
+            # 差し替え前のバッチは処理済みなので、取り消すものはない
+            old_pool.shutdown(cancel_futures=False)
+
+    def report_index_stats(self):
+        stats = self.analyzer.get_index_stats()
+        message = (f"SIGMA index selectivity: {stats['avg_candidates_per_event']} candidate rules/event "
+                   f"of {stats['rules']} ({stats['selectivity']:.2%}) over {stats['events']} events")
+        print(message)
+        logger.info(message)
+        writer_stats = self.writer.get_stats()
+        message = (f"SigmaMatch writer: {writer_stats['rows_written']} rows in {writer_stats['flushes']} commits "
+                   f"(avg {writer_stats['avg_flush_rows']} rows, max {writer_stats['max_flush_rows']}), "
+                   f"commit latency avg {writer_stats['avg_flush_ms']} ms / max {writer_stats['max_flush_ms']} ms, "
+                   f"{writer_stats['failures']} failures ({writer_stats['dropped_entries']} entries dropped), queue depth {writer_stats['queue_depth']}, "
+                   f"{writer_stats['suppressed']} suppressed repeats")
+        print(message)
+        logger.info(message)
+        if self.pipeline:
+            self.report_pipeline_stats()
+        if self.tracer:
+            self.report_latency_stats()
+        if self.analyzer.profiler is not None:
+            self.report_rule_profile()
+
+    def report_pipeline_stats(self):
+        """各段のキューの深さと処理時間、ファイルの読み残し量を出力する"""
+        stages = []
+        for name, stage in self.pipeline.get_stats().items():
+            stages.append(f"{name} queue {stage['queue_depth']}/{stage['queue_capacity']} "
+                          f"avg {stage['avg_ms']} ms (max {stage['max_ms']}, wait {stage['avg_wait_ms']}) "
+                          f"blocked {stage['blocked_puts']} errors {stage['errors']} dropped {stage['dead_lettered']}")
+        message = f"Ingest pipeline: {'; '.join(stages)}; reader lag {self.get_reader_lag()} bytes"
+        if self.listener:
+            listener = self.listener.get_stats()
+            message += (f"; listener {listener['events']} events ({listener['events_per_second']} events/s), "
+                        f"{listener['invalid']} invalid, {listener['connections']} connections")
+        print(message)
+        logger.info(message)
 
+    def report_rule_profile(self, top=5):
+        """累積評価時間の長いルールを出力する"""
+        for row in self.analyzer.get_rule_profile(top=top):
+            message = (f"SIGMA rule cost: {row['total_ms']} ms in {row['calls']} evaluations "
+                       f"(avg {row['avg_us']} us, max {row['max_us']} us), {row['matches']} matches, "
+                       f"{row['errors']} errors: {row['title'] or row['rule_id']}")
+            print(message)
+            logger.info(message)
+
+    def dump_rule_profile(self, path=None):
+        """ルールごとの計測結果をJSONファイルに書き出す。計測していなければ何もしない"""
+        self._last_profile_dump = time.monotonic()
+        path = path or self.rule_profile_path
         try:
-            log_entry = json.loads(line)
-        except json.JSONDecodeError:
-            print(f"Skipping non-JSON line: {line[:100]}")
+            report = self.analyzer.dump_rule_profile(path)
+        except OSError as e:
+            print(f"Failed to write the SIGMA rule profile to {path}: {e}")
+            logger.error(f"Failed to write the SIGMA rule profile to {path}: {e}", exc_info=True)
+            return None
+        if report is not None:
+            logger.info(f"SIGMA rule profile for {len(report['rules'])} rules written to {path}")
+        return report
+
+    def report_latency_stats(self):
+        """ログの発生からコミットまでの区間ごとの遅延(p50 / p99)を出力する"""
+        stats = self.get_latency_stats()
+        if not stats:
             return
-        
-        matches = self.analyzer.analyze_log_entry(log_entry)
-        if matches:
-            print(f"[{datetime.datetime.now()}] MATCH FOUND: {len(matches)} matches in log entry.")
-            
-            # --- ▼▼▼【最終修正点】▼▼▼ ---
-            # json.dumps に default=json_serial_converter を追加
-            with open("debug_matches.log", "a", encoding="utf-8") as f:
-                f.write(f"[{datetime.datetime.now()}] MATCH FOUND: {json.dumps(matches, ensure_ascii=False, default=json_serial_converter)}\n")
-
-            for match in matches:
-                try:
-                    new_match = SigmaMatch(
-                        rule_title=match.get('title', 'N/A'),
-                        rule_level=match.get('level', 'N/A'),
-                        log_source=json.dumps(match.get('logsource', {}), ensure_ascii=False, default=json_serial_converter),
-                        detection_details=json.dumps(match.get('detection', {}), ensure_ascii=False, default=json_serial_converter),
-                        log_entry=json.dumps(log_entry, ensure_ascii=False, default=json_serial_converter)
-                    )
-                    # --- ▲▲▲ 修正はここまで ▲▲▲ ---
-                    self.session.add(new_match)
-                    print(f"  - Prepared for DB: \"{new_match.rule_title}\"")
-                except Exception as e:
-                    print(f"ERROR: Failed to create SigmaMatch object for DB: {e}")
-                    logger.error(f"ERROR: Failed to create SigmaMatch object for DB: {e}", exc_info=True)
-            
-            try:
-                self.session.commit()
-                print("SUCCESS: All matches committed to the database.")
-                logger.info("SUCCESS: All matches committed to the database.")
-            except Exception as e:
-                print(f"ERROR: Failed to commit matches to the database: {e}")
-                logger.error(f"ERROR: Failed to commit matches to the database: {e}", exc_info=True)
-                
-                with open("debug_db_errors.log", "a", encoding="utf-8") as f:
-                    f.write(f"[{datetime.datetime.now()}] COMMIT FAILED: {str(e)}\n")
-                    f.write(traceback.format_exc() + "\n")
-                
-                self.session.rollback()
+        segments = [f"{name} {s['p50_ms']}/{s['p99_ms']} ms" for name, s in stats.items()]
+        message = f"Latency p50/p99: {'; '.join(segments)}"
+        print(message)
+        logger.info(message)
+
+    def get_latency_stats(self):
+        """区間ごとの遅延のヒストグラムの要約。計測していなければ空のdict"""
+        return self.tracer.get_stats() if self.tracer else {}
+
+    def get_latency_traces(self, limit=None):
+        """抽出したログごとの、各段を通過した時刻と区間ごとの遅延"""
+        return self.tracer.get_traces(limit) if self.tracer else []
+
+    def get_reader_lag(self):
+        """監視中のファイル全体で、まだ読み取っていないバイト数"""
+        return self.tailer.lag() if self.tailer else 0
+
+    def get_pipeline_stats(self):
+        stats = self.pipeline.get_stats() if self.pipeline else {}
+        stats['writer'] = self.writer.get_stats()
+        stats['reader_lag_bytes'] = self.get_reader_lag()
+        if self.listener:
+            stats['listener'] = self.listener.get_stats()
+        stats['latency'] = self.get_latency_stats()
+        return stats
 
     def stop(self):
+        self.writer.stop()
+        self.dump_rule_profile()
         if self.session:
             self.session.close()
-        print("Log Monitor Worker stopped.")
\ No newline at end of file
+        print("Log Monitor Worker stopped.")
+
+
+def main():
+    """既存のログファイルを現在のルールセットで再処理するCLI"""
+    parser = argparse.ArgumentParser(description="Replay JSONL event logs through the SIGMA pipeline at full speed.")
+    parser.add_argument('logs', nargs='+', help="JSONL log files, processed in the given order")
+    parser.add_argument('--rules', default='rules/sigma', help="SIGMA rule directory (relative to the project root)")
+    parser.add_argument('--offset', type=int, default=0, help="byte offset to start from in the first file")
+    parser.add_argument('--since', help="only events at or after this time (ISO 8601 or UNIX time)")
+    parser.add_argument('--until', help="only events before this time (ISO 8601 or UNIX time)")
+    parser.add_argument('--profile', help="measure per-rule evaluation cost and write the report to this JSON file")
+    args = parser.parse_args()
+
+    worker = LogMonitorWorker(os.path.abspath(args.logs[0]), args.rules)
+    if args.profile:
+        worker.analyzer.set_profiling(True)
+        worker.rule_profile_path = os.path.abspath(args.profile)
+    try:
+        stats = worker.replay([os.path.abspath(p) for p in args.logs], offset=args.offset,
+                              since=args.since, until=args.until)
+    finally:
+        worker.stop()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+import os
+import sys
+import glob
+import time
+import threading
+
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+
+class _LogFileHandler(FileSystemEventHandler):
+    def __init__(self, path, wakeup):
+        super().__init__()
+        # pathがNoneならディレクトリ内のすべての変更で起こす
+        self.path = os.path.normcase(os.path.abspath(path)) if path else None
+        self.wakeup = wakeup
+
+    def on_any_event(self, event):
+        if self.path is None:
+            self.wakeup.set()
+            return
+        for path in (getattr(event, 'src_path', None), getattr(event, 'dest_path', None)):
+            if path and os.path.normcase(os.path.abspath(os.fsdecode(path))) == self.path:
+                self.wakeup.set()
+                return
+
+
+class LogTailer:
+    """
+    1つのログファイルをバイト位置で追跡しながら読み進める。
+    ファイルの変更はwatchdog(Linuxではinotify、WindowsではReadDirectoryChangesW)で通知を受け、
+    使えない環境や通知を取りこぼした場合に備えて poll_interval 秒ごとにも確認する。
+    ローテーションはinodeの変化、切り詰めはサイズの縮小で検出する。
+    停止中にローテーションされていた場合は、チェックポイントのinodeを持つ同じディレクトリのファイル(app.log.1など)を
+    保存した位置から読み切ってから、新しいファイルを先頭から読む。
+    書きかけの最終行は改行が書かれるまで返さないため、offsetは常に行の境界を指す。
+    """
+
+    def __init__(self, path, position=None, poll_interval=1.0, read_size=1 << 20, wakeup=None):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.read_size = read_size
+        # 前回の(inode, offset)。Noneなら従来どおりファイル末尾から読み始める
+        # (ただし開始時にファイルが無かった場合は、後から作られたファイルとして先頭から読む)
+        self.start_position = position
+        self.inode = None
+        self.offset = 0
+        self.rotations = 0
+        self.truncations = 0
+        self._file = None
+        self._pending = b''
+        # MultiLogTailerから使う場合は、共有のイベントで起こされるため自前の監視は行わない
+        self._watch = wakeup is None
+        self._wakeup = wakeup or threading.Event()
+        self._observer = None
+
+    def start(self):
+        if not self._watch:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            observer = Observer()
+            observer.schedule(_LogFileHandler(self.path, self._wakeup), directory, recursive=False)
+            observer.start()
+            self._observer = observer
+        except Exception as e:
+            print(f"[LogTailer] File system events unavailable, polling every {self.poll_interval}s: {e}")
+            self._observer = None
+
+    def stop(self):
+        self._wakeup.set()
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        self._close()
+
+    def wait(self):
+        """ファイルの変更通知か poll_interval 秒の経過まで待つ"""
+        self._wakeup.wait(self.poll_interval)
+        self._wakeup.clear()
+
+    def position(self):
+        """次に読む行の先頭を(inode, offset)で返す。チェックポイントとして保存する値"""
+        return self.inode, self.offset
+
+    def read_lines(self):
+        """
+        読み込める完全な行(末尾の改行を除いた文字列)のリストを返す。
+        read_sizeを超える分は次の呼び出しで返すため、空のリストが返るまで繰り返し呼び出す。
+        """
+        if self._file is None and not self._open():
+            return []
+
+        try:
+            current = os.stat(self.path)
+        except OSError:
+            current = None
+        opened = os.fstat(self._file.fileno())
+
+        if current is not None and self._inode_of(current) != self.inode:
+            # ローテーション: 古いファイルの残りを読み切ってから新しいファイルに切り替える
+            lines = self._read_available()
+            if lines:
+                return lines
+            print(f"[LogTailer] Rotation detected, switching to the new file: {self.path}")
+            self._close()
+            self.rotations += 1
+            if not self._open(from_start=True):
+                return []
+        elif opened.st_size < self.offset + len(self._pending):
+            print(f"[LogTailer] Truncation detected, reading from the beginning: {self.path}")
+            self.truncations += 1
+            self._file.seek(0)
+            self.offset = 0
+            self._pending = b''
+
+        return self._read_available()
+
+    def _open(self, from_start=False):
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            if not from_start and self.start_position is None:
+                # 開始時に存在しなかったファイルは、作られた時点から全体が未読
+                self.start_position = (None, 0)
+            return False
+        stat = os.fstat(f.fileno())
+        inode = self._inode_of(stat)
+        offset = 0
+        if not from_start:
+            if self.start_position is None:
+                offset = stat.st_size
+            else:
+                saved_inode, saved_offset = self.start_position
+                if saved_inode == inode and saved_offset <= stat.st_size:
+                    offset = saved_offset
+                elif saved_inode is not None:
+                    # 停止中にローテーションされた場合は、ローテーション後のファイルの残りを先に読む。
+                    # 以降はread_linesがinodeの違いをローテーションとして扱い、読み切った後に新しいファイルへ切り替える
+                    rotated = self._open_rotated(saved_inode, saved_offset)
+                    if rotated is not None:
+                        f.close()
+                        f, inode, offset = rotated, saved_inode, saved_offset
+                        print(f"[LogTailer] Draining the rotated file from byte offset {offset}: {f.name}")
+                # それ以外(切り詰め、ローテーション後のファイルが無い)は新しいファイルの先頭から読む
+            self.start_position = None
+        f.seek(offset)
+        self._file, self.inode, self.offset, self._pending = f, inode, offset, b''
+        return True
+
+    def _open_rotated(self, saved_inode, saved_offset):
+        """同じディレクトリで名前がこのファイルから始まり、inodeがsaved_inodeのファイルを開く。無ければNone"""
+        directory, name = os.path.split(os.path.abspath(self.path))
+        stem = os.path.splitext(name)[0]
+        try:
+            candidates = sorted(os.listdir(directory))
+        except OSError:
+            return None
+        for candidate in candidates:
+            if candidate == name or not candidate.startswith(stem):
+                continue
+            candidate_path = os.path.join(directory, candidate)
+            try:
+                stat = os.stat(candidate_path)
+                if self._inode_of(stat) != saved_inode or saved_offset > stat.st_size:
+                    continue
+                f = open(candidate_path, 'rb')
+            except OSError:
+                continue
+            if self._inode_of(os.fstat(f.fileno())) == saved_inode:
+                return f
+            f.close()
+        return None
+
+    def _close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def rewind(self, position):
+        """コミットに失敗した場合などに、保存済みの位置まで読み戻す (同じファイルの場合のみ)"""
+        inode, offset = position
+        if self._file is not None and inode == self.inode and offset <= self.offset:
+            self._file.seek(offset)
+            self.offset = offset
+            self._pending = b''
+
+    def _read_available(self):
+        buffer = self._pending
+        end = -1
+        # read_sizeより長い行は、改行が見つかるかファイル末尾に達するまで読み足す
+        while end < 0:
+            data = self._file.read(self.read_size)
+            if not data:
+                break
+            buffer += data
+            end = buffer.rfind(b'\n')
+        if end < 0:
+            self._pending = buffer
+            return []
+        complete, self._pending = buffer[:end + 1], buffer[end + 1:]
+        self.offset += len(complete)
+        return [line.rstrip(b'\r').decode('utf-8', errors='replace') for line in complete[:-1].split(b'\n')]
+
+    @staticmethod
+    def _inode_of(stat):
+        return str(stat.st_ino)
+
+
+class MultiLogTailer:
+    """
+    複数のログファイル(パスまたはglobパターン)を1つのスレッドでまとめて追跡する。
+    ファイルごとにLogTailerを持ち、変更通知はディレクトリ単位の監視1つで共有する。
+    読み取りはラウンドロビンで、1巡につき各ファイルから最大 read_size バイトずつしか読まないため、
+    書き込みの多いファイルがあっても他のファイルの読み取りが後回しにされ続けることはない。
+    """
+
+    def __init__(self, patterns, checkpoint_loader=None, poll_interval=1.0, read_size=64 << 10,
+                 rescan_interval=10.0):
+        self.patterns = [os.path.abspath(p) for p in patterns]
+        # パスから前回の(inode, offset)を返す関数。Noneを返したファイルは末尾から読み始める
+        self.checkpoint_loader = checkpoint_loader
+        self.poll_interval = poll_interval
+        self.read_size = read_size
+        self.rescan_interval = rescan_interval
+        self.tailers = {}
+        self._order = []
+        self._next = 0
+        self._wakeup = threading.Event()
+        self._observer = None
+        self._watched_dirs = set()
+        self._last_scan = 0.0
+
+    def start(self):
+        try:
+            self._observer = Observer()
+            self._observer.start()
+        except Exception as e:
+            print(f"[MultiLogTailer] File system events unavailable, polling every {self.poll_interval}s: {e}")
+            self._observer = None
+        self._scan(initial=True)
+
+    def stop(self):
+        self._wakeup.set()
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        for tailer in self.tailers.values():
+            tailer.stop()
+
+    def wait(self):
+        self._wakeup.wait(self.poll_interval)
+        self._wakeup.clear()
+
+    def _scan(self, initial=False):
+        """パターンに一致するファイルを探し、新しいものを追跡対象に加える"""
+        self._last_scan = time.monotonic()
+        for pattern in self.patterns:
+            directory = os.path.dirname(pattern)
+            self._watch_directory(directory)
+            paths = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+            for path in paths:
+                if path in self.tailers or os.path.isdir(path):
+                    continue
+                position = self.checkpoint_loader(path) if self.checkpoint_loader else None
+                if position is None and not initial:
+                    # 起動後に現れたファイルは先頭から読む
+                    position = (None, 0)
+                tailer = LogTailer(path, position=position, poll_interval=self.poll_interval,
+                                   read_size=self.read_size, wakeup=self._wakeup)
+                self.tailers[path] = tailer
+                self._order.append(path)
+                if not initial:
+                    print(f"[MultiLogTailer] New log source: {path}")
+
+    def _watch_directory(self, directory):
+        if self._observer is None or directory in self._watched_dirs or not os.path.isdir(directory):
+            return
+        try:
+            self._observer.schedule(_LogFileHandler(None, self._wakeup), directory, recursive=False)
+            self._watched_dirs.add(directory)
+        except Exception as e:
+            print(f"[MultiLogTailer] Cannot watch {directory}, relying on polling: {e}")
+
+    def read_batches(self):
+        """
+        1巡分の読み取り結果を(パス, 行のリスト, (inode, offset))のリストで返す。
+        読み取る行が無いファイルは含まない。空のリストが返るまで繰り返し呼び出す。
+        """
+        if time.monotonic() - self._last_scan >= self.rescan_interval:
+            self._scan()
+        if not self._order:
+            return []
+        # 毎回同じファイルから始めないよう、開始位置を1つずつずらす
+        start = self._next % len(self._order)
+        self._next = start + 1
+        batches = []
+        for path in self._order[start:] + self._order[:start]:
+            tailer = self.tailers[path]
+            lines = tailer.read_lines()
+            if lines:
+                batches.append((path, lines, tailer.position()))
+        return batches
+
+    def lag(self):
+        """すべてのファイルについて、まだ読み取っていないバイト数の合計"""
+        total = 0
+        for path, tailer in self.tailers.items():
+            try:
+                total += max(0, os.path.getsize(path) - tailer.offset)
+            except OSError:
+                pass
+        return total
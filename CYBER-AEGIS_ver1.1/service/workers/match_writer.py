@@ -0,0 +1,375 @@
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import datetime
+import threading
+
+from sqlalchemy import bindparam, func, insert, update
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.database.db_manager import get_session
+from src.database.models import SigmaMatch, LogCheckpoint
+from src.threat_intel.sigma_normalizer import normalize_event
+
+logger = logging.getLogger(__name__)
+
+# SQLiteのPRAGMA synchronousに対応する耐久性の設定
+# full: コミットごとに確実にディスクへ書き出す / normal: OSクラッシュ時に直近のコミットを失う可能性がある / off: fsyncしない
+DURABILITY_LEVELS = {'full': 'FULL', 'normal': 'NORMAL', 'off': 'OFF'}
+
+_STOP = object()
+
+_matches = SigmaMatch.__table__
+_last_seen = bindparam('b_last', type_=_matches.c.last_seen.type)
+# 抑制されたマッチを、同じ抑制キーとウィンドウの保存済みの行に加算する
+_HIT_UPDATE = (
+    update(_matches)
+    .where(_matches.c.suppression_key == bindparam('b_key'))
+    .where(_matches.c.first_seen == bindparam('b_first'))
+    .values(
+        hit_count=func.coalesce(_matches.c.hit_count, 1) + bindparam('b_n'),
+        last_seen=func.max(func.coalesce(_matches.c.last_seen, _last_seen), _last_seen),
+    )
+)
+
+
+def json_serial_converter(o):
+    """日付や時刻オブジェクトをISO形式の文字列に変換します。"""
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return o.isoformat()
+    raise TypeError(f"Object of type {o.__class__.__name__} is not JSON serializable")
+
+
+def match_records(log_entry, matches, source=None, suppression=None):
+    """
+    1件のログとマッチしたルールから、sigma_matchesに挿入する行(dict)のリストを作る。sourceは読み取り元のファイル。
+    suppressionはマッチごとの(抑制キー, 最初の検知時刻, 最後の検知時刻)のリスト(UNIX時刻)。
+    """
+    log_entry_json = json.dumps(log_entry, ensure_ascii=False, default=json_serial_converter)
+    records = []
+    for i, match in enumerate(matches):
+        try:
+            key, first_seen, last_seen = suppression[i] if suppression else (None, None, None)
+            records.append({
+                'timestamp': datetime.datetime.now(),
+                'rule_title': match.get('title', 'N/A'),
+                'rule_level': match.get('level', 'N/A'),
+                'log_source': json.dumps(match.get('logsource', {}), ensure_ascii=False, default=json_serial_converter),
+                'detection_details': json.dumps(match.get('detection', {}), ensure_ascii=False, default=json_serial_converter),
+                'log_entry': log_entry_json,
+                'source': source,
+                'hit_count': 1,
+                'suppression_key': key,
+                'first_seen': datetime.datetime.fromtimestamp(first_seen) if first_seen is not None else None,
+                'last_seen': datetime.datetime.fromtimestamp(last_seen) if last_seen is not None else None,
+            })
+        except Exception as e:
+            print(f"ERROR: Failed to create SigmaMatch object for DB: {e}")
+            logger.error(f"ERROR: Failed to create SigmaMatch object for DB: {e}", exc_info=True)
+    return records
+
+
+class SigmaMatchWriter:
+    """
+    SigmaMatchの書き込み専用スレッド。マッチをバッファし、flush_rows 行たまるか最初の行から flush_interval_ms が
+    経過した時点で、まとめて1回のINSERTとコミットを行う(グループコミット)。
+    ログファイルごとの読み取り位置も同じコミットで記録するため、未コミットのマッチは再起動後に読み直される。
+    コミットに失敗したバッチは間隔を空けて max_retries 回まで再試行する。それでも失敗した場合はバッチを諦め、
+    その読み取り元のチェックポイントを以後は進めない(再起動後に、最後にコミットした位置から読み直される)。
+    suppressor(SigmaSuppressor)を渡すと、抑制ウィンドウ内の同じアラートは新しい行を作らず、
+    保存済みの行のヒット数と最終検知時刻を更新する。
+    """
+
+    def __init__(self, checkpoint_path=None, flush_rows=500, flush_interval_ms=200, durability='full',
+                 max_queue=10000, verbose=True, debug_log_path="debug_matches.log", suppressor=None, tracer=None,
+                 max_retries=5):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability must be one of {sorted(DURABILITY_LEVELS)}: {durability}")
+        self.checkpoint_path = checkpoint_path
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = max(0, flush_interval_ms) / 1000.0
+        self.durability = durability
+        self.max_retries = max(0, max_retries)
+        # Falseにするとマッチごとの標準出力とdebug_matches.logへの書き出しを行わない (再処理用)
+        self.verbose = verbose
+        self.debug_log_path = debug_log_path
+        self.suppressor = suppressor
+        # コミットしたバッチの遅延を集計するLatencyTracer (任意)
+        self.tracer = tracer
+        # 書き込みが追いつかない場合は、キューが空くまで読み取り側を待たせる
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._session = None
+        self._stats_lock = threading.Lock()
+        self.flushes = 0
+        self.rows_written = 0
+        self.max_flush_rows = 0
+        self.total_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.failures = 0
+        self.suppressed = 0
+        self.dropped_entries = 0
+        # マッチを保存できずに諦めた読み取り元。これらのチェックポイントは再起動まで更新しない
+        self.held_sources = set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="SigmaMatchWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """バッファ中のマッチを書き出してからスレッドを止める"""
+        if self.running:
+            self.queue.put(_STOP)
+            self._thread.join()
+        self._thread = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def submit(self, matched, position=None, source=None, trace=None):
+        """
+        (ログ, マッチ)の組のリストと、それを読み終えた位置(inode, offset)を書き込み待ちに加える。
+        sourceは読み取り元のファイルで、省略時は checkpoint_path とみなす。traceはコミット時刻を記録するBatchTrace。
+        """
+        self.queue.put((matched, position, source or self.checkpoint_path, trace))
+
+    def flush(self, timeout=None):
+        """それまでに受け付けたマッチがコミットされるまで待つ"""
+        if not self.running:
+            return True
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def write_now(self, matched, position=None, source=None, trace=None):
+        """スレッドを介さずに、呼び出し元で直ちに書き込む。失敗した場合は例外を送出する"""
+        source = source or self.checkpoint_path
+        prepared = self._prepare([(matched, source)])
+        try:
+            self._write(prepared, {source: position} if position is not None else {})
+        except Exception:
+            self._forget_windows(prepared)
+            raise
+        if trace is not None:
+            self._finish_traces([trace])
+
+    def _run(self):
+        # batchesは(マッチのリスト, 読み取り元)、positionsは読み取り元ごとの最新の位置
+        batches, positions, traces, rows, deadline = [], {}, [], 0, None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            waiter = None
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, threading.Event):
+                waiter = item
+            elif item is not None:
+                items, item_position, source, trace = item
+                if trace is not None:
+                    traces.append(trace)
+                if items:
+                    batches.append((items, source))
+                    rows += sum(len(matches) for _, matches in items)
+                if item_position is not None:
+                    positions[source] = item_position
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if rows < self.flush_rows:
+                    continue
+
+            committed = True
+            if batches or positions:
+                committed = self._write_with_retry(batches, positions, stopping)
+            if traces and committed:
+                self._finish_traces(traces)
+            batches, positions, traces, rows, deadline = [], {}, [], 0, None
+            if waiter is not None:
+                waiter.set()
+
+    def _write_with_retry(self, batches, positions, stopping):
+        # 抑制の状態は1回だけ更新し、再試行では同じ行と更新内容を書き込む。諦めた場合はこのバッチで始めたウィンドウを取り消す
+        prepared = self._prepare(batches)
+        with self._stats_lock:
+            held = set(self.held_sources)
+        positions = {source: position for source, position in positions.items() if source not in held}
+        # 停止中は長く待たせないよう、再試行を少なくする
+        retries = min(self.max_retries, 2) if stopping else self.max_retries
+        attempt = 0
+        while True:
+            try:
+                self._write(prepared, positions)
+                return True
+            except Exception:
+                attempt += 1
+                if attempt > retries:
+                    break
+                time.sleep(min(2 ** attempt, 30))
+
+        self._forget_windows(prepared)
+        entries = sum(len(matched) for matched, _ in batches)
+        sources = {source for matched, source in batches if matched}
+        with self._stats_lock:
+            self.dropped_entries += entries
+            self.held_sources.update(sources)
+        message = (f"Giving up on {entries} log entries after {attempt} failed commits; "
+                   f"checkpoints are kept at the last committed position for: {sorted(s or '' for s in sources)}")
+        print(f"ERROR: {message}")
+        logger.error(message)
+        return False
+
+    def _prepare(self, batches):
+        """
+        挿入する行と、抑制されたマッチによる既存行の更新内容((抑制キー, 最初の検知時刻) -> [件数, 最後の検知時刻])を作る。
+        同じフラッシュで挿入する行に集約できるものは、その行のhit_countとlast_seenに直接反映する。
+        """
+        records, updates, emitted = [], {}, []
+        pending = {}
+        suppressed = 0
+        for matched, source in batches:
+            for log_entry, matches in matched:
+                if self.suppressor is None:
+                    records.extend(match_records(log_entry, matches, source))
+                    emitted.append((log_entry, matches))
+                    continue
+                event = normalize_event(log_entry)
+                fresh, suppression = [], []
+                for match in matches:
+                    key, first_seen, seen, is_new = self.suppressor.observe(match, event)
+                    if is_new:
+                        fresh.append(match)
+                        suppression.append((key, first_seen, seen))
+                        continue
+                    suppressed += 1
+                    record = pending.get(key)
+                    if record is not None:
+                        record['hit_count'] += 1
+                        record['last_seen'] = max(record['last_seen'], datetime.datetime.fromtimestamp(seen))
+                        continue
+                    update_key = (key, datetime.datetime.fromtimestamp(first_seen))
+                    hits = updates.setdefault(update_key, [0, seen])
+                    hits[0] += 1
+                    hits[1] = max(hits[1], seen)
+                if fresh:
+                    for record in match_records(log_entry, fresh, source, suppression):
+                        pending[record['suppression_key']] = record
+                        records.append(record)
+                    emitted.append((log_entry, fresh))
+        if suppressed:
+            with self._stats_lock:
+                self.suppressed += suppressed
+        if emitted and self.verbose:
+            self._write_debug_log(emitted)
+        updates = [
+            {'b_key': key, 'b_first': first_seen, 'b_n': n, 'b_last': datetime.datetime.fromtimestamp(last_seen)}
+            for (key, first_seen), (n, last_seen) in updates.items()
+        ]
+        return records, updates
+
+    def _forget_windows(self, prepared):
+        """書き込めなかったバッチで始めた抑制ウィンドウを取り消し、次のマッチで改めて行を作らせる"""
+        if self.suppressor is None:
+            return
+        records, _ = prepared
+        self.suppressor.forget(record['suppression_key'] for record in records if record['suppression_key'])
+
+    def _write(self, prepared, positions):
+        start = time.perf_counter()
+        records, updates = prepared
+
+        if self._session is None:
+            self._session = get_session()
+        session = self._session
+        try:
+            self._apply_durability(session)
+            if records:
+                session.execute(insert(SigmaMatch), records)
+            if updates:
+                session.execute(_HIT_UPDATE, updates)
+            for path, (inode, offset) in positions.items():
+                if path:
+                    session.merge(LogCheckpoint(path=path, inode=inode, offset=offset))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            with self._stats_lock:
+                self.failures += 1
+            print(f"ERROR: Failed to commit matches to the database: {e}")
+            # トレースバックはloggerに残す (作業ディレクトリ直下のファイルには書かない)
+            logger.error(f"ERROR: Failed to commit matches to the database: {e}", exc_info=True)
+            raise
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self.flushes += 1
+            self.rows_written += len(records)
+            self.max_flush_rows = max(self.max_flush_rows, len(records))
+            self.total_flush_ms += elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        if records and self.verbose:
+            print(f"SUCCESS: {len(records)} matches committed to the database ({elapsed_ms:.1f} ms).")
+            logger.info(f"SUCCESS: {len(records)} matches committed to the database ({elapsed_ms:.1f} ms).")
+
+    def _apply_durability(self, session):
+        """
+        セッションが使う接続に PRAGMA synchronous を設定する。設定は接続ごとに保たれるため、
+        プールの接続のinfoに設定済みの値を記録し、新しい接続に替わったときだけ実行する。
+        """
+        level = DURABILITY_LEVELS[self.durability]
+        connection = session.connection()
+        info = connection.connection.info
+        if info.get('synchronous') != level:
+            connection.exec_driver_sql(f"PRAGMA synchronous={level}")
+            info['synchronous'] = level
+
+    def _finish_traces(self, traces):
+        if self.tracer is None:
+            return
+        committed_at = time.time()
+        for trace in traces:
+            trace.mark('committed', committed_at)
+            self.tracer.finish(trace)
+
+    def _write_debug_log(self, matched):
+        now = datetime.datetime.now()
+        with open(self.debug_log_path, "a", encoding="utf-8") as f:
+            for log_entry, matches in matched:
+                print(f"[{now}] MATCH FOUND: {len(matches)} matches in log entry.")
+                f.write(f"[{now}] MATCH FOUND: {json.dumps(matches, ensure_ascii=False, default=json_serial_converter)}\n")
+                for match in matches:
+                    print(f"  - Prepared for DB: \"{match.get('title', 'N/A')}\"")
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                'flushes': self.flushes,
+                'rows_written': self.rows_written,
+                'avg_flush_rows': round(self.rows_written / self.flushes, 1) if self.flushes else 0.0,
+                'max_flush_rows': self.max_flush_rows,
+                'avg_flush_ms': round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+                'max_flush_ms': round(self.max_flush_ms, 2),
+                'failures': self.failures,
+                'dropped_entries': self.dropped_entries,
+                'held_checkpoints': sorted(s or '' for s in self.held_sources),
+                'queue_depth': self.queue.qsize(),
+                'durability': self.durability,
+                'suppressed': self.suppressed,
+                'suppression': self.suppressor.get_stats() if self.suppressor else None,
+            }
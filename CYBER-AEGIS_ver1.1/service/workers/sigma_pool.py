@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.threat_intel.sigma_analyzer import SigmaAnalyzer
+
+# ワーカープロセスごとに1つだけ保持する、コンパイル済みのSIGMAルールセット
+_worker_analyzer = None
+
+
+def _init_worker(rule_dirs, logsource_filter, cache_path, profiling=False):
+    global _worker_analyzer
+    _worker_analyzer = SigmaAnalyzer(rule_dirs=rule_dirs, logsource_filter=logsource_filter, cache_path=cache_path,
+                                     profiling=profiling)
+
+
+def _analyze_chunk(entries):
+    # 遅延の計測用に、ワーカーでの処理の開始・終了時刻(UNIX時刻)も返す
+    started_at = time.time()
+    index = _worker_analyzer.index
+    events_before, candidates_before = index.events_seen, index.candidates_seen
+    results = _worker_analyzer.analyze_batch_ids(entries)
+    # ルールごとの計測はチャンクごとの差分を親に返し、親のprofilerに集計する
+    profile = _worker_analyzer.profiler.take() if _worker_analyzer.profiler else None
+    return (results, index.events_seen - events_before, index.candidates_seen - candidates_before, profile,
+            started_at, time.time())
+
+
+class SigmaProcessPool:
+    """
+    SIGMA評価を複数プロセスに分散するプール。
+    各ワーカーは起動時に一度だけ(親が更新したキャッシュから)ルールセットをロードし、以降はログのチャンク単位で評価する。
+    ルールの再読み込み後は、新しいキャッシュを読む別のプールを作って差し替える。
+    ワーカーが異常終了してプールが壊れた場合は、プールを作り直して1度だけ再試行し、それでも失敗すれば親プロセスで評価する。
+    """
+
+    def __init__(self, analyzer, processes, chunk_size=64):
+        self.analyzer = analyzer
+        # ワーカーがロードするルールセットと同じ世代のものでルールIDを解決する
+        self.ruleset = analyzer.ruleset
+        self.processes = processes
+        self.chunk_size = max(1, chunk_size)
+        self.restarts = 0
+        self.fallbacks = 0
+        self.executor = self._create_executor()
+        print(f"[SigmaProcessPool] Started {processes} worker processes (chunk size: {self.chunk_size}).")
+
+    def _create_executor(self):
+        analyzer = self.analyzer
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=_init_worker,
+            initargs=(analyzer.rule_dirs, analyzer.index.logsource_filter, analyzer.cache_path,
+                      analyzer.profiler is not None)
+        )
+
+    def _restart(self):
+        """壊れたプールを破棄し、同じ設定で新しいワーカープロセスを起動する"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.restarts += 1
+        self.executor = self._create_executor()
+        print(f"[SigmaProcessPool] A worker process died. Restarted the pool ({self.restarts} restarts).")
+
+    def analyze_batch(self, entries, trace=None):
+        """
+        analyzer.analyze_batchと同じ結果を、入力と同じ順序で返す。
+        traceを渡すと、チャンクがワーカーに届くまでの時間と、ワーカーでの処理時間をログ数で重み付けして記録する。
+        """
+        chunks = [entries[i:i + self.chunk_size] for i in range(0, len(entries), self.chunk_size)]
+        # 途中のチャンクで失敗したときに集計が二重にならないよう、全チャンクの結果が揃ってから反映する
+        try:
+            submitted_at = time.time()
+            outputs = list(self.executor.map(_analyze_chunk, chunks))
+        except BrokenProcessPool:
+            self._restart()
+            try:
+                submitted_at = time.time()
+                outputs = list(self.executor.map(_analyze_chunk, chunks))
+            except BrokenProcessPool:
+                # ワーカーが起動直後に落ち続ける場合でもマッチを失わないよう、親のSigmaAnalyzerで評価する
+                self.fallbacks += 1
+                print(f"[SigmaProcessPool] The restarted pool failed again. "
+                      f"Evaluating {len(entries)} events in the parent process.")
+                return self.analyzer.analyze_batch(entries)
+
+        rules_by_id = self.ruleset.rules_by_id
+        results = []
+        for chunk, (chunk_results, events, candidates, profile, started_at, finished_at) in zip(chunks, outputs):
+            if trace is not None:
+                trace.span('pool_dispatch', started_at - submitted_at, len(chunk))
+                trace.span('pool_compute', finished_at - started_at, len(chunk))
+            self.analyzer.index.record(events, candidates)
+            profiler = self.analyzer.profiler
+            if profile and profiler is not None:
+                profiler.merge(profile)
+            for rule_ids in chunk_results:
+                results.append([rules_by_id[rule_id] for rule_id in rule_ids if rule_id in rules_by_id])
+        return results
+
+    def shutdown(self, cancel_futures=True):
+        self.executor.shutdown(wait=True, cancel_futures=cancel_futures)
+        print("[SigmaProcessPool] Worker processes stopped.")
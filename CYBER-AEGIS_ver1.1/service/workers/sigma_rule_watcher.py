@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+import logging
+
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+logger = logging.getLogger(__name__)
+
+
+class _RuleChangeHandler(FileSystemEventHandler):
+    def __init__(self, changed_event):
+        super().__init__()
+        self.changed_event = changed_event
+
+    def on_any_event(self, event):
+        paths = [getattr(event, 'src_path', ''), getattr(event, 'dest_path', '')]
+        if event.is_directory or any(str(p).endswith(('.yml', '.yaml')) for p in paths):
+            self.changed_event.set()
+
+
+class SigmaRuleWatcher:
+    """
+    SIGMAルールディレクトリを監視し、変更があればSigmaAnalyzer.reload()で差分だけを取り込む。
+    エディタの連続書き込みをまとめるため、最後の変更から debounce 秒待ってから再読み込みする。
+    監視イベントを取りこぼした場合に備え、poll_interval 秒ごとにも変更の有無を確認する。
+    """
+
+    def __init__(self, analyzer, on_reload=None, debounce=1.0, poll_interval=30.0):
+        self.analyzer = analyzer
+        self.on_reload = on_reload
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._changed = threading.Event()
+        self._stopped = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def start(self):
+        try:
+            observer = Observer()
+            handler = _RuleChangeHandler(self._changed)
+            for rule_dir in self.analyzer.rule_dirs:
+                if os.path.isdir(rule_dir):
+                    observer.schedule(handler, rule_dir, recursive=True)
+            observer.start()
+            self._observer = observer
+        except Exception as e:
+            # 監視が使えない環境では定期確認だけで動かす
+            print(f"[SigmaRuleWatcher] File system events unavailable, polling every {self.poll_interval}s: {e}")
+            self._observer = None
+
+        self._thread = threading.Thread(target=self._run, name="SigmaRuleWatcher", daemon=True)
+        self._thread.start()
+        print(f"[SigmaRuleWatcher] Watching {len(self.analyzer.rule_dirs)} rule directories for changes.")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._changed.wait(self.poll_interval)
+            if self._stopped.is_set():
+                break
+            # 連続した変更が収まるまで待つ
+            while self._changed.is_set() and not self._stopped.is_set():
+                self._changed.clear()
+                self._stopped.wait(self.debounce)
+            if self._stopped.is_set():
+                break
+            self.reload_now()
+
+    def reload_now(self):
+        try:
+            result = self.analyzer.reload()
+        except Exception as e:
+            print(f"[SigmaRuleWatcher] Failed to reload SIGMA rules: {e}")
+            logger.error(f"Failed to reload SIGMA rules: {e}", exc_info=True)
+            return None
+        if result is None:
+            return None
+
+        message = (f"[SigmaRuleWatcher] Reloaded SIGMA rules in {result['latency_ms']} ms: "
+                   f"added={result['added']} changed={result['changed']} removed={result['removed']} "
+                   f"(total {result['rules']} rules)")
+        print(message)
+        logger.info(message)
+        if self.on_reload:
+            try:
+                self.on_reload(result)
+            except Exception as e:
+                logger.error(f"SIGMA reload callback failed: {e}", exc_info=True)
+        return result
+
+    def stop(self):
+        self._stopped.set()
+        self._changed.set()
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -54,7 +54,7 @@ class FileChangeEventHandler(FileSystemEventHandler):
         self.exclusions = exclusions
         self.monitored_paths = [os.path.normpath(p) for p in monitored_paths]
         self.ignore_patterns = ['appdata', 'application data', '__pycache__', '$recycle.bin', '.tmp']
-        self.ignore_filenames = ['aegis.db', 'aegis.db-journal', 'cyber_aegis.log']
+        self.ignore_filenames = ['aegis.db', 'aegis.db-journal', 'aegis.db-wal', 'aegis.db-shm', 'cyber_aegis.log']
 
     def process_event(self, event_type, path):
         if not path or os.path.isdir(path):
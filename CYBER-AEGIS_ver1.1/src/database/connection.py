@@ -0,0 +1,164 @@
+# CYBER-AEGIS/src/database/connection.py
+import sqlite3
+import weakref
+import threading
+from contextlib import contextmanager
+
+# SQLiteのPRAGMA synchronousに指定できる値
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# SQLAlchemyから実行される文のうち、書き込みトランザクションを始めるもの
+_WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+
+class _Connection(sqlite3.Connection):
+    """弱参照で追跡できるようにしたsqlite3.Connection"""
+
+
+class SQLiteConnectionManager:
+    """
+    1つのSQLiteファイルへの接続をスレッドごとに1本ずつ持つ。
+    WALモードで開くため、読み取りは書き込み中でも各スレッドの接続から並行して行える。
+    書き込みは write() の中でのみ行い、プロセス内の書き込みをロックで1本にまとめる。
+    SQLAlchemyのセッションからの書き込みも attach_engine() で同じロックに通す。
+    別プロセスからの書き込みとは busy_timeout の範囲で待ち合わせる。
+    """
+
+    def __init__(self, db_path, busy_timeout_ms=5000, synchronous='NORMAL', cache_size_kb=16384):
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"synchronous must be one of {SYNCHRONOUS_LEVELS}: {synchronous}")
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        # 終了したスレッドの接続はthreading.localから外れた時点で閉じられるよう、弱参照で持つ
+        self._connections = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        self.journal_mode = None
+
+        # journal_modeはデータベースファイルに記録されるため、最初の1回だけ設定すればよい
+        conn = self.connect()
+        try:
+            self.journal_mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        finally:
+            conn.close()
+
+    def connect(self):
+        """設定済みの新しい接続を返す。SQLAlchemyのcreatorにも使う"""
+        conn = sqlite3.connect(
+            self.db_path,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            timeout=self.busy_timeout_ms / 1000.0,
+            check_same_thread=False,
+            factory=_Connection
+        )
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @property
+    def connection(self):
+        """呼び出し元のスレッド専用の接続 (行はsqlite3.Rowで返す)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.connect()
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.add(conn)
+        return conn
+
+    @contextmanager
+    def write(self):
+        """
+        書き込み用のトランザクション。プロセス内の書き込みを直列化し、BEGIN IMMEDIATE で開始する。
+        ブロックを抜けるとコミットし、例外の場合はロールバックして例外をそのまま送出する。
+        入れ子にした場合は外側のトランザクションにまとめる。
+        """
+        conn = self.connection
+        with self._write_lock:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def attach_engine(self, engine):
+        """
+        SQLAlchemyのエンジン(get_sessionのセッション)からの書き込みを、write() と同じロックと BEGIN IMMEDIATE で行う。
+        最初の書き込み文の前にロックを取ってトランザクションを開始し、コミットまたはロールバックの後で手放す。
+        読み取りだけのセッションはロックを取らないため、書き込み中でも並行して読める。
+        write() の中で同じスレッドからセッションを使って書き込むと、別の接続の書き込みを待つことになるため行わないこと。
+        """
+        from sqlalchemy import event
+
+        lock = self._write_lock
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _begin_write(conn, cursor, statement, parameters, context, executemany):
+            if conn.info.get('write_locked'):
+                return
+            words = statement.lstrip().split(None, 1)
+            if not words or words[0].upper() not in _WRITE_STATEMENTS:
+                return
+            lock.acquire()
+            try:
+                dbapi_connection = conn.connection.dbapi_connection
+                if not dbapi_connection.in_transaction:
+                    dbapi_connection.execute("BEGIN IMMEDIATE")
+            except BaseException:
+                lock.release()
+                raise
+            conn.info['write_locked'] = True
+
+        def _end_write(conn, finish):
+            if not conn.info.pop('write_locked', False):
+                return
+            try:
+                # ロックはトランザクションを閉じてから手放す (SQLAlchemy側の後続のcommit/rollbackは空振りになる)
+                finish(conn.connection.dbapi_connection)
+            finally:
+                lock.release()
+
+        @event.listens_for(engine, 'commit')
+        def _commit_write(conn):
+            _end_write(conn, lambda dbapi_connection: dbapi_connection.commit())
+
+        @event.listens_for(engine, 'rollback')
+        def _rollback_write(conn):
+            _end_write(conn, lambda dbapi_connection: dbapi_connection.rollback())
+
+        return engine
+
+    def close_all(self):
+        """これまでに各スレッドに割り当てた接続をすべて閉じる"""
+        with self._connections_lock:
+            connections = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def get_stats(self):
+        with self._connections_lock:
+            connections = len(self._connections)
+        return {
+            'db_path': self.db_path,
+            'journal_mode': self.journal_mode,
+            'synchronous': self.synchronous,
+            'busy_timeout_ms': self.busy_timeout_ms,
+            'thread_connections': connections,
+        }
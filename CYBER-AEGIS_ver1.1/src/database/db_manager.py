@@ -1,22 +1,37 @@
 import sqlite3
 import json
 import os
-import threading
 from src.utils.config_manager import ConfigManager
 from datetime import datetime, timezone, timedelta
 
 # SQLAlchemy関連のライブラリをインポート
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-# models.pyで定義するBaseクラスとSigmaMatchクラスをインポート
-from .models import Base, SigmaMatch
+# テーブルの定義はmodels.pyのBaseにまとめている
+from .models import Base
+from .migrations import migrate
+from .query import LISTINGS, SEARCH_SOURCES, build_page_query, format_record, fts_phrase, like_pattern, like_snippet
+from .connection import SQLiteConnectionManager
+
+_NETWORK_INCIDENT_COLUMNS = ('event_id', 'process_name', 'event_time', 'destination', 'threat_level', 'status', 'description')
+_FILE_EVENT_COLUMNS = ('event_id', 'event_type', 'file_path', 'event_time', 'threat_level', 'description')
+
+
+def _network_incident_row(d):
+    return (d.get('id'), d.get('name'), d.get('time'), d.get('destination'), d.get('threat_level'), d.get('status'), d.get('description'))
+
+
+def _file_event_row(d):
+    return (d.get('id'), d.get('event_type'), d.get('path'), d.get('time'), d.get('threat_level'), d.get('description'))
 
 class DBManager:
     # クラス全体で単一のインスタンスを共有するための変数 (シングルトンパターン)
     _instance = None
     _engine = None
     _Session = None
-    _lock = None
+    _db = None
+    # DBManager.search で使えるFTS5テーブル (最初の検索で調べる)
+    _fts_tables = None
 
     def __new__(cls):
         # インスタンスがまだ作成されていない場合にのみ初期化処理を行う
@@ -24,128 +39,44 @@ class DBManager:
             cls._instance = super(DBManager, cls).__new__(cls)
             
             config = ConfigManager()
-            db_path = config.get('DATABASE', 'path', fallback='aegis.db')
-            
-            db_uri = f'sqlite:///{os.path.abspath(db_path)}'
-            cls._engine = create_engine(db_uri, connect_args={'check_same_thread': False})
-            
-            cls._Session = sessionmaker(bind=cls._engine)
+            db_path = os.path.abspath(config.get('DATABASE', 'path', fallback='aegis.db'))
 
-            cls._instance.conn = sqlite3.connect(
-                db_path, 
-                detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
-                check_same_thread=False
+            # DBManagerとSQLAlchemy(get_session)は同じ接続層を使う。WALモードでスレッドごとに接続を持つ
+            cls._db = SQLiteConnectionManager(
+                db_path,
+                busy_timeout_ms=int(config.get('DATABASE', 'busy_timeout_ms', fallback='5000')),
+                synchronous=config.get('DATABASE', 'synchronous', fallback='NORMAL')
             )
-            cls._instance.conn.row_factory = sqlite3.Row
-            
-            cls._lock = threading.Lock()
+            # セッションからの書き込みも、DBManagerの書き込みと同じロックで1本にまとめる
+            cls._engine = cls._db.attach_engine(create_engine(f'sqlite:///{db_path}', creator=cls._db.connect))
+            cls._Session = sessionmaker(bind=cls._engine)
 
             cls._instance.setup_tables()
             
         return cls._instance
 
+    @property
+    def conn(self):
+        """呼び出し元のスレッド専用の接続"""
+        return self._db.connection
+
     def setup_tables(self):
-        with self._lock:
+        # テーブルはすべて models.py で定義している。
+        # create_allはSQLAlchemy側の接続で書き込むため、こちらの書き込みトランザクションを開始する前に行う
+        Base.metadata.create_all(self._engine)
+        with self._db.write():
             cursor = self.conn.cursor()
-            Base.metadata.create_all(self._engine)
-
-            # --- 全てのテーブル定義 ---
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS network_incidents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, event_id TEXT NOT NULL UNIQUE, process_name TEXT,
-                    event_time TEXT NOT NULL, destination TEXT, threat_level TEXT, status TEXT, description TEXT
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS file_events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, event_id TEXT NOT NULL UNIQUE, event_type TEXT,
-                    file_path TEXT NOT NULL, event_time TEXT NOT NULL, threat_level TEXT, description TEXT
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS github_leaks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, source TEXT, keyword TEXT,
-                    repository TEXT, file_path TEXT, url TEXT UNIQUE, matches TEXT,
-                    risk_level TEXT, confidence REAL, ai_report TEXT, status TEXT DEFAULT 'NEW'
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS x_leaks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, source TEXT, keyword TEXT,
-                    author TEXT, tweet_text TEXT, url TEXT UNIQUE, tweet_created_at TEXT,
-                    risk_level TEXT, confidence REAL, ai_report TEXT, status TEXT DEFAULT 'NEW'
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS discord_leaks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, source TEXT, keyword TEXT,
-                    server TEXT, channel TEXT, author TEXT, message_text TEXT, url TEXT UNIQUE,
-                    risk_level TEXT, confidence REAL, ai_report TEXT, status TEXT DEFAULT 'NEW'
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS community_threat_scores (
-                    server_id TEXT PRIMARY KEY, server_name TEXT, invite_code TEXT,
-                    danger_score INTEGER, last_analyzed_at TEXT, hit_keywords TEXT,
-                    status TEXT DEFAULT 'UNKNOWN'
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS pastebin_leaks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, source TEXT, keyword TEXT,
-                    title TEXT, url TEXT UNIQUE, content_preview TEXT,
-                    risk_level TEXT, confidence REAL, ai_report TEXT, status TEXT DEFAULT 'NEW'
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    created_at TEXT NOT NULL
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    conversation_id INTEGER NOT NULL,
-                    is_user INTEGER NOT NULL, -- 1 for user, 0 for AI
-                    text TEXT NOT NULL,
-                    timestamp TEXT NOT NULL,
-                    FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS trinity_ai_simulations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    simulation_time TEXT NOT NULL,
-                    context_data TEXT,
-                    red_team_output TEXT,
-                    blue_team_output TEXT,
-                    white_team_report TEXT
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS system_learnings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    learning_time TEXT NOT NULL,
-                    source_simulation_id INTEGER,
-                    learning_type TEXT,
-                    learning_content TEXT,
-                    FOREIGN KEY (source_simulation_id) REFERENCES trinity_ai_simulations(id)
-                )
-            ''')
-            
-            self.conn.commit()
+            # 既存のテーブルへの列の追加や検索用のインデックスなど、PRAGMA user_version で管理するスキーマ変更を適用する
+            migrate(cursor)
             cursor.close()
 
     def create_conversation(self, title):
-        with self._lock:
+        with self._db.write():
             timestamp = datetime.now(timezone.utc).isoformat()
             query = "INSERT INTO conversations (title, created_at) VALUES (?, ?)"
             cursor = self.conn.cursor()
             try:
                 cursor.execute(query, (title, timestamp))
-                self.conn.commit()
                 last_id = cursor.lastrowid
                 return last_id
             except sqlite3.Error as e:
@@ -163,14 +94,13 @@ class DBManager:
         return [{"id": r[0], "title": r[1]} for r in rows]
 
     def add_message_to_conversation(self, conv_id, message_data):
-        with self._lock:
+        with self._db.write():
             timestamp = datetime.now(timezone.utc).isoformat()
             is_user_int = 1 if message_data['is_user'] else 0
             query = "INSERT INTO messages (conversation_id, is_user, text, timestamp) VALUES (?, ?, ?, ?)"
             cursor = self.conn.cursor()
             try:
                 cursor.execute(query, (conv_id, is_user_int, message_data['text'], timestamp))
-                self.conn.commit()
             except sqlite3.Error as e:
                 print(f"Error adding message: {e}")
             finally:
@@ -185,24 +115,22 @@ class DBManager:
         return [{"text": r[0], "is_user": bool(r[1])} for r in rows]
 
     def update_conversation_title(self, conv_id, new_title):
-        with self._lock:
+        with self._db.write():
             query = "UPDATE conversations SET title = ? WHERE id = ?"
             cursor = self.conn.cursor()
             try:
                 cursor.execute(query, (new_title, conv_id))
-                self.conn.commit()
             except sqlite3.Error as e:
                 print(f"Error updating title: {e}")
             finally:
                 cursor.close()
             
     def delete_conversation(self, conv_id):
-        with self._lock:
+        with self._db.write():
             query = "DELETE FROM conversations WHERE id = ?"
             cursor = self.conn.cursor()
             try:
                 cursor.execute(query, (conv_id,))
-                self.conn.commit()
                 return True
             except sqlite3.Error as e:
                 print(f"Error deleting conversation: {e}")
@@ -210,78 +138,97 @@ class DBManager:
             finally:
                 cursor.close()
 
-    def add_network_incident(self, incident_data):
-        with self._lock:
-            query = '''INSERT INTO network_incidents (event_id, process_name, event_time, destination, threat_level, status, description) VALUES (?, ?, ?, ?, ?, ?, ?)'''
+    def _insert_one(self, table, columns, row):
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        with self._db.write():
             cursor = self.conn.cursor()
             try:
-                cursor.execute(query, (incident_data.get('id'), incident_data.get('name'), incident_data.get('time'), incident_data.get('destination'), incident_data.get('threat_level'), incident_data.get('status'), incident_data.get('description')))
-                self.conn.commit()
+                cursor.execute(query, row)
             finally:
                 cursor.close()
 
-    def add_file_event(self, event_data):
-        with self._lock:
-            query = '''INSERT INTO file_events (event_id, event_type, file_path, event_time, threat_level, description) VALUES (?, ?, ?, ?, ?, ?)'''
+    def _insert_or_ignore_many(self, table, columns, records, to_row):
+        """
+        records を1つの書き込みトランザクションで INSERT OR IGNORE し、新たに登録されたものだけを入力順に返す。
+        UNIQUE列が既存の行(または同じバッチ内の先の行)と重複したものは無視される。
+        """
+        records = list(records)
+        if not records:
+            return []
+        query = f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        inserted = []
+        with self._db.write():
             cursor = self.conn.cursor()
             try:
-                cursor.execute(query, (event_data.get('id'), event_data.get('event_type'), event_data.get('path'), event_data.get('time'), event_data.get('threat_level'), event_data.get('description')))
-                self.conn.commit()
+                # executemanyでは行ごとの結果が分からないため1行ずつ実行する。コミットは最後の1回だけ
+                for record in records:
+                    cursor.execute(query, to_row(record))
+                    if cursor.rowcount > 0:
+                        inserted.append(record)
             finally:
                 cursor.close()
-        
+        return inserted
+
+    def add_network_incident_many(self, incidents):
+        return self._insert_or_ignore_many('network_incidents', _NETWORK_INCIDENT_COLUMNS, incidents, _network_incident_row)
+
+    def add_file_event_many(self, events):
+        return self._insert_or_ignore_many('file_events', _FILE_EVENT_COLUMNS, events, _file_event_row)
+
+    def add_github_leak_many(self, leaks):
+        return self._insert_or_ignore_many(
+            'github_leaks',
+            ('timestamp', 'source', 'keyword', 'repository', 'file_path', 'url', 'matches'),
+            leaks,
+            lambda d: (d.get('timestamp'), d.get('source'), d.get('keyword'), d.get('repository'), d.get('file_path'), d.get('url'), json.dumps(d.get('matches', [])))
+        )
+
+    def add_x_leak_many(self, leaks):
+        return self._insert_or_ignore_many(
+            'x_leaks',
+            ('timestamp', 'source', 'keyword', 'author', 'tweet_text', 'url', 'tweet_created_at'),
+            leaks,
+            lambda d: (d.get('timestamp'), d.get('source'), d.get('keyword'), d.get('author'), d.get('tweet_text'), d.get('url'), d.get('tweet_created_at'))
+        )
+
+    def add_discord_leak_many(self, leaks):
+        return self._insert_or_ignore_many(
+            'discord_leaks',
+            ('timestamp', 'source', 'keyword', 'server', 'channel', 'author', 'message_text', 'url'),
+            leaks,
+            lambda d: (d.get('timestamp'), d.get('source'), d.get('keyword'), d.get('server'), d.get('channel'), d.get('author'), d.get('message_text'), d.get('url'))
+        )
+
+    def add_pastebin_leak_many(self, leaks):
+        return self._insert_or_ignore_many(
+            'pastebin_leaks',
+            ('timestamp', 'source', 'keyword', 'title', 'url', 'content_preview'),
+            leaks,
+            lambda d: (d.get('timestamp'), d.get('source'), d.get('keyword'), d.get('title'), d.get('url'), d.get('content_preview'))
+        )
+
+    # 1件ずつの登録は従来どおり、event_idの重複やNOT NULL違反をsqlite3.IntegrityErrorとして送出する。
+    # 重複を無視してまとめて登録する場合は *_many を使う
+    def add_network_incident(self, incident_data):
+        self._insert_one('network_incidents', _NETWORK_INCIDENT_COLUMNS, _network_incident_row(incident_data))
+
+    def add_file_event(self, event_data):
+        self._insert_one('file_events', _FILE_EVENT_COLUMNS, _file_event_row(event_data))
+
     def add_github_leak(self, leak_data):
-        with self._lock:
-            query = '''INSERT OR IGNORE INTO github_leaks (timestamp, source, keyword, repository, file_path, url, matches) VALUES (?, ?, ?, ?, ?, ?, ?)'''
-            cursor = self.conn.cursor()
-            try:
-                cursor.execute(query, (leak_data.get('timestamp'), leak_data.get('source'), leak_data.get('keyword'), leak_data.get('repository'), leak_data.get('file_path'), leak_data.get('url'), json.dumps(leak_data.get('matches', []))))
-                self.conn.commit()
-                return cursor.lastrowid > 0
-            finally:
-                cursor.close()
+        return bool(self.add_github_leak_many([leak_data]))
 
     def add_x_leak(self, leak_data):
-        with self._lock:
-            query = '''INSERT OR IGNORE INTO x_leaks (timestamp, source, keyword, author, tweet_text, url, tweet_created_at) VALUES (?, ?, ?, ?, ?, ?, ?)'''
-            cursor = self.conn.cursor()
-            try:
-                cursor.execute(query, (leak_data.get('timestamp'), leak_data.get('source'), leak_data.get('keyword'), leak_data.get('author'), leak_data.get('tweet_text'), leak_data.get('url'), leak_data.get('tweet_created_at')))
-                self.conn.commit()
-                return cursor.lastrowid > 0
-            finally:
-                cursor.close()
+        return bool(self.add_x_leak_many([leak_data]))
 
     def add_discord_leak(self, leak_data):
-        with self._lock:
-            query = '''INSERT OR IGNORE INTO discord_leaks (timestamp, source, keyword, server, channel, author, message_text, url) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
-            cursor = self.conn.cursor()
-            try:
-                cursor.execute(query, (leak_data.get('timestamp'), leak_data.get('source'), leak_data.get('keyword'), leak_data.get('server'), leak_data.get('channel'), leak_data.get('author'), leak_data.get('message_text'), leak_data.get('url')))
-                self.conn.commit()
-                return cursor.lastrowid > 0
-            finally:
-                cursor.close()
-        
+        return bool(self.add_discord_leak_many([leak_data]))
+
     def add_pastebin_leak(self, leak_data):
-        with self._lock:
-            query = '''
-                INSERT OR IGNORE INTO pastebin_leaks (timestamp, source, keyword, title, url, content_preview)
-                VALUES (?, ?, ?, ?, ?, ?)
-            '''
-            cursor = self.conn.cursor()
-            try:
-                cursor.execute(query, (
-                    leak_data.get('timestamp'), leak_data.get('source'), leak_data.get('keyword'),
-                    leak_data.get('title'), leak_data.get('url'), leak_data.get('content_preview')
-                ))
-                self.conn.commit()
-                return cursor.lastrowid > 0
-            finally:
-                cursor.close()
-    
+        return bool(self.add_pastebin_leak_many([leak_data]))
+
     def update_leak_with_ai_analysis(self, unified_id, analysis_result):
-        with self._lock:
+        with self._db.write():
             source, leak_id = self._get_source_and_id(unified_id)
             if not source: return
             table_name = f"{source}_leaks"
@@ -290,12 +237,11 @@ class DBManager:
             cursor = self.conn.cursor()
             try:
                 cursor.execute(query, (analysis_result.get('risk_level'), analysis_result.get('confidence'), report_str, leak_id))
-                self.conn.commit()
             finally:
                 cursor.close()
 
     def update_leak_status(self, unified_id, status):
-        with self._lock:
+        with self._db.write():
             source, leak_id = self._get_source_and_id(unified_id)
             if not source: return
             table_name = f"{source}_leaks"
@@ -303,12 +249,11 @@ class DBManager:
             cursor = self.conn.cursor()
             try:
                 cursor.execute(query, (status, leak_id))
-                self.conn.commit()
             finally:
                 cursor.close()
 
     def update_community_score(self, server_id, server_name, invite_code, score, keywords, status):
-        with self._lock:
+        with self._db.write():
             query = '''
                 INSERT INTO community_threat_scores (server_id, server_name, invite_code, danger_score, last_analyzed_at, hit_keywords, status)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -322,7 +267,6 @@ class DBManager:
             cursor = self.conn.cursor()
             try:
                 cursor.execute(query, (server_id, server_name, invite_code, score, timestamp, keywords_str, status))
-                self.conn.commit()
             finally:
                 cursor.close()
 
@@ -456,40 +400,151 @@ class DBManager:
         return None, None
 
     def _format_leak_rows(self, rows, source):
+        # ai_report / matches は参照されたときにデコードする (query.LazyRecord)
+        listing = LISTINGS[source]
         leaks = []
         for r in rows:
             try:
-                # sqlite3.Rowオブジェクトをミュータブルな辞書に変換
-                leak_item = dict(r)
-                db_id = leak_item['id']
-
-                # 整数の 'id' をフォーマットされた文字列の 'id' で上書きする
-                if source == 'github':
-                    leak_item['id'] = f"gh-{db_id}"
-                    leak_item['matches'] = json.loads(leak_item.get('matches') or '[]')
-                elif source == 'x':
-                    leak_item['id'] = f"x-{db_id}"
-                elif source == 'discord':
-                    leak_item['id'] = f"dsc-{db_id}"
-                elif source == 'pastebin':
-                    leak_item['id'] = f"pst-{db_id}"
-                
-                ai_report_raw = leak_item.get('ai_report')
-                if ai_report_raw:
-                    try:
-                        report_data = json.loads(ai_report_raw)
-                        leak_item['ai_report'] = {"report_data": report_data}
-                    except (json.JSONDecodeError, TypeError):
-                        leak_item['ai_report'] = {"report_data": {'error_report': f"DBから不正な形式のレポートを読込: {ai_report_raw}"}}
-                else:
-                    leak_item['ai_report'] = {"report_data": {}}
-                
-                leaks.append(leak_item)
+                leaks.append(format_record(listing, r))
             except (IndexError, KeyError) as e:
                 print(f"[DBManager] Warning: Row with incorrect columns/keys for source '{source}'. Error: {e}. Skipping.")
                 continue
         return leaks
 
+    def query_page(self, listing_name, limit=100, cursor=None, sort='id', descending=True, filters=None,
+                   columns=None, since=None, until=None):
+        """
+        一覧をキーセット方式で1ページずつ読む。listing_nameは query.LISTINGS のキー。
+        filtersは {列: 値 または 値のリスト}、columnsは取得する列 (省略時はすべて)、since/untilは時刻の列の範囲。
+        {'items': [...], 'next_cursor': 次のページを読むときに渡すcursor (最後のページならNone)} を返す。
+        """
+        listing = LISTINGS[listing_name]
+        query, params, _ = build_page_query(
+            listing, columns=columns, filters=filters, sort=sort, descending=descending,
+            cursor=cursor, since=since, until=until, limit=limit
+        )
+        db_cursor = self.conn.cursor()
+        try:
+            rows = db_cursor.execute(query, params).fetchall()
+        finally:
+            db_cursor.close()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = (last['id'],) if sort == 'id' else (last[sort], last['id'])
+        return {'items': [format_record(listing, r) for r in rows], 'next_cursor': next_cursor}
+
+    def get_leaks_page(self, source, **kwargs):
+        """sourceは 'github' / 'x' / 'discord' / 'pastebin'。引数は query_page と同じ"""
+        if source not in ('github', 'x', 'discord', 'pastebin'):
+            raise ValueError(f"Unknown leak source: {source}")
+        return self.query_page(source, **kwargs)
+
+    def get_network_incidents_page(self, **kwargs):
+        return self.query_page('network_incidents', **kwargs)
+
+    def get_file_events_page(self, **kwargs):
+        return self.query_page('file_events', **kwargs)
+
+    def get_trinity_simulations_page(self, **kwargs):
+        return self.query_page('trinity_simulations', **kwargs)
+
+    def search(self, text, sources=None, limit=50, raw=False, order='rank', snippet_tokens=48, markers=('[', ']')):
+        """
+        漏洩情報・SIGMAのマッチしたログ・AIレポートを全文検索し、関連の高い順に最大limit件を返す。
+        textは3文字以上の文字列で、部分一致で検索する (raw=TrueならFTS5の問い合わせ構文として扱う)。
+        各要素は {'source', 'id', 'rank', 'snippet'}。rankはbm25の値で、小さいほど関連が高い。
+        order='recent' ではスコアを計算せず新しく登録された順に返す。ほとんどの行に一致するような語では
+        bm25の並べ替えに一致した全行の採点が必要になるため、こちらの方が速い。
+        SQLiteにtrigramトークナイザーが無くFTS5の索引を作れなかった場合は、元のテーブルを LIKE で探す。
+        この場合rankはNoneで、orderによらず新しく登録された順に返し、raw=Trueは使えない。
+        """
+        if order not in ('rank', 'recent'):
+            raise ValueError(f"order must be 'rank' or 'recent': {order}")
+        text = (text or '').strip()
+        if not raw:
+            # trigramトークナイザーは3文字未満の文字列を索引から探せない
+            if len(text) < 3:
+                raise ValueError("Search text must be at least 3 characters.")
+        names = list(sources) if sources else list(SEARCH_SOURCES)
+        unknown = [name for name in names if name not in SEARCH_SOURCES]
+        if unknown:
+            raise ValueError(f"Unknown search sources: {unknown}")
+        fts_tables = self._search_fts_tables()
+        if raw and any(f"{SEARCH_SOURCES[name][0]}_fts" not in fts_tables for name in names):
+            raise ValueError("Raw FTS5 queries need the full-text search index, which this SQLite cannot build.")
+
+        results = []
+        cursor = self.conn.cursor()
+        try:
+            for name in names:
+                table, columns, id_prefix = SEARCH_SOURCES[name]
+                fts = f"{table}_fts"
+                if fts in fts_tables:
+                    rows = self._search_fts(cursor, fts, text if raw else fts_phrase(text), limit, order,
+                                            snippet_tokens, markers)
+                else:
+                    rows = self._search_like(cursor, table, columns, text, limit, snippet_tokens, markers)
+                for row_id, rank, snippet in rows:
+                    results.append({
+                        'source': name,
+                        'id': f"{id_prefix}-{row_id}" if id_prefix else row_id,
+                        'rank': rank,
+                        'snippet': snippet,
+                    })
+        finally:
+            cursor.close()
+        # 各テーブルの上位をまとめて並べ直す (recentではテーブルごとの新しい順のまま、ソースの順に並べる)
+        if order == 'rank' and all(r['rank'] is not None for r in results):
+            results.sort(key=lambda r: r['rank'])
+        return results[:limit]
+
+    def _search_fts_tables(self):
+        """検索に使えるFTS5テーブルの集合。マイグレーションで作られなかったものや、開けないものは含めない"""
+        if self._fts_tables is None:
+            names = {f"{table}_fts" for table, _, _ in SEARCH_SOURCES.values()}
+            cursor = self.conn.cursor()
+            try:
+                existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                usable = set()
+                for fts in names & existing:
+                    # trigramのあるSQLiteで作った索引も、trigramの無いSQLiteでは開けない
+                    try:
+                        cursor.execute(f"SELECT rowid FROM {fts} LIMIT 0").fetchall()
+                    except sqlite3.OperationalError:
+                        continue
+                    usable.add(fts)
+            finally:
+                cursor.close()
+            self._fts_tables = usable
+        return self._fts_tables
+
+    @staticmethod
+    def _search_fts(cursor, fts, query_text, limit, order, snippet_tokens, markers):
+        rank_column = 'rank' if order == 'rank' else 'NULL'
+        order_by = 'rank' if order == 'rank' else 'rowid DESC'
+        query = (f"SELECT rowid, {rank_column}, snippet({fts}, -1, ?, ?, '…', ?) FROM {fts} "
+                 f"WHERE {fts} MATCH ? ORDER BY {order_by} LIMIT ?")
+        try:
+            return cursor.execute(query, (markers[0], markers[1], snippet_tokens, query_text, limit)).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search query '{query_text}': {e}") from e
+
+    @staticmethod
+    def _search_like(cursor, table, columns, text, limit, snippet_tokens, markers):
+        # 索引が無いため全行を走査する。新しい行から順に探し、limit件で打ち切る
+        where = ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for column in columns)
+        query = f"SELECT id, {', '.join(columns)} FROM {table} WHERE {where} ORDER BY id DESC LIMIT ?"
+        pattern = like_pattern(text)
+        rows = []
+        for row in cursor.execute(query, (pattern,) * len(columns) + (limit,)).fetchall():
+            value = next((v for v in row[1:] if v is not None and text.lower() in str(v).lower()), None)
+            if value is None:
+                value = next((v for v in row[1:] if v is not None), '')
+            rows.append((row[0], None, like_snippet(value, text, markers, snippet_tokens)))
+        return rows
+
     def get_event_by_id(self, event_id):
         tables_to_search = ['file_events', 'network_incidents']
         cursor = self.conn.cursor()
@@ -510,7 +565,7 @@ class DBManager:
 
 
     def save_trinity_simulation(self, context, red_output, blue_output, white_report):
-        with self._lock:
+        with self._db.write():
             timestamp = datetime.now(timezone.utc).isoformat()
             query = """
                 INSERT INTO trinity_ai_simulations 
@@ -520,7 +575,6 @@ class DBManager:
             cursor = self.conn.cursor()
             try:
                 cursor.execute(query, (timestamp, context, red_output, blue_output, white_report))
-                self.conn.commit()
                 return cursor.lastrowid
             except sqlite3.Error as e:
                 print(f"Error saving trinity simulation: {e}")
@@ -529,17 +583,20 @@ class DBManager:
                 cursor.close()
 
     def get_all_trinity_simulations(self):
-        query = "SELECT id, simulation_time, red_team_output, blue_team_output, white_team_report FROM trinity_ai_simulations ORDER BY simulation_time DESC"
-        cursor = self.conn.cursor()
+        columns = ('id', 'simulation_time', 'red_team_output', 'blue_team_output', 'white_team_report')
+        simulations, page_cursor = [], None
         try:
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            # 他の一覧と同じく query_page で simulation_time のインデックス順に1ページずつ読む
+            while True:
+                page = self.query_page('trinity_simulations', limit=100, cursor=page_cursor,
+                                       sort='simulation_time', columns=columns)
+                simulations.extend(dict(item) for item in page['items'])
+                page_cursor = page['next_cursor']
+                if page_cursor is None:
+                    return simulations
         except sqlite3.Error as e:
             print(f"Error fetching trinity simulations: {e}")
             return []
-        finally:
-            cursor.close()
 
     def get_trinity_simulation_by_id(self, sim_id):
         """指定されたIDのシミュレーション結果を1件取得する"""
@@ -556,13 +613,12 @@ class DBManager:
             cursor.close()
 
     def add_system_learning(self, sim_id, learning_type, content):
-        with self._lock:
+        with self._db.write():
             timestamp = datetime.now(timezone.utc).isoformat()
             query = "INSERT INTO system_learnings (learning_time, source_simulation_id, learning_type, learning_content) VALUES (?, ?, ?, ?)"
             cursor = self.conn.cursor()
             try:
                 cursor.execute(query, (timestamp, sim_id, learning_type, content))
-                self.conn.commit()
             except sqlite3.Error as e:
                 print(f"Error adding system learning: {e}")
             finally:
@@ -582,12 +638,11 @@ class DBManager:
             cursor.close()
             
     def delete_trinity_simulation(self, sim_id):
-        with self._lock:
+        with self._db.write():
             cursor = self.conn.cursor()
             try:
                 cursor.execute("DELETE FROM system_learnings WHERE source_simulation_id = ?", (sim_id,))
                 cursor.execute("DELETE FROM trinity_ai_simulations WHERE id = ?", (sim_id,))
-                self.conn.commit()
                 return True
             except sqlite3.Error as e:
                 print(f"Error deleting trinity simulation for ID {sim_id}: {e}")
@@ -595,9 +650,10 @@ class DBManager:
             finally:
                 cursor.close()
 
-    def __del__(self):
-        if hasattr(self, 'conn') and self.conn:
-            self.conn.close()
+    def close(self):
+        """各スレッドの接続を閉じる"""
+        if self._db is not None:
+            self._db.close_all()
 
 def get_session():
     if DBManager._Session is None:
@@ -0,0 +1,229 @@
+# CYBER-AEGIS/src/database/migrations.py
+import logging
+import sqlite3
+from collections import namedtuple
+
+from .query import LISTINGS, SEARCH_SOURCES, build_page_query
+
+logger = logging.getLogger(__name__)
+
+# version: 適用後の PRAGMA user_version
+# statements: 実行するSQL。既存のデータベースにも途中から適用できるよう、すべて IF NOT EXISTS で書く。
+#             SQLiteの機能によって変わる場合は、接続を受け取ってSQLのタプルを返す関数にする
+# queries: このマイグレーションで速くなる問い合わせと、EXPLAIN QUERY PLAN で使われるべきインデックス名の組
+# columns: statementsより先に追加する (テーブル, 列, 型) の組。create_allは既存のテーブルに列を追加せず、
+#          ALTER TABLE ADD COLUMN には IF NOT EXISTS がないため、列がないときだけ追加する
+Migration = namedtuple('Migration', ['version', 'description', 'statements', 'queries', 'columns'], defaults=((),))
+
+
+def _fts_statements(table, columns):
+    """
+    table の columns を対象にした外部コンテンツ方式のFTS5テーブルと、それを同期するトリガーを作るSQL。
+    本文はFTS5側に複製せず元のテーブルから読むため、snippet() も元の行から作られる。
+    trigramトークナイザーで3文字以上の任意の部分文字列(ホスト名・メールアドレス・APIキーの先頭・日本語)を検索できる。
+    """
+    fts = f"{table}_fts"
+    cols = ', '.join(columns)
+    new_values = ', '.join(f"new.{c}" for c in columns)
+    old_values = ', '.join(f"old.{c}" for c in columns)
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+        # ステータスや件数だけの更新では索引を作り直さないよう、対象の列が変わったときだけ発火させる
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_values}); END",
+        # 既存の行を索引に入れる
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+    )
+
+
+def fts_trigram_available(conn):
+    """
+    FTS5のtrigramトークナイザーが使えるか。trigramは SQLite 3.34.0 以降で、FTS5を含めてビルドされている場合だけ使える。
+    """
+    if sqlite3.sqlite_version_info < (3, 34, 0):
+        return False
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.aegis_trigram_probe USING fts5(body, tokenize='trigram')")
+        conn.execute("DROP TABLE temp.aegis_trigram_probe")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def _search_statements(conn):
+    """
+    DBManager.search 用のFTS5テーブルとトリガー。trigramが使えない環境では作らず、検索は LIKE で行う
+    (unicode61などの単語単位のトークナイザーでは、部分一致という検索の意味が変わってしまうため)。
+    """
+    if not fts_trigram_available(conn):
+        logger.warning(f"SQLite {sqlite3.sqlite_version} has no FTS5 trigram tokenizer (3.34.0+ is required). "
+                       f"Full-text search indexes are not created and DBManager.search falls back to LIKE.")
+        return ()
+    return tuple(statement for table, columns, _ in SEARCH_SOURCES.values()
+                 for statement in _fts_statements(table, columns))
+
+
+def _page_query(listing_name, **kwargs):
+    """DBManager.query_page が発行するキーセット方式の問い合わせのSQL"""
+    return build_page_query(LISTINGS[listing_name], **kwargs)[0]
+
+
+MIGRATIONS = (
+    Migration(
+        1, "sigma_matchesの抑制キー (SigmaMatchWriterの件数の更新)",
+        ("CREATE INDEX IF NOT EXISTS ix_sigma_matches_suppression_key ON sigma_matches (suppression_key)",),
+        (("UPDATE sigma_matches SET hit_count = hit_count + 1 WHERE suppression_key = ?",
+          'ix_sigma_matches_suppression_key'),),
+        columns=(
+            ('sigma_matches', 'source', 'VARCHAR'),
+            ('sigma_matches', 'hit_count', 'INTEGER DEFAULT 1'),
+            ('sigma_matches', 'first_seen', 'DATETIME'),
+            ('sigma_matches', 'last_seen', 'DATETIME'),
+            ('sigma_matches', 'suppression_key', 'VARCHAR'),
+        ),
+    ),
+    Migration(
+        2, "sigma_matchesの検知時刻順の一覧 (ログ監視画面)",
+        ("CREATE INDEX IF NOT EXISTS ix_sigma_matches_timestamp ON sigma_matches (timestamp)",),
+        (("SELECT id, rule_title, rule_level FROM sigma_matches ORDER BY timestamp DESC LIMIT 500",
+          'ix_sigma_matches_timestamp'),),
+    ),
+    Migration(
+        3, "ネットワーク・ファイルイベントの脅威レベル別の集計と絞り込み",
+        (
+            "CREATE INDEX IF NOT EXISTS ix_network_incidents_threat_level_event_time ON network_incidents (threat_level, event_time)",
+            "CREATE INDEX IF NOT EXISTS ix_file_events_threat_level_event_time ON file_events (threat_level, event_time)",
+        ),
+        (
+            # get_threat_level_distribution
+            ("SELECT threat_level, COUNT(*) FROM network_incidents WHERE threat_level IS NOT NULL GROUP BY threat_level",
+             'ix_network_incidents_threat_level_event_time'),
+            ("SELECT threat_level, COUNT(*) FROM file_events WHERE threat_level IS NOT NULL GROUP BY threat_level",
+             'ix_file_events_threat_level_event_time'),
+            ("SELECT event_id FROM network_incidents WHERE threat_level = ? ORDER BY event_time DESC LIMIT 100",
+             'ix_network_incidents_threat_level_event_time'),
+            ("SELECT event_id FROM file_events WHERE threat_level = ? ORDER BY event_time DESC LIMIT 100",
+             'ix_file_events_threat_level_event_time'),
+        ),
+    ),
+    Migration(
+        4, "漏洩情報のステータス別の一覧と収集時刻順の一覧",
+        tuple(
+            statement
+            for table in ('github_leaks', 'x_leaks', 'discord_leaks', 'pastebin_leaks')
+            for statement in (
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_status_timestamp ON {table} (status, timestamp)",
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_timestamp ON {table} (timestamp)",
+            )
+        ),
+        (
+            # get_pending_leaks
+            ("SELECT id FROM github_leaks WHERE status = 'PENDING'", 'ix_github_leaks_status_timestamp'),
+            ("SELECT id FROM x_leaks WHERE status = ? ORDER BY timestamp DESC LIMIT 100", 'ix_x_leaks_status_timestamp'),
+            ("SELECT id FROM discord_leaks ORDER BY timestamp DESC LIMIT 100", 'ix_discord_leaks_timestamp'),
+            ("SELECT id FROM pastebin_leaks ORDER BY timestamp DESC LIMIT 100", 'ix_pastebin_leaks_timestamp'),
+        ),
+    ),
+    Migration(
+        5, "AIチャットの会話一覧と会話ごとのメッセージ",
+        (
+            "CREATE INDEX IF NOT EXISTS ix_messages_conversation_id_timestamp ON messages (conversation_id, timestamp)",
+            "CREATE INDEX IF NOT EXISTS ix_conversations_created_at ON conversations (created_at)",
+        ),
+        (
+            # get_messages_for_conversation
+            ("SELECT text, is_user FROM messages WHERE conversation_id = ? ORDER BY timestamp ASC",
+             'ix_messages_conversation_id_timestamp'),
+            # get_all_conversations
+            ("SELECT id, title FROM conversations ORDER BY created_at DESC", 'ix_conversations_created_at'),
+        ),
+    ),
+    Migration(
+        6, "シミュレーション結果・学習内容・コミュニティの危険度の一覧",
+        (
+            "CREATE INDEX IF NOT EXISTS ix_trinity_ai_simulations_simulation_time ON trinity_ai_simulations (simulation_time)",
+            "CREATE INDEX IF NOT EXISTS ix_system_learnings_source_simulation_id_learning_type ON system_learnings (source_simulation_id, learning_type)",
+            "CREATE INDEX IF NOT EXISTS ix_community_threat_scores_danger_score ON community_threat_scores (danger_score)",
+        ),
+        (
+            # get_all_trinity_simulations
+            ("SELECT id, simulation_time FROM trinity_ai_simulations ORDER BY simulation_time DESC",
+             'ix_trinity_ai_simulations_simulation_time'),
+            # get_system_learning_by_sim_id / delete_trinity_simulation
+            ("SELECT learning_content FROM system_learnings WHERE source_simulation_id = ? AND learning_type = 'New Analyzer Module' LIMIT 1",
+             'ix_system_learnings_source_simulation_id_learning_type'),
+            # get_high_threat_communities
+            ("SELECT server_name, danger_score FROM community_threat_scores ORDER BY danger_score DESC LIMIT ?",
+             'ix_community_threat_scores_danger_score'),
+        ),
+    ),
+    Migration(
+        7, "漏洩情報・SIGMAのログ・AIレポートの全文検索 (DBManager.search)",
+        _search_statements,
+        tuple(
+            (f"SELECT rowid, rank FROM {table}_fts WHERE {table}_fts MATCH ? ORDER BY rank LIMIT 50", f"{table}_fts")
+            for table, _, _ in SEARCH_SOURCES.values()
+        ),
+    ),
+    Migration(
+        8, "ネットワーク・ファイルイベントの発生時刻順のページング (DBManager.query_page)",
+        (
+            "CREATE INDEX IF NOT EXISTS ix_network_incidents_event_time ON network_incidents (event_time)",
+            "CREATE INDEX IF NOT EXISTS ix_file_events_event_time ON file_events (event_time)",
+        ),
+        (
+            # 最初のページ、続きのページ、期間での絞り込み。ORDER BY の id はインデックスに含まれるrowidで並ぶ
+            (_page_query('network_incidents', sort='event_time'), 'ix_network_incidents_event_time'),
+            (_page_query('network_incidents', sort='event_time', cursor=(None, None)), 'ix_network_incidents_event_time'),
+            (_page_query('file_events', sort='event_time', cursor=(None, None)), 'ix_file_events_event_time'),
+            (_page_query('file_events', sort='event_time', descending=False, since='', until=''), 'ix_file_events_event_time'),
+            (_page_query('network_incidents', sort='event_time', filters={'threat_level': ''}, cursor=(None, None)),
+             'ix_network_incidents_threat_level_event_time'),
+            # 既存のインデックスを使う一覧の続きのページ
+            (_page_query('github', sort='timestamp', cursor=(None, None)), 'ix_github_leaks_timestamp'),
+            (_page_query('trinity_simulations', sort='simulation_time', cursor=(None, None), columns=('id', 'simulation_time')),
+             'ix_trinity_ai_simulations_simulation_time'),
+        ),
+    ),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _add_column(conn, table, column, column_type):
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if columns and column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def migrate(conn):
+    """
+    PRAGMA user_version より新しいマイグレーションを順に適用し、適用後のバージョンを返す。
+    user_versionの更新もトランザクションに含まれるため、呼び出し側の書き込みトランザクション内で実行すれば、
+    途中で失敗しても適用前の状態に戻る。
+    """
+    current = get_version(conn)
+    if current > LATEST_VERSION:
+        logger.warning(f"Database schema version {current} is newer than this release ({LATEST_VERSION}).")
+        return current
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        for table, column, column_type in migration.columns:
+            _add_column(conn, table, column, column_type)
+        statements = migration.statements(conn) if callable(migration.statements) else migration.statements
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+        current = migration.version
+        logger.info(f"Applied schema migration {migration.version}: {migration.description}")
+    return current
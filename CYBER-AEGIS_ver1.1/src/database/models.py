@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, text
 from sqlalchemy.orm import declarative_base
 import datetime
 
@@ -6,8 +6,8 @@ import datetime
 Base = declarative_base()
 
 #
-# --- 将来的には、既存のテーブルもこのファイルでクラスとして定義し、 ---
-# --- db_manager.py の CREATE TABLE文を削除していくと、より管理しやすくなります ---
+# --- すべてのテーブルをこのファイルで定義し、setup_tables の create_all で作成する ---
+# --- 検索用のインデックスや後からのスキーマ変更は migrations.py のマイグレーションで行う ---
 #
 
 class SigmaMatch(Base):
@@ -25,4 +25,186 @@ class SigmaMatch(Base):
     # --- ▲ここまで修正 ---
     
     detection_details = Column(Text)
-    log_entry = Column(Text)
\ No newline at end of file
+    log_entry = Column(Text)
+    # マッチしたログの読み取り元 (ログファイルのパス)
+    source = Column(String)
+    # 抑制ウィンドウ内で同じルール・同じ値のマッチをまとめた件数と、その最初と最後の検知時刻(イベント時刻)
+    hit_count = Column(Integer, default=1)
+    first_seen = Column(DateTime)
+    last_seen = Column(DateTime)
+    suppression_key = Column(String, index=True)
+
+
+class LogCheckpoint(Base):
+    """監視中のログファイルをどこまで処理したかの記録。マッチ結果と同じトランザクションで更新する"""
+    __tablename__ = 'log_checkpoints'
+
+    path = Column(String, primary_key=True)
+    # Windowsのファイルインデックスは64bitを超えることがあるため文字列で保存する
+    inode = Column(String)
+    offset = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+
+
+# --- 以下は db_manager.py の CREATE TABLE文から移したテーブル。既存のデータベースと同じ定義にしている ---
+
+class NetworkIncident(Base):
+    """ネットワーク監視で検知した通信"""
+    __tablename__ = 'network_incidents'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    event_id = Column(Text, nullable=False, unique=True)
+    process_name = Column(Text)
+    event_time = Column(Text, nullable=False)
+    destination = Column(Text)
+    threat_level = Column(Text)
+    status = Column(Text)
+    description = Column(Text)
+
+
+class FileEvent(Base):
+    """ファイル監視で検知したイベント"""
+    __tablename__ = 'file_events'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    event_id = Column(Text, nullable=False, unique=True)
+    event_type = Column(Text)
+    file_path = Column(Text, nullable=False)
+    event_time = Column(Text, nullable=False)
+    threat_level = Column(Text)
+    description = Column(Text)
+
+
+class GithubLeak(Base):
+    __tablename__ = 'github_leaks'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(Text, nullable=False)
+    source = Column(Text)
+    keyword = Column(Text)
+    repository = Column(Text)
+    file_path = Column(Text)
+    url = Column(Text, unique=True)
+    # マッチした文字列のJSON配列
+    matches = Column(Text)
+    risk_level = Column(Text)
+    confidence = Column(Float)
+    ai_report = Column(Text)
+    status = Column(Text, server_default=text("'NEW'"))
+
+
+class XLeak(Base):
+    __tablename__ = 'x_leaks'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(Text, nullable=False)
+    source = Column(Text)
+    keyword = Column(Text)
+    author = Column(Text)
+    tweet_text = Column(Text)
+    url = Column(Text, unique=True)
+    tweet_created_at = Column(Text)
+    risk_level = Column(Text)
+    confidence = Column(Float)
+    ai_report = Column(Text)
+    status = Column(Text, server_default=text("'NEW'"))
+
+
+class DiscordLeak(Base):
+    __tablename__ = 'discord_leaks'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(Text, nullable=False)
+    source = Column(Text)
+    keyword = Column(Text)
+    server = Column(Text)
+    channel = Column(Text)
+    author = Column(Text)
+    message_text = Column(Text)
+    url = Column(Text, unique=True)
+    risk_level = Column(Text)
+    confidence = Column(Float)
+    ai_report = Column(Text)
+    status = Column(Text, server_default=text("'NEW'"))
+
+
+class CommunityThreatScore(Base):
+    """Discordサーバーごとの危険度の分析結果"""
+    __tablename__ = 'community_threat_scores'
+
+    server_id = Column(Text, primary_key=True)
+    server_name = Column(Text)
+    invite_code = Column(Text)
+    danger_score = Column(Integer)
+    last_analyzed_at = Column(Text)
+    hit_keywords = Column(Text)
+    status = Column(Text, server_default=text("'UNKNOWN'"))
+
+
+class PastebinLeak(Base):
+    __tablename__ = 'pastebin_leaks'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(Text, nullable=False)
+    source = Column(Text)
+    keyword = Column(Text)
+    title = Column(Text)
+    url = Column(Text, unique=True)
+    content_preview = Column(Text)
+    risk_level = Column(Text)
+    confidence = Column(Float)
+    ai_report = Column(Text)
+    status = Column(Text, server_default=text("'NEW'"))
+
+
+class Conversation(Base):
+    """AIチャットの会話"""
+    __tablename__ = 'conversations'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    title = Column(Text, nullable=False)
+    created_at = Column(Text, nullable=False)
+
+
+class Message(Base):
+    __tablename__ = 'messages'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(Integer, ForeignKey('conversations.id', ondelete='CASCADE'), nullable=False)
+    # 1: ユーザー, 0: AI
+    is_user = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    timestamp = Column(Text, nullable=False)
+
+
+class TrinityAISimulation(Base):
+    """Red / Blue / White チームによるシミュレーションの結果"""
+    __tablename__ = 'trinity_ai_simulations'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    simulation_time = Column(Text, nullable=False)
+    context_data = Column(Text)
+    red_team_output = Column(Text)
+    blue_team_output = Column(Text)
+    white_team_report = Column(Text)
+
+
+class SystemLearning(Base):
+    """シミュレーションから得た学習内容"""
+    __tablename__ = 'system_learnings'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    learning_time = Column(Text, nullable=False)
+    source_simulation_id = Column(Integer, ForeignKey('trinity_ai_simulations.id'))
+    learning_type = Column(Text)
+    learning_content = Column(Text)
@@ -0,0 +1,275 @@
+# CYBER-AEGIS/src/database/query.py
+import json
+from collections import namedtuple
+
+# 1件ずつ表示する一覧のための定義。
+# columns: 取得できる列 / sort_columns: 並べ替えに使える列 (migrations.py でインデックスを張った列)
+# filter_columns: 一致条件で絞り込める列 / aliases: 呼び出し側に返すキー名 (従来のget_all_*の形式に合わせる)
+# id_prefix: idを "gh-12" の形式にする場合の接頭辞 / decoders: 参照されたときにデコードする列
+Listing = namedtuple('Listing', ['table', 'columns', 'sort_columns', 'filter_columns', 'aliases', 'id_prefix', 'decoders'])
+
+
+def decode_matches(raw):
+    try:
+        return json.loads(raw or '[]')
+    except (json.JSONDecodeError, TypeError):
+        return []
+
+
+def decode_ai_report(raw):
+    if not raw:
+        return {"report_data": {}}
+    try:
+        return {"report_data": json.loads(raw)}
+    except (json.JSONDecodeError, TypeError):
+        return {"report_data": {'error_report': f"DBから不正な形式のレポートを読込: {raw}"}}
+
+
+_LEAK_COMMON = ('id', 'timestamp', 'source', 'keyword')
+_LEAK_ANALYSIS = ('risk_level', 'confidence', 'ai_report', 'status')
+_LEAK_FILTERS = ('status', 'risk_level', 'keyword', 'source')
+
+LISTINGS = {
+    'github': Listing(
+        'github_leaks', _LEAK_COMMON + ('repository', 'file_path', 'url', 'matches') + _LEAK_ANALYSIS,
+        ('id', 'timestamp'), _LEAK_FILTERS + ('repository',), {}, 'gh',
+        {'matches': decode_matches, 'ai_report': decode_ai_report}
+    ),
+    'x': Listing(
+        'x_leaks', _LEAK_COMMON + ('author', 'tweet_text', 'url', 'tweet_created_at') + _LEAK_ANALYSIS,
+        ('id', 'timestamp'), _LEAK_FILTERS + ('author',), {}, 'x',
+        {'ai_report': decode_ai_report}
+    ),
+    'discord': Listing(
+        'discord_leaks', _LEAK_COMMON + ('server', 'channel', 'author', 'message_text', 'url') + _LEAK_ANALYSIS,
+        ('id', 'timestamp'), _LEAK_FILTERS + ('server', 'channel', 'author'), {}, 'dsc',
+        {'ai_report': decode_ai_report}
+    ),
+    'pastebin': Listing(
+        'pastebin_leaks', _LEAK_COMMON + ('title', 'url', 'content_preview') + _LEAK_ANALYSIS,
+        ('id', 'timestamp'), _LEAK_FILTERS, {}, 'pst',
+        {'ai_report': decode_ai_report}
+    ),
+    'network_incidents': Listing(
+        'network_incidents', ('id', 'event_id', 'process_name', 'event_time', 'destination', 'threat_level', 'status', 'description'),
+        ('id', 'event_time'), ('threat_level', 'status', 'process_name'),
+        {'event_id': 'id', 'process_name': 'name', 'event_time': 'time'}, None, {}
+    ),
+    'file_events': Listing(
+        'file_events', ('id', 'event_id', 'event_type', 'file_path', 'event_time', 'threat_level', 'description'),
+        ('id', 'event_time'), ('threat_level', 'event_type'),
+        {'event_id': 'id', 'file_path': 'path', 'event_time': 'time'}, None, {}
+    ),
+    'trinity_simulations': Listing(
+        'trinity_ai_simulations', ('id', 'simulation_time', 'context_data', 'red_team_output', 'blue_team_output', 'white_team_report'),
+        ('id', 'simulation_time'), (), {}, None, {}
+    ),
+}
+
+
+# DBManager.search で検索できる対象: 名前 -> (テーブル, 検索する列, 結果のidの接頭辞)。
+# 各テーブルの全文検索用のFTS5テーブル "<テーブル>_fts" は migrations.py で作る
+SEARCH_SOURCES = {
+    'github': ('github_leaks', ('matches', 'ai_report'), 'gh'),
+    'x': ('x_leaks', ('tweet_text', 'ai_report'), 'x'),
+    'discord': ('discord_leaks', ('message_text', 'ai_report'), 'dsc'),
+    'pastebin': ('pastebin_leaks', ('content_preview', 'ai_report'), 'pst'),
+    'sigma': ('sigma_matches', ('log_entry',), None),
+    'trinity': ('trinity_ai_simulations', ('white_team_report',), None),
+}
+
+
+def fts_phrase(text):
+    """入力をそのままの文字列として検索するFTS5の問い合わせにする (trigramでは部分一致になる)"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def like_pattern(text):
+    """入力を部分一致で探す LIKE のパターンにする (ESCAPE '\\' と組み合わせて使う)"""
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def like_snippet(value, text, markers, width):
+    """
+    FTS5が使えないときの snippet() の代わり。valueの中で最初にtextが現れた位置の前後width文字程度を切り出し、
+    一致した部分をmarkersで囲む。
+    """
+    value = str(value)
+    position = value.lower().find(text.lower())
+    if position < 0:
+        return value[:width]
+    start = max(0, position - max(0, width - len(text)) // 2)
+    end = min(len(value), max(start + width, position + len(text)))
+    return (('…' if start > 0 else '') + value[start:position] + markers[0] + value[position:position + len(text)]
+            + markers[1] + value[position + len(text):end] + ('…' if end < len(value) else ''))
+
+
+class LazyRecord(dict):
+    """
+    DBの1行を表す辞書。decodersに指定した列(JSON文字列など)は、最初に参照されたときに初めてデコードする。
+    一覧表示では参照されない ai_report や matches のデコードを省くためのもの。
+    反復・items()・json.dumps などで全体を参照する場合は、その時点で残りをすべてデコードする。
+    """
+    __slots__ = ('_pending',)
+
+    def __init__(self, values, pending=None):
+        super().__init__(values)
+        # キー -> (デコード前の値, デコード関数)
+        self._pending = pending or {}
+
+    def _decode(self, key):
+        raw, decoder = self._pending.pop(key)
+        value = decoder(raw)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def _decode_all(self):
+        for key in list(self._pending):
+            self._decode(key)
+
+    def __missing__(self, key):
+        if key in self._pending:
+            return self._decode(key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._pending:
+            return self._decode(key)
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        return key in self._pending or dict.__contains__(self, key)
+
+    def __setitem__(self, key, value):
+        self._pending.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if key in self._pending:
+            del self._pending[key]
+            return
+        dict.__delitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._pending)
+
+    def __iter__(self):
+        self._decode_all()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self._decode_all()
+        return dict.keys(self)
+
+    def items(self):
+        self._decode_all()
+        return dict.items(self)
+
+    def values(self):
+        self._decode_all()
+        return dict.values(self)
+
+    def copy(self):
+        return LazyRecord(dict(dict.items(self)), dict(self._pending))
+
+    def __eq__(self, other):
+        self._decode_all()
+        return dict.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._decode_all()
+        return dict.__repr__(self)
+
+    def __reduce__(self):
+        self._decode_all()
+        return (dict, (dict(dict.items(self)),))
+
+
+def format_record(listing, row):
+    """sqlite3.Rowを呼び出し側の形式の LazyRecord にする"""
+    values, pending = {}, {}
+    for column in row.keys():
+        value = row[column]
+        key = listing.aliases.get(column, column)
+        if column == 'id' and listing.id_prefix:
+            value = f"{listing.id_prefix}-{value}"
+        elif column == 'id' and 'id' in listing.aliases.values():
+            # event_idを'id'として返す一覧では、テーブルの連番は返さない
+            continue
+        if column in listing.decoders:
+            pending[key] = (value, listing.decoders[column])
+        else:
+            values[key] = value
+    return LazyRecord(values, pending)
+
+
+def build_page_query(listing, columns=None, filters=None, sort='id', descending=True, cursor=None,
+                     since=None, until=None, limit=100):
+    """
+    キーセット方式のページングの問い合わせを組み立て、(SQL, パラメータ, 取得する列) を返す。
+    ORDER BY sort, id で並べ、cursor (直前のページの最後の行の (sortの値, id)) より後ろの行だけを読むため、
+    OFFSETと違ってページが深くなっても読み飛ばす行が増えない。
+    """
+    if sort not in listing.sort_columns:
+        raise ValueError(f"sort must be one of {listing.sort_columns}: {sort}")
+    if columns is None:
+        selected = list(listing.columns)
+    else:
+        unknown = [c for c in columns if c not in listing.columns]
+        if unknown:
+            raise ValueError(f"unknown columns for {listing.table}: {unknown}")
+        selected = list(dict.fromkeys(columns))
+    # ページの続きを作るための列は常に取得する
+    for required in ('id', sort):
+        if required not in selected:
+            selected.append(required)
+
+    conditions, params = [], []
+    for column, value in (filters or {}).items():
+        if column not in listing.filter_columns:
+            raise ValueError(f"filter must be one of {listing.filter_columns}: {column}")
+        if isinstance(value, (list, tuple, set)):
+            value = list(value)
+            if not value:
+                conditions.append("0")
+                continue
+            conditions.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        elif value is None:
+            conditions.append(f"{column} IS NULL")
+        else:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if since is not None or until is not None:
+        time_column = next((c for c in listing.sort_columns if c != 'id'), None)
+        if time_column is None:
+            raise ValueError(f"{listing.table} has no time column for since/until")
+        if since is not None:
+            conditions.append(f"{time_column} >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append(f"{time_column} < ?")
+            params.append(until)
+
+    op, direction = ('<', 'DESC') if descending else ('>', 'ASC')
+    if cursor is not None:
+        if sort == 'id':
+            conditions.append(f"id {op} ?")
+            params.append(cursor[-1])
+        else:
+            conditions.append(f"({sort}, id) {op} (?, ?)")
+            params.extend(cursor)
+    order = f"id {direction}" if sort == 'id' else f"{sort} {direction}, id {direction}"
+
+    query = f"SELECT {', '.join(selected)} FROM {listing.table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {order} LIMIT ?"
+    params.append(int(limit) + 1)
+    return query, params, selected
@@ -0,0 +1,60 @@
+# CYBER-AEGIS/src/threat_intel/aho_corasick.py
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    複数の文字列パターンを1回の走査でまとめて検索するオートマトン。
+    search()は出現した(パターン番号, 開始位置, 終了位置)を列挙する。
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] = self._output[state] + (pattern_id,)
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        goto, fail, output = self._goto, self._fail, self._output
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                target = goto[fallback].get(ch, 0)
+                fail[next_state] = target if target != next_state else 0
+                if output[fail[next_state]]:
+                    output[next_state] = output[next_state] + output[fail[next_state]]
+
+    def search(self, text):
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self.patterns
+        state = 0
+        for end, ch in enumerate(text, 1):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern_id in output[state]:
+                yield pattern_id, end - len(patterns[pattern_id]), end
+
+    def __len__(self):
+        return len(self.patterns)
@@ -1,141 +1,173 @@
-import os
-import yaml
-import re
-import json
-
-def flatten_dict(d, parent_key='', sep='.'):
-    items = []
-    for k, v in d.items():
-        new_key = parent_key + sep + k if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_dict(v, new_key, sep=sep).items())
-        else:
-            items.append((new_key.lower(), v))
-    return dict(items)
+import threading
+import time
+from collections.abc import Mapping
+
+from src.threat_intel.sigma_compiler import MatchContext
+from src.threat_intel.sigma_index import SigmaRuleIndex
+from src.threat_intel.sigma_cache import SigmaRuleCache
+from src.threat_intel.sigma_profiler import SigmaRuleProfiler
+# flatten_dictは既存の呼び出し元のためにここからも参照できるようにしておく
+from src.threat_intel.sigma_normalizer import flatten_dict, normalize_event
+
+class SigmaRuleset:
+    """ある時点のルールセットとその索引。生成後は変更せず、再読み込み時は丸ごと差し替える"""
+
+    def __init__(self, rule_cache, logsource_filter=False, previous=None):
+        self.rules = [rule for _, rule in rule_cache.loaded_rules()]
+        self.compiled_rules = rule_cache.compiled_rules()
+        self.rules_by_id = {compiled.rule_id: compiled.rule for compiled in self.compiled_rules}
+        self.correlation_rules = rule_cache.correlation_rules()
+        self.skipped = rule_cache.skipped_count()
+        self.index = SigmaRuleIndex(self.compiled_rules, logsource_filter=logsource_filter)
+        self.literal_index = rule_cache.literal_index()
+        if previous is not None:
+            # 選択率の集計は再読み込みをまたいで引き継ぐ
+            self.index.record(previous.index.events_seen, previous.index.candidates_seen)
+
 
 class SigmaAnalyzer:
-    def __init__(self, rule_dirs):
+    def __init__(self, rule_dirs, logsource_filter=False, cache_path=None, profiling=False):
         self.rule_dirs = rule_dirs
-        self.rules = self._load_rules()
-
-    def _load_rules(self):
-        rules = []
-        for rule_dir in self.rule_dirs:
-            if not os.path.exists(rule_dir):
-                continue
-            for root, _, files in os.walk(rule_dir):
-                for file in files:
-                    if file.endswith((".yml", ".yaml")):
-                        rule_path = os.path.join(root, file)
-                        try:
-                            with open(rule_path, 'r', encoding='utf-8') as f:
-                                rule_content = yaml.safe_load(f)
-                                if rule_content and rule_content.get('detection'):
-                                    rules.append(rule_content)
-                        except Exception:
-                            pass
-        return rules
+        self.cache_path = cache_path
+        self.logsource_filter = logsource_filter
+        self.rule_cache = SigmaRuleCache(cache_path)
+        self.rule_cache.refresh(rule_dirs)
+        self.ruleset = SigmaRuleset(self.rule_cache, logsource_filter=logsource_filter)
+        self.rule_cache.save()
+        if self.ruleset.skipped:
+            print(f"[SigmaAnalyzer] {self.ruleset.skipped} rules use unsupported syntax and were skipped.")
+
+        self._reload_lock = threading.Lock()
+        self.reload_count = 0
+        self.last_reload = None
+        # ルールごとの評価時間・マッチ数の集計 (Noneなら計測しない)
+        self.profiler = SigmaRuleProfiler() if profiling else None
+
+    # 既存の呼び出し元のため、現在のルールセットの属性をそのまま公開する
+    @property
+    def rules(self):
+        return self.ruleset.rules
+
+    @property
+    def compiled_rules(self):
+        return self.ruleset.compiled_rules
+
+    @property
+    def rules_by_id(self):
+        return self.ruleset.rules_by_id
+
+    @property
+    def index(self):
+        return self.ruleset.index
+
+    @property
+    def literal_index(self):
+        return self.ruleset.literal_index
+
+    def reload(self):
+        """
+        ルールディレクトリの変更を取り込み、変更・追加されたルールだけを再コンパイルする。
+        新しいルールセットを組み立ててから参照を1回で差し替えるため、評価中のログは旧/新どちらか一方だけで評価される。
+        変更がなければNoneを返す。
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            changes = self.rule_cache.refresh(self.rule_dirs)
+            if not any(changes.values()):
+                return None
+            ruleset = SigmaRuleset(self.rule_cache, logsource_filter=self.logsource_filter, previous=self.ruleset)
+            self.ruleset = ruleset
+            latency_ms = (time.perf_counter() - start) * 1000
+            self.rule_cache.save()
+
+            self.reload_count += 1
+            self.last_reload = {
+                'time': time.time(),
+                'latency_ms': round(latency_ms, 1),
+                'added': len(changes['added']),
+                'changed': len(changes['changed']),
+                'removed': len(changes['removed']),
+                'rules': len(ruleset.compiled_rules),
+            }
+            return self.last_reload
+
+    def get_reload_stats(self):
+        return {'reload_count': self.reload_count, 'last_reload': self.last_reload}
+
+    def set_profiling(self, enabled):
+        """ルールごとの計測を開始・停止する。停止するとそれまでの集計は破棄される"""
+        if enabled and self.profiler is None:
+            self.profiler = SigmaRuleProfiler()
+        elif not enabled:
+            self.profiler = None
+
+    def get_rule_profile(self, sort='total_ms', top=None):
+        """ルールごとの評価回数・累積時間・マッチ数・例外数を sort の降順で返す。計測していなければ空のリスト"""
+        profiler = self.profiler
+        if profiler is None:
+            return []
+        return profiler.report(self.ruleset.rules_by_id, sort=sort, top=top)
+
+    def dump_rule_profile(self, path, sort='total_ms', top=None):
+        """ルールごとの集計をJSONファイルに書き出す"""
+        profiler = self.profiler
+        if profiler is None:
+            return None
+        return profiler.dump(path, self.ruleset.rules_by_id, sort=sort, top=top)
 
     def analyze_log_entry(self, log_entry):
-        matches = []
-        flat_log = flatten_dict(log_entry)
-        for rule in self.rules:
+        return [compiled.rule for compiled in self._match(log_entry, self.ruleset)]
+
+    def analyze_batch(self, entries):
+        """複数のログをまとめて評価し、入力と同じ順序でマッチしたルールのリストを返す"""
+        ruleset = self.ruleset
+        return [[compiled.rule for compiled in self._match(entry, ruleset)] for entry in entries]
+
+    def analyze_batch_ids(self, entries):
+        """analyze_batchと同じだが、プロセス間で受け渡せるようにルールIDで返す"""
+        ruleset = self.ruleset
+        return [[compiled.rule_id for compiled in self._match(entry, ruleset)] for entry in entries]
+
+    def _match(self, log_entry, ruleset):
+        # JSONの配列や文字列などはフィールドを持たないため、どのルールにもマッチしない
+        if not isinstance(log_entry, Mapping):
+            return []
+        if self.profiler is not None:
+            return self._match_profiled(log_entry, ruleset, self.profiler)
+        matched = []
+        event = normalize_event(log_entry)
+        ctx = MatchContext(event, ruleset.literal_index)
+        for compiled in ruleset.index.candidates(event.fields):
             try:
-                if self._check_rule_match(rule, flat_log):
-                    matches.append(rule)
+                if compiled.matches(ctx):
+                    matched.append(compiled)
             except Exception:
                 pass
-        return matches
-
-    def _check_rule_match(self, rule, flat_log):
-        detection = rule.get('detection', {})
-        condition_str = detection.get('condition')
-        if not condition_str:
-            return False
-        
-        selection_results = {}
-        for key, value in detection.items():
-            if key != 'condition':
-                selection_results[key] = self._evaluate_selection(value, flat_log)
-
-        return self._evaluate_condition(condition_str, selection_results)
-
-    def _evaluate_condition(self, condition_str, results):
-        def replacer(match):
-            aggregator = match.group(1)
-            pattern = match.group(2).replace('*', '.*')
-            
-            matching_keys = [k for k in results if re.fullmatch(pattern, k)]
-            
-            if not matching_keys:
-                return 'False'
-
-            func = 'any' if aggregator in ('1', 'any') else 'all'
-            keys_for_expression = ", ".join([f"results['{key}']" for key in matching_keys])
-            return f"{func}([{keys_for_expression}])"
-
-        processed_condition = re.sub(r'\b(1|all)\s+of\s+([a-zA-Z0-9_*]+)\b', replacer, condition_str)
-
-        for key in sorted(results.keys(), key=len, reverse=True):
-            processed_condition = re.sub(r'\b' + re.escape(key) + r'\b', f"results['{key}']", processed_condition)
-
-        try:
-            return eval(processed_condition, {"__builtins__": {}, "any": any, "all": all}, {'results': results})
-        except Exception:
-            return False
-
-    def _evaluate_selection(self, selection, flat_log):
-        if isinstance(selection, dict):
-            return all(self._match_kv(k, v, flat_log) for k, v in selection.items())
-        elif isinstance(selection, list):
-            return any(self._evaluate_selection(item, flat_log) for item in selection)
-        return False
-
-    def _match_kv(self, key, value, flat_log):
-        winlog_field_map = {
-            'image': 'winlog.event_data.newprocessname',
-            'commandline': 'winlog.event_data.commandline',
-            'parentimage': 'winlog.event_data.parentprocessname',
-            'processid': 'winlog.event_data.newprocessid',
-            'parentprocessid': 'winlog.event_data.creatorprocessid'
-        }
-        
-        modifier = 'contains'
-        if '|' in key:
-            key, *modifiers = key.split('|')
-            modifier = modifiers[0] if modifiers else 'contains'
-
-        lookup_key = key.lower()
-
-        log_key_to_use = winlog_field_map.get(lookup_key, lookup_key)
-        log_val = flat_log.get(log_key_to_use)
-        
-        if log_val is None and not log_key_to_use.startswith('winlog.'):
-             log_val = flat_log.get('winlog.' + log_key_to_use)
-
-        # --- ▼ここから修正 (最終ロジック) ---
-        if log_val is None:
-            # lookup_keyが'commandline'の場合、imageの値で代用してチェックを試みる
-            if lookup_key == 'commandline':
-                image_key_in_map = winlog_field_map.get('image', 'image')
-                image_val = flat_log.get(image_key_in_map)
-                if image_val is None:
-                    return False
-                log_val = image_val
-            else:
-                return False
-        # --- ▲ここまで修正 ---
-
-        values_to_check = value if isinstance(value, list) else [value]
-        log_values = log_val if isinstance(log_val, list) else [log_val]
-
-        for v_check in values_to_check:
-            for v_log in log_values:
-                v_check_str = str(v_check).lower()
-                v_log_str = str(v_log).lower()
-                
-                if modifier == 'contains' and v_check_str in v_log_str: return True
-                if modifier == 'startswith' and v_log_str.startswith(v_check_str): return True
-                if modifier == 'endswith' and v_log_str.endswith(v_check_str): return True
-                if modifier == 're' and re.search(v_check_str, v_log_str): return True
-        return False
\ No newline at end of file
+        return matched
+
+    def _match_profiled(self, log_entry, ruleset, profiler):
+        # _matchと同じ評価を、ルールごとに時間を計りながら行う。
+        # リテラル照合の結果はログ単位でキャッシュされるため、そのフィールドを最初に参照したルールに照合の時間が計上される
+        matched = []
+        event = normalize_event(log_entry)
+        ctx = MatchContext(event, ruleset.literal_index)
+        clock = time.perf_counter_ns
+        # 集計はログ1件分をまとめて記録し、merge/resetと競合しないようロックを取るのを1回にする
+        samples = []
+        for compiled in ruleset.index.candidates(event.fields):
+            start = clock()
+            try:
+                result = compiled.matches(ctx)
+            except Exception as e:
+                samples.append((compiled.rule_id, clock() - start, False, e))
+                continue
+            samples.append((compiled.rule_id, clock() - start, result, None))
+            if result:
+                matched.append(compiled)
+        if samples:
+            profiler.record_many(samples)
+        return matched
+
+    def get_index_stats(self):
+        """索引の構成と、これまでの1ログあたり平均候補ルール数(選択率)を返す"""
+        return self.ruleset.index.get_stats()
@@ -0,0 +1,287 @@
+# CYBER-AEGIS/src/threat_intel/sigma_backtest.py
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.threat_intel.sigma_cache import SigmaRuleCache, DEFAULT_CACHE_PATH
+from src.threat_intel.sigma_compiler import Const, And, Or, Not, FieldMatch
+from src.threat_intel.sigma_normalizer import normalize_event
+
+
+def iter_event_chunks(paths, chunk_size):
+    """JSONLファイルを読み、(ファイル, 行番号, 元の行, 正規化済みフィールド)のリストをchunk_size件ずつ返す"""
+    chunk = []
+    skipped = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    log_entry = json.loads(line)
+                except json.JSONDecodeError:
+                    skipped += 1
+                    continue
+                if not isinstance(log_entry, dict):
+                    skipped += 1
+                    continue
+                chunk.append((path, line_no, line, normalize_event(log_entry).fields))
+                if len(chunk) >= chunk_size:
+                    yield chunk, skipped
+                    chunk, skipped = [], 0
+    if chunk or skipped:
+        yield chunk, skipped
+
+
+class ColumnarChunk:
+    """
+    正規化済みログのチャンクを、正規フィールド名をキーとする列として保持する。
+    各列は小文字化した値で辞書符号化(factorize)し、述語は重複を除いた値に対してだけ評価して行へ展開する。
+    contains/startswith/endswithは、フィールドごとのAho-Corasickオートマトンで各値を1回だけ走査した結果を使う。
+    """
+
+    def __init__(self, events, literal_index=None):
+        self.size = len(events)
+        self.frame = pd.DataFrame(events, dtype=object)
+        self.columns = set(self.frame.columns)
+        self.literal_index = literal_index
+        self._present = {}
+        self._encoded = {}
+        self._postings = {}
+        self._masks = {}
+
+    def present(self, key):
+        mask = self._present.get(key)
+        if mask is None:
+            mask = self.frame[key].notna().to_numpy(dtype=bool)
+            self._present[key] = mask
+        return mask
+
+    def encoded(self, key):
+        """(スカラー値を持つ行, 各行の符号, 小文字化した値の一覧, リスト値を持つ行)を返す"""
+        encoded = self._encoded.get(key)
+        if encoded is None:
+            raw = self.frame[key]
+            is_list = raw.map(lambda v: isinstance(v, list)).to_numpy(dtype=bool)
+            rows = np.flatnonzero(self.present(key) & ~is_list)
+            lowered = raw.iloc[rows].astype(str).str.lower()
+            codes, uniques = pd.factorize(lowered)
+            encoded = (rows, codes, np.asarray(uniques, dtype=object), np.flatnonzero(is_list))
+            self._encoded[key] = encoded
+        return encoded
+
+    def postings(self, key):
+        """(修飾子, 値)ごとに、それが成立する値の番号のリストを返す"""
+        postings = self._postings.get(key)
+        if postings is None:
+            postings = {}
+            _, _, uniques, _ = self.encoded(key)
+            for unique_id, value in enumerate(uniques):
+                for hit in self.literal_index.scan(key, [value]):
+                    postings.setdefault(hit, []).append(unique_id)
+            self._postings[key] = postings
+        return postings
+
+    def field_mask(self, predicate, key):
+        """predicateをkeyの列に対して評価したbool配列 (値が存在しない行はFalse)"""
+        cache_key = (key, predicate.match_type, predicate.match_all, predicate.values)
+        mask = self._masks.get(cache_key)
+        if mask is not None:
+            return mask
+
+        rows, codes, uniques, list_rows = self.encoded(key)
+        if predicate.literal_keys is not None and self.literal_index is not None:
+            postings = self.postings(key)
+            if predicate.match_all or any(group is None or group[1] for group in predicate.values):
+                # allやワイルドカードを含む述語は、値ごとに成立した(修飾子, 値)の集合から評価する
+                hits = [set() for _ in range(len(uniques))]
+                for literal in predicate.literal_keys:
+                    for unique_id in postings.get(literal, ()):
+                        hits[unique_id].add(literal)
+                unique_mask = np.fromiter(
+                    (predicate.test_literal_hits(hits[i], [value]) for i, value in enumerate(uniques)),
+                    dtype=bool, count=len(uniques)
+                )
+            else:
+                unique_mask = np.zeros(len(uniques), dtype=bool)
+                for literal in predicate.literal_keys:
+                    unique_ids = postings.get(literal)
+                    if unique_ids:
+                        unique_mask[unique_ids] = True
+        else:
+            unique_mask = np.fromiter((predicate.test_values([value]) for value in uniques),
+                                      dtype=bool, count=len(uniques))
+
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = unique_mask[codes]
+        # リスト値は要素全体で判定するため、該当行だけ1件ずつ評価する
+        if len(list_rows):
+            raw = self.frame[key]
+            for row in list_rows:
+                mask[row] = predicate.test_values([str(v).lower() for v in raw.iat[row]])
+
+        self._masks[cache_key] = mask
+        return mask
+
+    def keyword_mask(self, predicate):
+        """キーワードの述語を、各行の全フィールドの値に対して1行ずつ評価する"""
+        mask = np.zeros(self.size, dtype=bool)
+        for row, values in enumerate(self.frame.itertuples(index=False, name=None)):
+            lowered = []
+            for value in values:
+                if isinstance(value, list):
+                    lowered.extend(str(v).lower() for v in value)
+                elif value is not None and not (isinstance(value, float) and np.isnan(value)):
+                    lowered.append(str(value).lower())
+            mask[row] = predicate.test_values(lowered)
+        return mask
+
+
+def evaluate_node(node, chunk):
+    """コンパイル済みの条件木をチャンク全体に対して評価し、行ごとのbool配列を返す"""
+    if isinstance(node, FieldMatch):
+        if node.lookup_keys is None:
+            return chunk.keyword_mask(node)
+        result = np.zeros(chunk.size, dtype=bool)
+        remaining = np.ones(chunk.size, dtype=bool)
+        # 行ごとに最初に値が存在したキーだけで判定する (SigmaAnalyzerと同じ優先順)
+        for key in node.lookup_keys:
+            if key not in chunk.columns:
+                continue
+            present = chunk.present(key) & remaining
+            result |= present & chunk.field_mask(node, key)
+            remaining &= ~present
+        # どのキーも存在しない行 (nullやexists: falseの条件はここで成立する)
+        if node.when_missing:
+            result |= remaining
+        return result
+    if isinstance(node, And):
+        result = np.ones(chunk.size, dtype=bool)
+        for child in node.children:
+            result &= evaluate_node(child, chunk)
+            if not result.any():
+                break
+        return result
+    if isinstance(node, Or):
+        result = np.zeros(chunk.size, dtype=bool)
+        for child in node.children:
+            result |= evaluate_node(child, chunk)
+        return result
+    if isinstance(node, Not):
+        return ~evaluate_node(node.child, chunk)
+    if isinstance(node, Const):
+        return np.full(chunk.size, bool(node.value))
+    raise TypeError(f"unknown condition node: {type(node).__name__}")
+
+
+class SigmaBacktester:
+    """ログアーカイブに対してルールセットをチャンク単位・列単位で評価し、ルールごとのヒット数を集計する"""
+
+    def __init__(self, compiled_rules, literal_index=None, samples=3):
+        self.compiled_rules = compiled_rules
+        self.literal_index = literal_index
+        self.required_keys = [compiled.required_keys() for compiled in compiled_rules]
+        self.samples = samples
+        self.hits = np.zeros(len(compiled_rules), dtype=np.int64)
+        self.sample_matches = [[] for _ in compiled_rules]
+        self.events = 0
+        self.skipped_lines = 0
+
+    def run(self, paths, chunk_size=50000):
+        for chunk_rows, skipped in iter_event_chunks(paths, chunk_size):
+            self.skipped_lines += skipped
+            if chunk_rows:
+                self.process_chunk(chunk_rows)
+        return self
+
+    def process_chunk(self, chunk_rows):
+        chunk = ColumnarChunk([row[3] for row in chunk_rows], self.literal_index)
+        for position, compiled in enumerate(self.compiled_rules):
+            keys = self.required_keys[position]
+            # 必要なフィールドがチャンクに1つも無いルールは評価しない
+            if keys is not None and chunk.columns.isdisjoint(keys):
+                continue
+            hits = evaluate_node(compiled.condition, chunk)
+            count = int(np.count_nonzero(hits))
+            if not count:
+                continue
+            self.hits[position] += count
+            samples = self.sample_matches[position]
+            if len(samples) < self.samples:
+                for row in np.flatnonzero(hits)[:self.samples - len(samples)]:
+                    path, line_no, line, _ = chunk_rows[row]
+                    samples.append({'file': path, 'line': line_no, 'event': line[:300]})
+        self.events += chunk.size
+
+    def report(self):
+        rules = []
+        for position in np.argsort(-self.hits, kind='stable'):
+            if not self.hits[position]:
+                break
+            compiled = self.compiled_rules[position]
+            rules.append({
+                'rule_id': compiled.rule_id,
+                'title': compiled.rule.get('title', 'N/A'),
+                'level': compiled.rule.get('level', 'N/A'),
+                'hits': int(self.hits[position]),
+                'samples': self.sample_matches[position],
+            })
+        return {'events': self.events, 'skipped_lines': self.skipped_lines,
+                'rules_evaluated': len(self.compiled_rules), 'rules_hit': len(rules), 'rules': rules}
+
+
+def main():
+    """過去のログ(JSONL)に対してSIGMAルールを一括評価するバックテストCLI"""
+    parser = argparse.ArgumentParser(description="Backtest SIGMA rules against exported JSONL event logs.")
+    parser.add_argument('logs', nargs='+', help="JSONL log files (e.g. logs/security_events.log)")
+    parser.add_argument('--rules', nargs='+', default=[os.path.join(project_root, 'rules', 'sigma')],
+                        help="SIGMA rule directories")
+    parser.add_argument('--cache', default=os.path.join(project_root, DEFAULT_CACHE_PATH),
+                        help="compiled ruleset cache ('' to disable)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="events per columnar chunk")
+    parser.add_argument('--samples', type=int, default=3, help="sample matches to keep per rule")
+    parser.add_argument('--top', type=int, default=50, help="rules to print, by hit count")
+    parser.add_argument('--output', help="write the full report as JSON to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache = SigmaRuleCache(args.cache or None)
+    cache.refresh([os.path.abspath(d) for d in args.rules])
+    compiled_rules = cache.compiled_rules()
+    literal_index = cache.literal_index()
+    cache.save()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    backtester = SigmaBacktester(compiled_rules, literal_index, samples=args.samples).run(args.logs, chunk_size=max(1, args.chunk_size))
+    elapsed = time.perf_counter() - start
+    report = backtester.report()
+    report['load_seconds'] = round(load_time, 3)
+    report['eval_seconds'] = round(elapsed, 3)
+
+    print(f"[SigmaBacktester] {report['events']} events x {len(compiled_rules)} rules in {elapsed:.2f}s "
+          f"({report['events'] / elapsed if elapsed else 0:.0f} events/s), {report['skipped_lines']} lines skipped")
+    print(f"[SigmaBacktester] {report['rules_hit']} rules matched at least once")
+    for rule in report['rules'][:args.top]:
+        print(f"{rule['hits']:>10}  [{rule['level']}] {rule['title']}")
+        for sample in rule['samples']:
+            print(f"{'':>12}{os.path.basename(sample['file'])}:{sample['line']}  {sample['event'][:120]}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[SigmaBacktester] Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
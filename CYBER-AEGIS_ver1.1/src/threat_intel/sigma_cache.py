@@ -0,0 +1,196 @@
+# CYBER-AEGIS/src/threat_intel/sigma_cache.py
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+import time
+
+import yaml
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.threat_intel.sigma_compiler import compile_rule, SigmaCompileError
+from src.threat_intel.sigma_index import SigmaLiteralIndex
+
+# コンパイル結果の構造を変えた場合はこの値を上げて、古いキャッシュを無効化する
+CACHE_VERSION = 6
+DEFAULT_CACHE_PATH = os.path.join('cache', 'sigma_ruleset.pickle')
+
+
+def iter_rule_files(rule_dirs):
+    """ルールディレクトリ配下のYAMLファイルをパス順に列挙する"""
+    for rule_dir in rule_dirs:
+        if not os.path.exists(rule_dir):
+            continue
+        for root, dirs, files in os.walk(rule_dir):
+            dirs.sort()
+            for file in sorted(files):
+                if file.endswith((".yml", ".yaml")):
+                    yield os.path.join(root, file)
+
+
+def _build_entry(rule_path, data, stat, digest):
+    """
+    ルールファイル1つ分のキャッシュエントリを作る。相関ルールのファイルは相関ルールと参照先の基本ルールを
+    '---' で区切った複数ドキュメントのため、すべてのドキュメントを読む。
+    rules は (ルールID, ルール, コンパイル結果またはNone) の組、correlations は (ルールID, 相関ルール) の組のリスト。
+    ルールIDは1ドキュメントのファイルではパス、複数ドキュメントのファイルでは "パス#番号" とする。
+    """
+    entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha1': digest, 'rules': [], 'correlations': []}
+    try:
+        documents = [d for d in yaml.safe_load_all(data.decode('utf-8')) if d is not None]
+    except (yaml.YAMLError, UnicodeDecodeError):
+        return entry
+    for number, document in enumerate(documents):
+        rule_id = rule_path if len(documents) == 1 else f"{rule_path}#{number}"
+        if not isinstance(document, dict):
+            continue
+        if document.get('correlation'):
+            # 相関ルールは単体評価の対象外なので別枠で保持する (解釈はsigma_correlationで行う)
+            entry['correlations'].append((rule_id, document))
+            continue
+        if not document.get('detection'):
+            continue
+        try:
+            compiled = compile_rule(document, rule_id=rule_id)
+        except SigmaCompileError:
+            compiled = None
+        entry['rules'].append((rule_id, document, compiled))
+    return entry
+
+
+class SigmaRuleCache:
+    """
+    パース・コンパイル済みのSIGMAルールセットを、ファイルのマニフェスト(パス・サイズ・更新時刻・SHA-1)と共に保持する。
+    refresh()はサイズと更新時刻が変わったファイルだけを読み直し、内容のハッシュが変わったものだけを再パースする。
+    cache_pathを指定するとディスクへ永続化され、次回起動時に再利用される。
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.entries = {}
+        self._literal_index = None
+        self._literal_digest = None
+        self._dirty = False
+        if cache_path:
+            self._read()
+
+    def _read(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'rb') as f:
+                data = pickle.load(f)
+            if data.get('version') != CACHE_VERSION:
+                print(f"[SigmaRuleCache] Cache version mismatch. Rebuilding: {self.cache_path}")
+                return
+            self.entries = data['entries']
+            self._literal_digest, self._literal_index = data.get('literal_index', (None, None))
+        except Exception as e:
+            print(f"[SigmaRuleCache] Failed to read cache, rebuilding: {e}")
+            self.entries = {}
+
+    def refresh(self, rule_dirs):
+        """ディスク上のルールと突き合わせ、追加・変更・削除されたファイルのパスを返す"""
+        added, changed = [], []
+        refreshed = {}
+        for rule_path in iter_rule_files(rule_dirs):
+            try:
+                stat = os.stat(rule_path)
+                entry = self.entries.get(rule_path)
+                if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                    refreshed[rule_path] = entry
+                    continue
+
+                with open(rule_path, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.sha1(data).hexdigest()
+                if entry and entry['sha1'] == digest:
+                    entry['size'], entry['mtime'] = stat.st_size, stat.st_mtime_ns
+                    refreshed[rule_path] = entry
+                    self._dirty = True
+                    continue
+
+                refreshed[rule_path] = _build_entry(rule_path, data, stat, digest)
+                (changed if entry else added).append(rule_path)
+            except OSError:
+                continue
+
+        removed = [path for path in self.entries if path not in refreshed]
+        if added or changed or removed:
+            self._dirty = True
+        self.entries = refreshed
+        return {'added': added, 'changed': changed, 'removed': removed}
+
+    def loaded_rules(self):
+        """(ルールID, ルール)の組をパス順に返す"""
+        return [(rule_id, rule) for entry in self.entries.values() for rule_id, rule, _ in entry['rules']]
+
+    def compiled_rules(self):
+        return [compiled for entry in self.entries.values() for _, _, compiled in entry['rules'] if compiled is not None]
+
+    def correlation_rules(self):
+        """(ルールID, 相関ルール)の組をパス順に返す"""
+        return [pair for entry in self.entries.values() for pair in entry['correlations']]
+
+    def skipped_count(self):
+        return sum(1 for entry in self.entries.values() for _, _, compiled in entry['rules'] if compiled is None)
+
+    def literal_index(self):
+        """現在のルールセットに対応するSigmaLiteralIndexを返す。ルールが変わっていなければキャッシュを使う"""
+        digest = hashlib.sha1(
+            "\n".join(f"{path}:{entry['sha1']}" for path, entry in self.entries.items()).encode('utf-8')
+        ).hexdigest()
+        if self._literal_index is None or self._literal_digest != digest:
+            self._literal_index = SigmaLiteralIndex(self.compiled_rules(), previous=self._literal_index)
+            self._literal_digest = digest
+            self._dirty = True
+        return self._literal_index
+
+    def save(self):
+        if not self.cache_path or not self._dirty:
+            return
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({
+                    'version': CACHE_VERSION,
+                    'entries': self.entries,
+                    'literal_index': (self._literal_digest, self._literal_index),
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+            self._dirty = False
+        except Exception as e:
+            print(f"[SigmaRuleCache] Failed to write cache: {e}")
+
+
+def main():
+    """デプロイ時にSIGMAルールセットのキャッシュを事前に構築するためのCLI"""
+    parser = argparse.ArgumentParser(description="Prebuild the compiled SIGMA ruleset cache.")
+    parser.add_argument('--rules', nargs='+', default=[os.path.join(project_root, 'rules', 'sigma')],
+                        help="SIGMA rule directories")
+    parser.add_argument('--cache', default=os.path.join(project_root, DEFAULT_CACHE_PATH),
+                        help="cache file to create or update")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache = SigmaRuleCache(args.cache)
+    changes = cache.refresh([os.path.abspath(d) for d in args.rules])
+    cache.literal_index()
+    cache.save()
+    elapsed = time.perf_counter() - start
+
+    print(f"[SigmaRuleCache] {len(cache.compiled_rules())} compiled rules "
+          f"({cache.skipped_count()} skipped) written to {args.cache}")
+    print(f"[SigmaRuleCache] added={len(changes['added'])} changed={len(changes['changed'])} "
+          f"removed={len(changes['removed'])} in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,592 @@
+# CYBER-AEGIS/src/threat_intel/sigma_compiler.py
+import base64
+import ipaddress
+import itertools
+import re
+
+from src.threat_intel.sigma_normalizer import lookup_keys
+
+# 文字列リテラルとしてAho-Corasickでまとめて照合できる修飾子
+LITERAL_MODIFIERS = ('contains', 'startswith', 'endswith')
+# 値の比較方法を決める修飾子。指定が無ければ(ワイルドカード付きの)等価比較、キーワードは部分一致
+MATCH_MODIFIERS = LITERAL_MODIFIERS + ('re', 'cidr', 'gt', 'gte', 'lt', 'lte', 'exists')
+# 比較の前に値を変換する修飾子。チェーンに書かれた順に適用する
+TRANSFORM_MODIFIERS = ('windash', 'base64', 'base64offset', 'utf16le', 'utf16be', 'utf16', 'wide')
+# reの正規表現フラグ (大文字小文字は常に区別しない)
+_REGEX_FLAGS = {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL}
+
+# windashで置き換える「-」「/」(単語の先頭にあるものだけ) とその候補
+_WINDASH_PATTERN = re.compile(r'\B[-/]\b')
+_WINDASH_CHARS = ('-', '/', '\u2013', '\u2014', '\u2015')
+# windashで展開する組み合わせ数の上限
+_WINDASH_LIMIT = 256
+
+_TOKEN_PATTERN = re.compile(r'\s*(\(|\)|\||[^\s()|]+)')
+
+
+class SigmaCompileError(ValueError):
+    """ルールのdetection/conditionをコンパイルできなかった場合の例外"""
+
+
+class MatchContext:
+    """1件のログ(NormalizedEvent)に対する評価状態。リテラル索引の走査結果をルール間で使い回す"""
+    __slots__ = ('event', 'literal_index', '_hits', '_all_values')
+
+    def __init__(self, event, literal_index=None):
+        self.event = event
+        self.literal_index = literal_index
+        self._hits = {}
+        self._all_values = None
+
+    def lowered_values(self, log_key):
+        return self.event.lowered.get(log_key)
+
+    def all_lowered_values(self):
+        """キーワード検索用に、全フィールドの小文字化した値を1つのリストにして返す"""
+        if self._all_values is None:
+            self._all_values = [v for values in self.event.lowered.values() for v in values]
+        return self._all_values
+
+    def literal_hits(self, log_key):
+        """log_keyの値を一度だけ走査し、成立した(修飾子, 値)の集合を返す"""
+        try:
+            return self._hits[log_key]
+        except KeyError:
+            pass
+        hits = self.literal_index.scan(log_key, self.lowered_values(log_key))
+        self._hits[log_key] = hits
+        return hits
+
+
+# --- 条件式の構文木 ---
+
+class Const:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate(self, ctx):
+        return self.value
+
+    def required_keys(self):
+        return None if self.value else frozenset()
+
+
+class And:
+    __slots__ = ('children',)
+
+    def __init__(self, children):
+        self.children = tuple(children)
+
+    def evaluate(self, ctx):
+        for child in self.children:
+            if not child.evaluate(ctx):
+                return False
+        return True
+
+    def required_keys(self):
+        # どれか1つの子が成立しなければ全体も成立しないため、最も絞り込める子の条件を採用する
+        best = None
+        for child in self.children:
+            keys = child.required_keys()
+            if keys is not None and (best is None or len(keys) < len(best)):
+                best = keys
+        return best
+
+
+class Or:
+    __slots__ = ('children',)
+
+    def __init__(self, children):
+        self.children = tuple(children)
+
+    def evaluate(self, ctx):
+        for child in self.children:
+            if child.evaluate(ctx):
+                return True
+        return False
+
+    def required_keys(self):
+        keys = set()
+        for child in self.children:
+            child_keys = child.required_keys()
+            if child_keys is None:
+                return None
+            keys |= child_keys
+        return frozenset(keys)
+
+
+class Not:
+    __slots__ = ('child',)
+
+    def __init__(self, child):
+        self.child = child
+
+    def evaluate(self, ctx):
+        return not self.child.evaluate(ctx)
+
+    def required_keys(self):
+        return None
+
+
+def split_wildcards(value):
+    """
+    SIGMAの文字列値をリテラル部分とワイルドカードの並びに分解し、(種類, 文字列)のリストを返す。
+    種類は 'literal' / '*' / '?'。'\\*' '\\?' '\\\\' はエスケープとしてリテラルにし、それ以外の '\\' はそのまま残す。
+    """
+    parts, literal = [], []
+    i, length = 0, len(value)
+    while i < length:
+        c = value[i]
+        if c == '\\' and i + 1 < length and value[i + 1] in '*?\\':
+            literal.append(value[i + 1])
+            i += 2
+            continue
+        if c in '*?':
+            if literal:
+                parts.append(('literal', ''.join(literal)))
+                literal = []
+            parts.append((c, c))
+        else:
+            literal.append(c)
+        i += 1
+    if literal or not parts:
+        parts.append(('literal', ''.join(literal)))
+    return parts
+
+
+def _windash(value):
+    """単語の先頭の '-' '/' を、Windowsのコマンドラインで同じ意味になる文字のすべての組み合わせに展開する"""
+    pieces = _WINDASH_PATTERN.split(value)
+    count = len(pieces) - 1
+    if count == 0:
+        return [value]
+    if len(_WINDASH_CHARS) ** count > _WINDASH_LIMIT:
+        raise SigmaCompileError(f"too many windash variants: {value!r}")
+    variants = []
+    for dashes in itertools.product(_WINDASH_CHARS, repeat=count):
+        variants.append(pieces[0] + ''.join(d + p for d, p in zip(dashes, pieces[1:])))
+    return variants
+
+
+def _plain_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    parts = split_wildcards(value)
+    if any(kind != 'literal' for kind, _ in parts):
+        raise SigmaCompileError(f"wildcards cannot be encoded: {value!r}")
+    return parts[0][1].encode('utf-8')
+
+
+def _base64offset(value):
+    """値がbase64文字列の途中(3バイト境界のずれ0〜2)に埋め込まれた場合に現れる3通りの部分文字列"""
+    value = _plain_bytes(value)
+    start_offsets = (0, 2, 3)
+    end_offsets = (None, -3, -2)
+    return [
+        base64.b64encode(i * b' ' + value)[start_offsets[i]:end_offsets[(len(value) + i) % 3]].decode('ascii')
+        for i in range(3)
+    ]
+
+
+def _encode_utf16(value, codec, bom=b''):
+    if isinstance(value, bytes):
+        raise SigmaCompileError("utf16 modifiers must come before base64")
+    parts = split_wildcards(value)
+    if any(kind != 'literal' for kind, _ in parts):
+        raise SigmaCompileError(f"wildcards cannot be encoded: {value!r}")
+    return bom + parts[0][1].encode(codec)
+
+
+_TRANSFORMS = {
+    'windash': lambda v: _windash(v) if isinstance(v, str) else [v],
+    'base64': lambda v: [base64.b64encode(_plain_bytes(v)).decode('ascii')],
+    'base64offset': _base64offset,
+    'utf16le': lambda v: [_encode_utf16(v, 'utf-16-le')],
+    'wide': lambda v: [_encode_utf16(v, 'utf-16-le')],
+    'utf16be': lambda v: [_encode_utf16(v, 'utf-16-be')],
+    'utf16': lambda v: [_encode_utf16(v, 'utf-16-le', b'\xff\xfe')],
+}
+
+
+def _wildcard_regex(parts, match_type):
+    """ワイルドカードを含む値を、比較方法に応じて位置を固定した正規表現にする"""
+    body = ''.join(
+        re.escape(text) if kind == 'literal' else ('.*' if kind == '*' else '.')
+        for kind, text in parts
+    )
+    if match_type in ('equals', 'startswith'):
+        body = r'\A' + body
+    if match_type in ('equals', 'endswith'):
+        body = body + r'\Z'
+    return re.compile(body, re.DOTALL)
+
+
+class FieldMatch:
+    """
+    1つの「フィールド|修飾子|...: 値」の組。参照キーと比較値はロード時に確定させておく。
+    valuesは元の値ごとのグループで、各グループは (リテラルの比較値, 正規表現) の組。
+    windashやbase64offsetで1つの値が複数の候補に展開された場合は、候補のどれかが成立すればそのグループが成立する。
+    allが無ければいずれかのグループ、allがあればすべてのグループが成立したときに真となる。
+    値がnullのグループは、フィールドが存在しないか空のときに成立する。
+    fieldがNoneの場合はキーワード(全フィールドに対する部分一致)として評価する。
+    """
+    __slots__ = ('field', 'modifiers', 'match_type', 'match_all', 'values', 'lookup_keys', 'literal_keys',
+                 'literal_groups', 'when_missing', '_merged', '_plain_test')
+
+    def __init__(self, field, modifiers, values):
+        self.field = field
+        self.modifiers = tuple(modifiers)
+        self.lookup_keys = lookup_keys(field) if field is not None else None
+
+        match_types = [m for m in self.modifiers if m in MATCH_MODIFIERS]
+        transforms = [m for m in self.modifiers if m in TRANSFORM_MODIFIERS]
+        regex_flags = [m for m in self.modifiers if m in _REGEX_FLAGS]
+        unsupported = [
+            m for m in self.modifiers
+            if m not in MATCH_MODIFIERS and m not in TRANSFORM_MODIFIERS and m != 'all'
+            and not (m in _REGEX_FLAGS and 're' in match_types)
+        ]
+        if unsupported:
+            raise SigmaCompileError(f"unsupported modifier '{unsupported[0]}' for '{field}'")
+        if len(match_types) > 1:
+            raise SigmaCompileError(f"conflicting modifiers {match_types} for '{field}'")
+        self.match_type = match_types[0] if match_types else ('contains' if field is None else 'equals')
+        self.match_all = 'all' in self.modifiers
+        if transforms and self.match_type not in ('equals',) + LITERAL_MODIFIERS:
+            raise SigmaCompileError(f"'{transforms[0]}' cannot be combined with '{self.match_type}'")
+
+        raw_values = values if isinstance(values, list) else [values]
+        if not raw_values:
+            raise SigmaCompileError(f"empty value list for '{field}'")
+        for value in raw_values:
+            if isinstance(value, (dict, list)):
+                raise SigmaCompileError(f"nested value for '{field}'")
+
+        if self.match_type == 'exists':
+            if len(raw_values) != 1 or not isinstance(raw_values[0], bool):
+                raise SigmaCompileError(f"exists expects true or false for '{field}'")
+            self.values = ()
+            self.when_missing = not raw_values[0]
+        else:
+            flags = re.IGNORECASE
+            for flag in regex_flags:
+                flags |= _REGEX_FLAGS[flag]
+            self.values = tuple(
+                None if value is None else self._compile_group(value, transforms, flags) for value in raw_values
+            )
+            # 値が存在しないときは、nullのグループだけが成立する
+            missing = [group is None for group in self.values]
+            self.when_missing = all(missing) if self.match_all else any(missing)
+
+        # nullもワイルドカードも無ければ、allでない限りグループを区別せずに1回で比較できる
+        self._merged = None
+        if self.values and all(group is not None and not group[1] for group in self.values):
+            merged = tuple(dict.fromkeys(v for group in self.values for v in group[0]))
+            self._merged = frozenset(merged) if self.match_type == 'equals' else merged
+
+        if self.match_type in LITERAL_MODIFIERS and self.lookup_keys is not None:
+            self.literal_groups = tuple(
+                frozenset((self.match_type, v) for v in group[0]) if group is not None else frozenset()
+                for group in self.values
+            )
+            self.literal_keys = frozenset().union(*self.literal_groups)
+        else:
+            self.literal_groups = None
+            self.literal_keys = None
+
+        self._plain_test = {
+            'equals': self._equals,
+            'contains': self._contains,
+            'startswith': self._startswith,
+            'endswith': self._endswith,
+            'cidr': self._cidr,
+            'gt': self._greater,
+            'gte': self._greater_or_equal,
+            'lt': self._less,
+            'lte': self._less_or_equal,
+        }.get(self.match_type)
+
+    def _compile_group(self, value, transforms, flags):
+        """1つの値を (リテラルの比較値, 正規表現) の組に変換する"""
+        field, match_type = self.field, self.match_type
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        if match_type == 're':
+            try:
+                return (), (re.compile(str(value), flags),)
+            except re.error as e:
+                raise SigmaCompileError(f"invalid regex for '{field}': {e}") from e
+        if match_type == 'cidr':
+            try:
+                return (ipaddress.ip_network(str(value), strict=False),), ()
+            except ValueError as e:
+                raise SigmaCompileError(f"invalid network for '{field}': {e}") from e
+        if match_type in ('gt', 'gte', 'lt', 'lte'):
+            try:
+                return (float(value),), ()
+            except (TypeError, ValueError) as e:
+                raise SigmaCompileError(f"'{match_type}' expects a number for '{field}'") from e
+
+        alternatives = [str(value)]
+        for transform in transforms:
+            alternatives = [out for alt in alternatives for out in _TRANSFORMS[transform](alt)]
+        if any(isinstance(alt, bytes) for alt in alternatives):
+            raise SigmaCompileError(f"encoded value for '{field}' must be base64 encoded")
+
+        literals, patterns = [], []
+        for alt in alternatives:
+            parts = split_wildcards(alt.lower())
+            if all(kind == 'literal' for kind, _ in parts):
+                literals.append(parts[0][1])
+            else:
+                patterns.append(_wildcard_regex(parts, match_type))
+        literals = tuple(dict.fromkeys(literals))
+        return (frozenset(literals) if match_type == 'equals' else literals), tuple(patterns)
+
+    def evaluate(self, ctx):
+        lookup_keys = self.lookup_keys
+        if lookup_keys is None:
+            return self.test_values(ctx.all_lowered_values())
+        # 候補ルールの数だけ呼ばれるため、ctx.lowered_valuesを経由せずに参照する
+        lowered = ctx.event.lowered
+        for log_key in lookup_keys:
+            log_values = lowered.get(log_key)
+            if log_values is None:
+                continue
+            if self.literal_keys is None or ctx.literal_index is None:
+                return self.test_values(log_values)
+            hits = ctx.literal_hits(log_key)
+            if self._merged is None:
+                return self.test_literal_hits(hits, log_values)
+            if not self.match_all:
+                return not self.literal_keys.isdisjoint(hits)
+            for literal_group in self.literal_groups:
+                if literal_group.isdisjoint(hits):
+                    return False
+            return True
+        return self.when_missing
+
+    def required_keys(self):
+        # 値が無くても成立する条件(null、exists: false、キーワード)では絞り込めない
+        if self.lookup_keys is None or self.when_missing:
+            return None
+        return frozenset(self.lookup_keys)
+
+    def test_values(self, log_values):
+        """
+        存在するフィールドの小文字化した値のリストに対して評価する。
+        evaluateのほか、値ごとに評価するバックテスト(sigma_backtest)からも使う。
+        """
+        if self.match_type == 'exists':
+            return not self.when_missing
+        if self._merged is not None and not self.match_all:
+            return self._plain_test(self._merged, log_values)
+        results = (self._group_matches(group, log_values) for group in self.values)
+        return all(results) if self.match_all else any(results)
+
+    def test_literal_hits(self, hits, log_values):
+        """リテラル索引の走査結果(成立した(修飾子, 値)の集合)を使って評価する"""
+        results = (
+            self._group_matches(group, log_values, literal_hits=hits, literal_group=literal_group)
+            for group, literal_group in zip(self.values, self.literal_groups)
+        )
+        return all(results) if self.match_all else any(results)
+
+    def _group_matches(self, group, log_values, literal_hits=None, literal_group=None):
+        if group is None:
+            return all(s == '' for s in log_values)
+        literals, patterns = group
+        if literals:
+            if literal_hits is not None:
+                if not literal_group.isdisjoint(literal_hits):
+                    return True
+            elif self._plain_test(literals, log_values):
+                return True
+        for pattern in patterns:
+            for s in log_values:
+                if pattern.search(s):
+                    return True
+        return False
+
+    @staticmethod
+    def _equals(literals, log_values):
+        return not literals.isdisjoint(log_values)
+
+    @staticmethod
+    def _contains(literals, log_values):
+        return any(v in s for v in literals for s in log_values)
+
+    @staticmethod
+    def _startswith(literals, log_values):
+        return any(s.startswith(literals) for s in log_values)
+
+    @staticmethod
+    def _endswith(literals, log_values):
+        return any(s.endswith(literals) for s in log_values)
+
+    @staticmethod
+    def _cidr(networks, log_values):
+        for s in log_values:
+            try:
+                address = ipaddress.ip_address(s)
+            except ValueError:
+                continue
+            if any(address.version == net.version and address in net for net in networks):
+                return True
+        return False
+
+    @staticmethod
+    def _numbers(log_values):
+        for s in log_values:
+            try:
+                yield float(s)
+            except ValueError:
+                continue
+
+    def _greater(self, bounds, log_values):
+        return any(n > b for n in self._numbers(log_values) for b in bounds)
+
+    def _greater_or_equal(self, bounds, log_values):
+        return any(n >= b for n in self._numbers(log_values) for b in bounds)
+
+    def _less(self, bounds, log_values):
+        return any(n < b for n in self._numbers(log_values) for b in bounds)
+
+    def _less_or_equal(self, bounds, log_values):
+        return any(n <= b for n in self._numbers(log_values) for b in bounds)
+
+
+class CompiledRule:
+    __slots__ = ('rule', 'condition', 'predicates', 'rule_id')
+
+    def __init__(self, rule, condition, predicates=(), rule_id=None):
+        self.rule = rule
+        self.condition = condition
+        self.predicates = tuple(predicates)
+        self.rule_id = rule_id
+
+    def matches(self, ctx):
+        return self.condition.evaluate(ctx)
+
+    def required_keys(self):
+        """ルールが成立するためにログ側に少なくとも1つ存在すべきキーの集合 (Noneは制約なし)"""
+        return self.condition.required_keys()
+
+
+def compile_selection(selection, predicates=None):
+    """selectionを構文木に変換する。predicatesにリストを渡すと生成したFieldMatchを追記する"""
+    if isinstance(selection, dict):
+        if not selection:
+            raise SigmaCompileError("empty selection")
+        children = []
+        for key, value in selection.items():
+            field, *modifiers = str(key).split('|')
+            # '|all' のようにフィールド名が無いものはキーワードとして扱う
+            children.append(FieldMatch(field or None, modifiers, value))
+        if predicates is not None:
+            predicates.extend(children)
+        return children[0] if len(children) == 1 else And(children)
+    elif isinstance(selection, list):
+        if not selection:
+            raise SigmaCompileError("empty selection")
+        if not any(isinstance(item, (dict, list)) for item in selection):
+            # 文字列のリストはキーワード (いずれかの値をいずれかのフィールドが含む)
+            return compile_selection({'': selection}, predicates)
+        return Or(compile_selection(item, predicates) for item in selection)
+    elif isinstance(selection, (str, int, float)) and not isinstance(selection, bool):
+        return compile_selection({'': selection}, predicates)
+    raise SigmaCompileError(f"unsupported selection: {type(selection).__name__}")
+
+
+def compile_rule(rule, rule_id=None):
+    """SIGMAルール1件をCompiledRuleに変換する。対応できない構文はSigmaCompileErrorを送出する"""
+    detection = rule.get('detection', {})
+    if not isinstance(detection, dict):
+        raise SigmaCompileError("detection is not a mapping")
+    condition_str = detection.get('condition')
+    if not condition_str or not isinstance(condition_str, str):
+        raise SigmaCompileError("condition must be a non-empty string")
+
+    predicates = []
+    selections = {
+        key: compile_selection(value, predicates)
+        for key, value in detection.items() if key != 'condition'
+    }
+    condition = _ConditionParser(condition_str, selections).parse()
+    return CompiledRule(rule, condition, predicates, rule_id)
+
+
+class _ConditionParser:
+    """condition文字列を再帰下降で構文木に変換する (優先順位: not > and > or)"""
+
+    def __init__(self, condition_str, selections):
+        self.tokens = _TOKEN_PATTERN.findall(condition_str)
+        self.selections = selections
+        self.pos = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise SigmaCompileError("empty condition")
+        node = self._parse_or()
+        if self.pos != len(self.tokens):
+            raise SigmaCompileError(f"unexpected token '{self.tokens[self.pos]}'")
+        return node
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise SigmaCompileError("unexpected end of condition")
+        self.pos += 1
+        return token
+
+    def _parse_or(self):
+        children = [self._parse_and()]
+        while (self._peek() or '').lower() == 'or':
+            self.pos += 1
+            children.append(self._parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def _parse_and(self):
+        children = [self._parse_not()]
+        while (self._peek() or '').lower() == 'and':
+            self.pos += 1
+            children.append(self._parse_not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def _parse_not(self):
+        if (self._peek() or '').lower() == 'not':
+            self.pos += 1
+            return Not(self._parse_not())
+        return self._parse_primary()
+
+    def _parse_primary(self):
+        token = self._next()
+        if token == '(':
+            node = self._parse_or()
+            if self._next() != ')':
+                raise SigmaCompileError("missing ')'")
+            return node
+        if token == '|':
+            raise SigmaCompileError("aggregation expressions are not supported")
+        if token.lower() in ('1', 'any', 'all') and (self._peek() or '').lower() == 'of':
+            self.pos += 1
+            return self._parse_quantifier(token.lower(), self._next())
+        if token in self.selections:
+            return self.selections[token]
+        raise SigmaCompileError(f"unknown identifier '{token}'")
+
+    def _parse_quantifier(self, aggregator, target):
+        if target.lower() == 'them':
+            names = [k for k in self.selections if not k.startswith('_')]
+        else:
+            pattern = re.compile('.*'.join(re.escape(part) for part in target.split('*')))
+            names = [k for k in self.selections if pattern.fullmatch(k)]
+        if not names:
+            return Const(False)
+        children = [self.selections[name] for name in names]
+        return Or(children) if aggregator in ('1', 'any') else And(children)
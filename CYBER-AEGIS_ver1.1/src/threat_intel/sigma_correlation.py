@@ -0,0 +1,319 @@
+# CYBER-AEGIS/src/threat_intel/sigma_correlation.py
+import datetime
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from src.threat_intel.sigma_compiler import SigmaCompileError
+from src.threat_intel.sigma_normalizer import lookup_keys, normalize_event
+
+# イベント時刻として参照する正規フィールド名。見つからなければ取り込み時刻を使う
+DEFAULT_TIMESTAMP_KEYS = ('@timestamp', 'timestamp', 'time_created', 'timecreated')
+
+_TIMESPAN_PATTERN = re.compile(r'^\s*(\d+)\s*([smhd])\s*$', re.IGNORECASE)
+_TIMESPAN_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_timespan(value):
+    """'5m'のようなSIGMAの期間指定を秒数に変換する"""
+    match = _TIMESPAN_PATTERN.match(str(value))
+    if not match:
+        raise SigmaCompileError(f"invalid timespan '{value}'")
+    seconds = int(match.group(1)) * _TIMESPAN_UNITS[match.group(2).lower()]
+    if seconds <= 0:
+        raise SigmaCompileError(f"timespan must be positive: '{value}'")
+    return seconds
+
+
+def parse_event_time(value):
+    """イベントの時刻フィールドをUNIX時刻に変換する。解釈できなければNoneを返す"""
+    if isinstance(value, (int, float)):
+        # ミリ秒単位のエポック値も受け付ける
+        return value / 1000.0 if value > 1e11 else float(value)
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, str) and value:
+        try:
+            return parse_event_time(float(value))
+        except ValueError:
+            pass
+        try:
+            parsed = datetime.datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+def event_time(event, timestamp_keys=DEFAULT_TIMESTAMP_KEYS):
+    """正規化済みログからイベント時刻(UNIX時刻)を取り出す。時刻フィールドが無ければNoneを返す"""
+    for key in timestamp_keys:
+        value = parse_event_time(event.get(key))
+        if value is not None:
+            return value
+    return None
+
+
+class CorrelationRule:
+    """
+    SIGMA相関ルール(correlation:)1件。対応するのは event_count と value_count で、
+    条件は gte / gt による閾値判定のみ。
+    """
+
+    def __init__(self, rule, rule_id=None):
+        correlation = rule.get('correlation')
+        if not isinstance(correlation, dict):
+            raise SigmaCompileError("correlation is not a mapping")
+        self.rule = rule
+        self.rule_id = rule_id
+        self.type = correlation.get('type')
+        if self.type not in ('event_count', 'value_count'):
+            raise SigmaCompileError(f"unsupported correlation type '{self.type}'")
+
+        rules = correlation.get('rules')
+        rules = rules if isinstance(rules, list) else [rules]
+        self.rule_refs = tuple(str(r) for r in rules if r)
+        if not self.rule_refs:
+            raise SigmaCompileError("correlation references no rules")
+
+        group_by = correlation.get('group-by') or []
+        group_by = group_by if isinstance(group_by, list) else [group_by]
+        self.group_by = tuple(str(f) for f in group_by)
+        self.group_keys = tuple(lookup_keys(f) for f in self.group_by)
+        self.timespan = parse_timespan(correlation.get('timespan'))
+
+        condition = correlation.get('condition')
+        if not isinstance(condition, dict):
+            raise SigmaCompileError("correlation condition is not a mapping")
+        if 'gte' in condition:
+            self.threshold = int(condition['gte'])
+        elif 'gt' in condition:
+            self.threshold = int(condition['gt']) + 1
+        else:
+            raise SigmaCompileError("only 'gte' and 'gt' correlation conditions are supported")
+
+        self.value_keys = None
+        if self.type == 'value_count':
+            field = condition.get('field')
+            if not field:
+                raise SigmaCompileError("value_count requires condition.field")
+            self.value_field = str(field)
+            self.value_keys = lookup_keys(self.value_field)
+
+    def group_of(self, event):
+        return tuple(_first_value(event, keys) for keys in self.group_keys)
+
+    def value_of(self, event):
+        return _first_value(event, self.value_keys)
+
+
+def _first_value(event, keys):
+    for key in keys:
+        value = event.get(key)
+        if value is not None:
+            return str(value)
+    return None
+
+
+class _GroupWindow:
+    """
+    1グループ分のスライディングウィンドウ。期間を固定数のバケットに分けたリングバッファで、
+    古いバケットは同じ位置に新しいバケットが来た時点で上書きされるため、メモリ使用量は一定に保たれる。
+    """
+    __slots__ = ('epochs', 'counts', 'values', 'last_epoch', 'fired_epoch')
+
+    def __init__(self, buckets, distinct):
+        self.epochs = [-1] * buckets
+        self.counts = [0] * buckets
+        self.values = [set() for _ in range(buckets)] if distinct else None
+        self.last_epoch = -1
+        self.fired_epoch = None
+
+    def add(self, epoch, value, max_values):
+        """バケットepochに1件加える。ウィンドウより古いイベントは捨ててFalseを返す"""
+        buckets = len(self.epochs)
+        if epoch <= self.last_epoch - buckets:
+            return False
+        slot = epoch % buckets
+        if self.epochs[slot] != epoch:
+            if self.epochs[slot] > epoch:
+                return False
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+            if self.values is not None:
+                self.values[slot].clear()
+        self.counts[slot] += 1
+        if self.values is not None and value is not None and len(self.values[slot]) < max_values:
+            self.values[slot].add(value)
+        if epoch > self.last_epoch:
+            self.last_epoch = epoch
+        return True
+
+    def total(self):
+        oldest = self.last_epoch - len(self.epochs)
+        if self.values is not None:
+            distinct = set()
+            for epoch, values in zip(self.epochs, self.values):
+                if epoch > oldest:
+                    distinct |= values
+            return len(distinct)
+        return sum(count for epoch, count in zip(self.epochs, self.counts) if epoch > oldest)
+
+
+class _CorrelationState:
+    """相関ルール1件分のグループ別ウィンドウ。グループ数は max_groups を上限にLRUで追い出す"""
+
+    def __init__(self, correlation, buckets, max_groups, max_values):
+        self.correlation = correlation
+        self.buckets = buckets
+        self.bucket_width = correlation.timespan / buckets
+        self.max_groups = max_groups
+        self.max_values = max_values
+        self.groups = OrderedDict()
+        self.evicted = 0
+        self.late_events = 0
+        self.alerts = 0
+
+    def observe(self, group, event_time, value):
+        """イベントを1件加え、閾値に達した場合はアラートの内容を返す"""
+        correlation = self.correlation
+        epoch = int(event_time // self.bucket_width)
+        window = self.groups.get(group)
+        if window is None:
+            self._evict(epoch)
+            window = _GroupWindow(self.buckets, correlation.type == 'value_count')
+            self.groups[group] = window
+        else:
+            self.groups.move_to_end(group)
+
+        if not window.add(epoch, value, self.max_values):
+            self.late_events += 1
+            return None
+
+        total = window.total()
+        if total < correlation.threshold:
+            return None
+        # 同じグループでは1ウィンドウにつき1回だけ通知する
+        if window.fired_epoch is not None and epoch - window.fired_epoch < self.buckets:
+            return None
+        window.fired_epoch = epoch
+        self.alerts += 1
+        return {
+            'count': total,
+            'window_start': (epoch - self.buckets + 1) * self.bucket_width,
+            'window_end': (epoch + 1) * self.bucket_width,
+        }
+
+    def _evict(self, epoch):
+        # 新しいグループを追加する前に、先頭(最も長く使われていないグループ)から期限切れのものと上限超過分を捨てる
+        while self.groups:
+            group, window = next(iter(self.groups.items()))
+            if len(self.groups) >= self.max_groups or window.last_epoch <= epoch - self.buckets:
+                self.groups.popitem(last=False)
+                self.evicted += 1
+            else:
+                break
+
+
+class SigmaCorrelationEngine:
+    """
+    単体ルールのマッチ結果を受け取り、相関ルールの時間窓集計を行うステートフルな後段処理。
+    相関アラートはSigmaMatchとして保存できるよう、ルールと同じ形(title/level/logsource/detection)の辞書で返す。
+    """
+
+    def __init__(self, correlation_rules=(), buckets=12, max_groups=10000, max_values=1000,
+                 timestamp_keys=DEFAULT_TIMESTAMP_KEYS):
+        self.buckets = max(1, buckets)
+        self.max_groups = max(1, max_groups)
+        self.max_values = max(1, max_values)
+        self.timestamp_keys = tuple(timestamp_keys)
+        self.states = {}
+        self.by_ref = {}
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self.load(correlation_rules)
+
+    def load(self, correlation_rules):
+        """
+        相関ルールを(パス, ルール)の組から読み込む。定義が変わっていないルールは集計状態を引き継ぐ。
+        """
+        states, skipped = {}, 0
+        for rule_id, rule in correlation_rules:
+            previous = self.states.get(rule_id)
+            if previous is not None and previous.correlation.rule == rule:
+                states[rule_id] = previous
+                continue
+            try:
+                correlation = CorrelationRule(rule, rule_id=rule_id)
+            except (SigmaCompileError, TypeError, ValueError):
+                skipped += 1
+                continue
+            states[rule_id] = _CorrelationState(correlation, self.buckets, self.max_groups, self.max_values)
+
+        by_ref = {}
+        for state in states.values():
+            for ref in state.correlation.rule_refs:
+                by_ref.setdefault(ref, []).append(state)
+
+        with self._lock:
+            self.states, self.by_ref, self.skipped = states, by_ref, skipped
+
+    def process(self, log_entry, matched_rules, now=None):
+        """1件のログとそのマッチ結果から、新たに成立した相関アラートのリストを返す"""
+        if not self.by_ref or not matched_rules:
+            return []
+        with self._lock:
+            targets = []
+            for rule in matched_rules:
+                for ref in (rule.get('id'), rule.get('name')):
+                    if ref is not None:
+                        for state in self.by_ref.get(str(ref), ()):
+                            if state not in targets:
+                                targets.append(state)
+            if not targets:
+                return []
+
+            event = normalize_event(log_entry)
+            timestamp = event_time(event, self.timestamp_keys)
+            if timestamp is None:
+                timestamp = now if now is not None else time.time()
+            alerts = []
+            for state in targets:
+                correlation = state.correlation
+                group = correlation.group_of(event)
+                value = correlation.value_of(event) if correlation.value_keys else None
+                result = state.observe(group, timestamp, value)
+                if result is not None:
+                    alerts.append(self._build_alert(correlation, group, result))
+            return alerts
+
+    def _build_alert(self, correlation, group, result):
+        rule = correlation.rule
+        to_iso = lambda ts: datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+        return {
+            'title': rule.get('title', 'N/A'),
+            'id': rule.get('id'),
+            'level': rule.get('level', 'N/A'),
+            'logsource': {'correlation': correlation.type},
+            'detection': {
+                'correlation': rule.get('correlation'),
+                'group': dict(zip(correlation.group_by, group)),
+                'count': result['count'],
+                'window_start': to_iso(result['window_start']),
+                'window_end': to_iso(result['window_end']),
+            },
+        }
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'rules': len(self.states),
+                'skipped_rules': self.skipped,
+                'groups': sum(len(s.groups) for s in self.states.values()),
+                'evicted_groups': sum(s.evicted for s in self.states.values()),
+                'late_events': sum(s.late_events for s in self.states.values()),
+                'alerts': sum(s.alerts for s in self.states.values()),
+            }
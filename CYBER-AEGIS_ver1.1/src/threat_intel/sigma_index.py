@@ -0,0 +1,178 @@
+# CYBER-AEGIS/src/threat_intel/sigma_index.py
+from src.threat_intel.aho_corasick import AhoCorasick
+
+# logsource(service/category)と、それを出力するイベントログのチャンネルの対応表
+LOGSOURCE_CHANNELS = {
+    ('service', 'security'): {'Security'},
+    ('service', 'system'): {'System'},
+    ('service', 'application'): {'Application'},
+    ('service', 'sysmon'): {'Microsoft-Windows-Sysmon/Operational'},
+    ('service', 'powershell'): {'Microsoft-Windows-PowerShell/Operational'},
+    ('service', 'powershell-classic'): {'Windows PowerShell'},
+    ('category', 'process_creation'): {'Security', 'Microsoft-Windows-Sysmon/Operational'},
+    ('category', 'ps_script'): {'Microsoft-Windows-PowerShell/Operational'},
+    ('category', 'ps_module'): {'Microsoft-Windows-PowerShell/Operational'},
+    ('category', 'ps_classic_start'): {'Windows PowerShell'},
+}
+
+CHANNEL_KEY = 'channel'
+
+
+class SigmaRuleIndex:
+    """
+    ルールが成立するために必要なフィールドとlogsourceから、ログごとの候補ルールを絞り込む索引。
+    required_keysを持たないルール(notだけの条件など)は常に候補に含める。
+    """
+
+    def __init__(self, compiled_rules, logsource_filter=False):
+        self.compiled_rules = compiled_rules
+        self.logsource_filter = logsource_filter
+        self.by_key = {}
+        self.unconstrained = []
+        self.unmatchable = 0
+        self.rule_channels = []
+
+        for position, compiled in enumerate(compiled_rules):
+            self.rule_channels.append(self._channels_for(compiled.rule.get('logsource')))
+            keys = compiled.required_keys()
+            if keys is None:
+                self.unconstrained.append(position)
+            elif not keys:
+                self.unmatchable += 1
+            else:
+                for key in keys:
+                    self.by_key.setdefault(key, []).append(position)
+
+        self._excluded_by_channel = {}
+        self.events_seen = 0
+        self.candidates_seen = 0
+
+    def _channels_for(self, logsource):
+        if not self.logsource_filter or not isinstance(logsource, dict):
+            return None
+        for field in ('service', 'category'):
+            value = logsource.get(field)
+            if isinstance(value, str) and (field, value.lower()) in LOGSOURCE_CHANNELS:
+                return LOGSOURCE_CHANNELS[(field, value.lower())]
+        return None
+
+    def _excluded_for(self, channel):
+        excluded = self._excluded_by_channel.get(channel)
+        if excluded is None:
+            excluded = {
+                position for position, channels in enumerate(self.rule_channels)
+                if channels is not None and channel not in channels
+            }
+            self._excluded_by_channel[channel] = excluded
+        return excluded
+
+    def candidates(self, fields):
+        """ログが持つ正規フィールドから候補ルールを元のルール順で返す"""
+        positions = set(self.unconstrained)
+        by_key = self.by_key
+        for key in fields:
+            rule_positions = by_key.get(key)
+            if rule_positions:
+                positions.update(rule_positions)
+
+        if self.logsource_filter:
+            channel = fields.get(CHANNEL_KEY)
+            if isinstance(channel, str):
+                positions -= self._excluded_for(channel)
+
+        self.events_seen += 1
+        self.candidates_seen += len(positions)
+        return [self.compiled_rules[p] for p in sorted(positions)]
+
+    def record(self, events, candidates):
+        """ワーカープロセス側で評価した分の件数を集計に加える"""
+        self.events_seen += events
+        self.candidates_seen += candidates
+
+    def get_stats(self):
+        total = len(self.compiled_rules)
+        avg = self.candidates_seen / self.events_seen if self.events_seen else 0.0
+        return {
+            'rules': total,
+            'indexed_keys': len(self.by_key),
+            'unconstrained_rules': len(self.unconstrained),
+            'unmatchable_rules': self.unmatchable,
+            'logsource_filter': self.logsource_filter,
+            'events': self.events_seen,
+            'avg_candidates_per_event': round(avg, 2),
+            'selectivity': round(avg / total, 4) if total else 0.0,
+        }
+
+
+class _FieldAutomaton:
+    """1つのログキーに対して、全ルールのリテラルをまとめたオートマトン"""
+
+    def __init__(self, literals):
+        # literals: {値: {修飾子, ...}}
+        values = sorted(v for v in literals if v)
+        self.automaton = AhoCorasick(values)
+        self.outputs = [
+            tuple(
+                (modifier, value) if modifier in literals[value] else None
+                for modifier in ('contains', 'startswith', 'endswith')
+            )
+            for value in values
+        ]
+        # 空文字列はどの値にも成立する
+        self.empty_hits = frozenset((modifier, '') for modifier in literals.get('', ()))
+
+    def scan(self, log_values):
+        hits = set(self.empty_hits)
+        outputs = self.outputs
+        for text in log_values:
+            length = len(text)
+            for pattern_id, start, end in self.automaton.search(text):
+                contains_key, startswith_key, endswith_key = outputs[pattern_id]
+                if contains_key:
+                    hits.add(contains_key)
+                if startswith_key and start == 0:
+                    hits.add(startswith_key)
+                if endswith_key and end == length:
+                    hits.add(endswith_key)
+        return hits
+
+
+class SigmaLiteralIndex:
+    """
+    contains/startswith/endswithの比較値をログキーごとにAho-Corasickへまとめた索引。
+    各フィールド値は1回だけ走査され、成立した(修飾子, 値)の集合が条件評価に渡される。
+    """
+
+    def __init__(self, compiled_rules, previous=None):
+        literals_by_key = {}
+        for compiled in compiled_rules:
+            for predicate in compiled.predicates:
+                if predicate.literal_keys is None:
+                    continue
+                for log_key in predicate.lookup_keys:
+                    literals = literals_by_key.setdefault(log_key, {})
+                    for modifier, value in predicate.literal_keys:
+                        literals.setdefault(value, set()).add(modifier)
+
+        # 前回の索引とリテラルが同じキーはオートマトンを作り直さずに再利用する
+        self.literals_by_key = literals_by_key
+        self.automata = {}
+        for key, literals in literals_by_key.items():
+            if previous is not None and previous.literals_by_key.get(key) == literals:
+                self.automata[key] = previous.automata[key]
+            else:
+                self.automata[key] = _FieldAutomaton(literals)
+
+    def scan(self, log_key, log_values):
+        if not log_values:
+            return frozenset()
+        automaton = self.automata.get(log_key)
+        if automaton is None:
+            return frozenset()
+        return automaton.scan(log_values)
+
+    def get_stats(self):
+        return {
+            'fields': len(self.automata),
+            'patterns': sum(len(a.automaton) for a in self.automata.values()),
+        }
@@ -0,0 +1,94 @@
+# CYBER-AEGIS/src/threat_intel/sigma_normalizer.py
+from functools import lru_cache
+
+# 各ログ形式のフィールド名(小文字)を、SIGMAルールが使う正規フィールド名に対応付ける。
+# Sysmon(event_data.Image等)とPowerShell(ScriptBlockText, Payload, ContextInfo, Data)は
+# 元々SIGMAと同じ名前のため、ここに無い名前はそのまま正規名として扱う。
+FIELD_ALIASES = {
+    # Security 4688 (プロセス作成)
+    'newprocessname': 'image',
+    'parentprocessname': 'parentimage',
+    'newprocessid': 'processid',
+    'creatorprocessid': 'parentprocessid',
+    # EventLogCollectorが出力するwinlogの共通項目
+    'event_id': 'eventid',
+    'record_id': 'eventrecordid',
+    'computer_name': 'computer',
+}
+
+# 同じ正規名に複数の値がある場合の優先順 (event_data > winlogの共通項目 > その他)
+_PREFIX_PRIORITIES = (
+    ('winlog.event_data.', 0),
+    ('event_data.', 0),
+    ('winlog.', 1),
+)
+
+
+def flatten_dict(d, parent_key='', sep='.'):
+    items = []
+    for k, v in d.items():
+        new_key = parent_key + sep + k if parent_key else k
+        if isinstance(v, dict):
+            items.extend(flatten_dict(v, new_key, sep=sep).items())
+        else:
+            items.append((new_key.lower(), v))
+    return dict(items)
+
+
+@lru_cache(maxsize=8192)
+def _canonical(key):
+    key = key.lower()
+    for prefix, priority in _PREFIX_PRIORITIES:
+        if key.startswith(prefix):
+            name = key[len(prefix):]
+            break
+    else:
+        name, priority = key, 2
+    return FIELD_ALIASES.get(name, name), priority
+
+
+def canonical_field(name):
+    """ルールのフィールド名やログのキーを正規フィールド名に変換する"""
+    return _canonical(str(name))[0]
+
+
+def lookup_keys(field):
+    """
+    ルールのフィールドについて、ログ側で参照する正規フィールド名を優先順に並べる。
+    コマンドラインを記録しない4688に対応するため、commandlineが無い場合はimageで代用する。
+    """
+    canonical = canonical_field(field)
+    if canonical == 'commandline':
+        return (canonical, 'image')
+    return (canonical,)
+
+
+class NormalizedEvent:
+    """正規フィールド名をキーとした1件のログ。元の値と、照合用に小文字化した値の両方を持つ"""
+    __slots__ = ('fields', 'lowered')
+
+    def __init__(self, fields, lowered):
+        self.fields = fields
+        self.lowered = lowered
+
+    def get(self, key, default=None):
+        return self.fields.get(key, default)
+
+
+def normalize_event(log_entry):
+    """生のログ(ネストしたdict)を正規フィールドに写像する。取り込み時に1回だけ呼ぶ"""
+    fields, priorities = {}, {}
+    for key, value in flatten_dict(log_entry).items():
+        if value is None:
+            continue
+        canonical, priority = _canonical(key)
+        if priorities.get(canonical, 3) <= priority:
+            continue
+        fields[canonical] = value
+        priorities[canonical] = priority
+
+    lowered = {
+        key: [str(v).lower() for v in value] if isinstance(value, list) else [str(value).lower()]
+        for key, value in fields.items()
+    }
+    return NormalizedEvent(fields, lowered)
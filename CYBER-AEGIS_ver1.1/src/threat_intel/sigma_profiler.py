@@ -0,0 +1,133 @@
+# CYBER-AEGIS/src/threat_intel/sigma_profiler.py
+import os
+import json
+import time
+import threading
+
+# 集計値の並び: [評価回数, 累積時間(ns), 最大時間(ns), マッチ数, 例外数]
+_CALLS, _TOTAL_NS, _MAX_NS, _MATCHES, _ERRORS = range(5)
+
+SORT_KEYS = ('total_ms', 'avg_us', 'max_us', 'calls', 'matches', 'hit_rate', 'errors')
+
+
+class SigmaRuleProfiler:
+    """
+    ルールごとの評価回数・累積評価時間・マッチ数・例外数を集計する。
+    照合スレッドの record と、他スレッドからの merge / reset / take は同じロックで直列化する。
+    ワーカープロセスの集計は take と merge で親に集める。
+    """
+
+    def __init__(self):
+        self.rules = {}
+        # ルールID -> 最後に発生した例外のメッセージ
+        self.last_errors = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, rule_id, elapsed_ns, matched, error=None):
+        with self._lock:
+            self._add(rule_id, elapsed_ns, matched, error)
+
+    def record_many(self, samples):
+        """(ルールID, 時間(ns), マッチしたか, 例外)のリストをまとめて記録する。ログ1件につきロックを1回だけ取るため"""
+        with self._lock:
+            for rule_id, elapsed_ns, matched, error in samples:
+                self._add(rule_id, elapsed_ns, matched, error)
+
+    def _add(self, rule_id, elapsed_ns, matched, error):
+        stats = self.rules.get(rule_id)
+        if stats is None:
+            stats = self.rules[rule_id] = [0, 0, 0, 0, 0]
+        stats[_CALLS] += 1
+        stats[_TOTAL_NS] += elapsed_ns
+        if elapsed_ns > stats[_MAX_NS]:
+            stats[_MAX_NS] = elapsed_ns
+        if matched:
+            stats[_MATCHES] += 1
+        if error is not None:
+            stats[_ERRORS] += 1
+            self.last_errors[rule_id] = f"{type(error).__name__}: {error}"
+
+    def take(self):
+        """これまでの集計を返して空にする (ワーカープロセスから差分を返すため)"""
+        with self._lock:
+            rules, errors = self.rules, self.last_errors
+            self.rules, self.last_errors = {}, {}
+        return rules, errors
+
+    def merge(self, delta):
+        """takeで取り出した別プロセスの集計を加える"""
+        rules, errors = delta
+        with self._lock:
+            for rule_id, other in rules.items():
+                stats = self.rules.get(rule_id)
+                if stats is None:
+                    self.rules[rule_id] = list(other)
+                    continue
+                stats[_CALLS] += other[_CALLS]
+                stats[_TOTAL_NS] += other[_TOTAL_NS]
+                stats[_MAX_NS] = max(stats[_MAX_NS], other[_MAX_NS])
+                stats[_MATCHES] += other[_MATCHES]
+                stats[_ERRORS] += other[_ERRORS]
+            self.last_errors.update(errors)
+
+    def reset(self):
+        with self._lock:
+            self.rules, self.last_errors = {}, {}
+            self.started_at = time.time()
+
+    def report(self, rules_by_id=None, sort='total_ms', top=None):
+        """ルールごとの集計を sort の降順に並べたリストを返す。rules_by_idがあればタイトルとレベルを付ける"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {SORT_KEYS}: {sort}")
+        rules_by_id = rules_by_id or {}
+        with self._lock:
+            snapshot = [(rule_id, list(stats)) for rule_id, stats in self.rules.items()]
+            last_errors = dict(self.last_errors)
+        rows = []
+        for rule_id, stats in snapshot:
+            calls = stats[_CALLS]
+            rule = rules_by_id.get(rule_id) or {}
+            rows.append({
+                'rule_id': rule_id,
+                'title': rule.get('title'),
+                'level': rule.get('level'),
+                'calls': calls,
+                'total_ms': round(stats[_TOTAL_NS] / 1e6, 3),
+                'avg_us': round(stats[_TOTAL_NS] / calls / 1e3, 2) if calls else 0.0,
+                'max_us': round(stats[_MAX_NS] / 1e3, 2),
+                'matches': stats[_MATCHES],
+                'hit_rate': round(stats[_MATCHES] / calls, 4) if calls else 0.0,
+                'errors': stats[_ERRORS],
+                'last_error': last_errors.get(rule_id),
+            })
+        rows.sort(key=lambda row: row[sort], reverse=True)
+        return rows[:top] if top else rows
+
+    def get_stats(self):
+        with self._lock:
+            all_stats = [list(stats) for stats in self.rules.values()]
+        return {
+            'since': self.started_at,
+            'rules': len(all_stats),
+            'calls': sum(stats[_CALLS] for stats in all_stats),
+            'total_ms': round(sum(stats[_TOTAL_NS] for stats in all_stats) / 1e6, 3),
+            'matches': sum(stats[_MATCHES] for stats in all_stats),
+            'errors': sum(stats[_ERRORS] for stats in all_stats),
+        }
+
+    def dump(self, path, rules_by_id=None, sort='total_ms', top=None):
+        """集計の概要とルールごとの集計をJSONファイルに書き出す。書き込み途中のファイルを読ませないよう置き換えで行う"""
+        report = {
+            'generated_at': time.time(),
+            'summary': self.get_stats(),
+            'rules': self.report(rules_by_id, sort=sort, top=top),
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return report
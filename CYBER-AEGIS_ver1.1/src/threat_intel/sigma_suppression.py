@@ -0,0 +1,93 @@
+# CYBER-AEGIS/src/threat_intel/sigma_suppression.py
+import hashlib
+import time
+from collections import OrderedDict
+
+from src.threat_intel.sigma_correlation import DEFAULT_TIMESTAMP_KEYS, event_time
+from src.threat_intel.sigma_normalizer import canonical_field
+
+# 既定で抑制キーに使う正規フィールド (プロセスのパス、コマンドライン、ホスト名)
+DEFAULT_SUPPRESSION_FIELDS = ('image', 'commandline', 'computer')
+
+
+class SigmaSuppressor:
+    """
+    同じルールが同じ値(既定ではImage/CommandLine/ホスト)で繰り返しマッチした場合に、window 秒の間は
+    最初の1件だけを通常どおり保存させ、以降はヒット数と最終検知時刻の更新にまとめるための状態を持つ。
+    キーはLRUで管理し、max_keys を超えた分と期限切れのものを古い順に捨てる。
+    時刻はログのイベント時刻を使い、無ければ取り込み時刻を使う。
+    """
+
+    def __init__(self, window=60.0, fields=DEFAULT_SUPPRESSION_FIELDS, max_keys=10000,
+                 timestamp_keys=DEFAULT_TIMESTAMP_KEYS):
+        self.window = window
+        self.fields = tuple(canonical_field(f) for f in fields)
+        self.max_keys = max(1, max_keys)
+        self.timestamp_keys = tuple(timestamp_keys)
+        # キー -> [ウィンドウ開始時刻, 最終検知時刻]
+        self.keys = OrderedDict()
+        self.new_keys = 0
+        self.suppressed = 0
+        self.evicted = 0
+
+    def key_for(self, rule, event):
+        """ルールと、ログの抑制対象フィールドの値から抑制キー(SHA-1の16進文字列)を作る"""
+        rule_ref = rule.get('id') or rule.get('title', 'N/A')
+        parts = [str(rule_ref)]
+        for field in self.fields:
+            value = event.get(field)
+            parts.append('' if value is None else str(value))
+        return hashlib.sha1('\x1f'.join(parts).encode('utf-8', errors='replace')).hexdigest()
+
+    def observe(self, rule, event, now=None):
+        """
+        マッチ1件を記録し、(抑制キー, ウィンドウ開始時刻, 検知時刻, 新規かどうか)を返す。
+        新規でなければ、同じキーとウィンドウ開始時刻で保存済みのレコードに集約する。
+        """
+        timestamp = event_time(event, self.timestamp_keys)
+        if timestamp is None:
+            timestamp = now if now is not None else time.time()
+        key = self.key_for(rule, event)
+
+        state = self.keys.get(key)
+        if state is not None and state[0] <= timestamp < state[0] + self.window:
+            state[1] = max(state[1], timestamp)
+            self.keys.move_to_end(key)
+            self.suppressed += 1
+            return key, state[0], timestamp, False
+
+        if state is None:
+            self._evict(timestamp)
+        else:
+            self.keys.move_to_end(key)
+        self.keys[key] = [timestamp, timestamp]
+        self.new_keys += 1
+        return key, timestamp, timestamp, True
+
+    def forget(self, keys):
+        """
+        保存できなかった行のキーを捨てる。残しておくと、次のマッチが存在しない行への更新として扱われてしまう。
+        """
+        for key in keys:
+            if self.keys.pop(key, None) is not None:
+                self.new_keys -= 1
+
+    def _evict(self, now):
+        # 先頭(最も長く使われていないキー)から、上限超過分と期限切れのものを捨てる
+        while self.keys:
+            key, (first_seen, _) = next(iter(self.keys.items()))
+            if len(self.keys) >= self.max_keys or first_seen + self.window <= now:
+                self.keys.popitem(last=False)
+                self.evicted += 1
+            else:
+                break
+
+    def get_stats(self):
+        return {
+            'window_seconds': self.window,
+            'fields': list(self.fields),
+            'active_keys': len(self.keys),
+            'new_keys': self.new_keys,
+            'suppressed': self.suppressed,
+            'evicted': self.evicted,
+        }
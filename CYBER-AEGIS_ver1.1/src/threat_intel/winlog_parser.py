@@ -0,0 +1,60 @@
+# CYBER-AEGIS/src/threat_intel/winlog_parser.py
+import xml.etree.ElementTree as ET
+
+EVENT_NS = '{http://schemas.microsoft.com/win/2004/08/events/event}'
+
+_SYSTEM = EVENT_NS + 'System'
+_EVENT_ID = EVENT_NS + 'EventID'
+_RECORD_ID = EVENT_NS + 'EventRecordID'
+_PROVIDER = EVENT_NS + 'Provider'
+_TIME_CREATED = EVENT_NS + 'TimeCreated'
+_CHANNEL = EVENT_NS + 'Channel'
+_EVENT_DATA = EVENT_NS + 'EventData'
+_USER_DATA = EVENT_NS + 'UserData'
+_DATA = EVENT_NS + 'Data'
+
+
+def parse_event_xml(xml_content, channel=None):
+    """
+    Windowsイベント1件のXMLを、EventLogCollectorがログファイルに書き出す形式のdictに変換する。
+    XMLのパースは1回だけ行う。channelを省略するとXML中のChannelを使う(EVTXファイルの読み込み用)。
+    変換できない場合はNoneを返す。
+    """
+    try:
+        root = ET.fromstring(xml_content)
+        system_part = root.find(_SYSTEM)
+        event_id = int(system_part.find(_EVENT_ID).text)
+        record_id = int(system_part.find(_RECORD_ID).text)
+        provider = system_part.find(_PROVIDER).get('Name')
+        time_created = system_part.find(_TIME_CREATED)
+        timestamp = time_created.get('SystemTime') if time_created is not None else None
+        if channel is None:
+            channel_part = system_part.find(_CHANNEL)
+            channel = channel_part.text if channel_part is not None else None
+
+        event_data = {}
+        event_data_part = root.find(_EVENT_DATA)
+        if event_data_part is not None:
+            for data in event_data_part.findall(_DATA):
+                key = data.get('Name')
+                if key:
+                    event_data[key] = data.text
+
+        user_data_part = root.find(_USER_DATA)
+        if user_data_part is not None:
+            for elem in user_data_part.iter():
+                if '}' in elem.tag:
+                    event_data[elem.tag.split('}')[-1]] = elem.text
+
+        return {
+            "@timestamp": timestamp, # 時間範囲での再処理や相関ルールの時間窓に使う
+            "winlog": {
+                "channel": channel,
+                "provider_name": provider,
+                "event_id": event_id,
+                "record_id": record_id,
+                "event_data": event_data
+            }
+        }
+    except Exception:
+        return None
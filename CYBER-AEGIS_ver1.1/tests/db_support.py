@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+from src.database.db_manager import DBManager
+
+
+class TempDatabaseMixin:
+    """
+    DBManagerのシングルトンを一時ディレクトリのデータベースで作り直すテスト用のmixin。
+    DBManagerはカレントディレクトリの config.ini と aegis.db を使うため、テスト中は一時ディレクトリに移動する。
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.prev_cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        self._reset_db_manager()
+        self.db = DBManager()
+        self.db_path = os.path.join(self.tmp_dir.name, 'aegis.db')
+
+    def tearDown(self):
+        self._reset_db_manager()
+        os.chdir(self.prev_cwd)
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def _reset_db_manager():
+        if DBManager._db is not None:
+            DBManager._db.close_all()
+        if DBManager._engine is not None:
+            DBManager._engine.dispose()
+        DBManager._instance = None
+        DBManager._engine = None
+        DBManager._Session = None
+        DBManager._db = None
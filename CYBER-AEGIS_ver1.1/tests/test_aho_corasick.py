@@ -0,0 +1,43 @@
+import random
+import unittest
+
+from src.threat_intel.aho_corasick import AhoCorasick
+
+
+def _naive(patterns, text):
+    return sorted(
+        (pattern_id, start, start + len(pattern))
+        for pattern_id, pattern in enumerate(patterns) if pattern
+        for start in range(len(text) - len(pattern) + 1)
+        if text.startswith(pattern, start)
+    )
+
+
+class AhoCorasickTest(unittest.TestCase):
+
+    def test_overlapping_and_nested_patterns(self):
+        patterns = ['he', 'she', 'his', 'hers']
+        matches = sorted(AhoCorasick(patterns).search('ushers'))
+        self.assertEqual(matches, [(0, 2, 4), (1, 1, 4), (3, 2, 6)])
+
+    def test_matches_agree_with_naive_search(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            patterns = [''.join(rng.choice('ab') for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 6))]
+            text = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 20)))
+            with self.subTest(patterns=patterns, text=text):
+                self.assertEqual(sorted(AhoCorasick(patterns).search(text)), _naive(patterns, text))
+
+    def test_empty_and_duplicate_patterns(self):
+        automaton = AhoCorasick(['', 'ab', 'ab'])
+        self.assertEqual(len(automaton), 3)
+        self.assertEqual(sorted(automaton.search('xab')), [(1, 1, 3), (2, 1, 3)])
+        self.assertEqual(list(AhoCorasick([]).search('anything')), [])
+
+    def test_non_ascii_text(self):
+        automaton = AhoCorasick(['東京', 'c:\\windows\\'])
+        self.assertEqual(sorted(automaton.search('東京都 c:\\windows\\system32')), [(0, 0, 2), (1, 4, 15)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import sqlite3
+import unittest
+
+from tests.db_support import TempDatabaseMixin
+
+
+def _incident(event_id, **extra):
+    return dict({'id': event_id, 'name': 'proc.exe', 'time': '2024-01-01T00:00:00', 'destination': '198.51.100.1:443',
+                 'threat_level': 'HIGH', 'status': 'NEW', 'description': 'test'}, **extra)
+
+
+def _leak(url, **extra):
+    return dict({'timestamp': '2024-01-01T00:00:00', 'source': 'GitHub', 'keyword': 'example.com',
+                 'repository': 'org/repo', 'file_path': 'config.py', 'url': url, 'matches': ['AKIA']}, **extra)
+
+
+class BulkInsertTest(TempDatabaseMixin, unittest.TestCase):
+
+    def _count(self, table):
+        return self.db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_duplicates_in_the_batch_and_in_the_table_are_ignored(self):
+        self.db.add_network_incident(_incident('ev-1'))
+        batch = [_incident('ev-1'), _incident('ev-2'), _incident('ev-3'), _incident('ev-2', description='again')]
+        inserted = self.db.add_network_incident_many(batch)
+        self.assertEqual([record['id'] for record in inserted], ['ev-2', 'ev-3'])
+        self.assertIs(inserted[0], batch[1])
+        self.assertEqual(self._count('network_incidents'), 3)
+
+    def test_single_row_inserts_still_raise_on_duplicates(self):
+        self.db.add_network_incident(_incident('ev-1'))
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.add_network_incident(_incident('ev-1', description='again'))
+        self.db.add_file_event({'id': 'f-1', 'event_type': 'created', 'path': 'a.txt', 'time': '2024-01-01T00:00:00'})
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.add_file_event({'id': 'f-2', 'event_type': 'created', 'path': 'b.txt'})
+        self.assertEqual((self._count('network_incidents'), self._count('file_events')), (1, 1))
+
+    def test_rows_violating_not_null_are_skipped(self):
+        inserted = self.db.add_file_event_many([
+            {'id': 'f-1', 'event_type': 'created', 'path': 'a.txt', 'time': '2024-01-01T00:00:00'},
+            {'id': 'f-2', 'event_type': 'created', 'path': 'b.txt'},
+            {'id': 'f-3', 'event_type': 'deleted', 'path': 'c.txt', 'time': '2024-01-01T00:00:01'},
+        ])
+        self.assertEqual([record['id'] for record in inserted], ['f-1', 'f-3'])
+        self.assertEqual(self._count('file_events'), 2)
+
+    def test_leaks_are_deduplicated_by_url(self):
+        inserted = self.db.add_github_leak_many([_leak('https://example.com/1'), _leak('https://example.com/1'),
+                                                 _leak('https://example.com/2')])
+        self.assertEqual(len(inserted), 2)
+        self.assertEqual(self.db.add_github_leak_many([_leak('https://example.com/2')]), [])
+        leaks = self.db.get_all_github_leaks()
+        self.assertEqual(sorted(leak['url'] for leak in leaks), ['https://example.com/1', 'https://example.com/2'])
+        self.assertEqual(leaks[0]['matches'], ['AKIA'])
+
+    def test_empty_batches_insert_nothing(self):
+        self.assertEqual(self.db.add_x_leak_many([]), [])
+        self.assertEqual(self.db.add_pastebin_leak_many(iter(())), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
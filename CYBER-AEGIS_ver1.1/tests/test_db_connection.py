@@ -0,0 +1,87 @@
+import threading
+import unittest
+
+from sqlalchemy import select
+
+from src.database.db_manager import get_session
+from src.database.models import LogCheckpoint
+from tests.db_support import TempDatabaseMixin
+
+
+class SessionWriteSerializationTest(TempDatabaseMixin, unittest.TestCase):
+
+    def _lock_is_free(self):
+        """別のスレッドから書き込みロックを取れるかを返す"""
+        result = []
+
+        def probe():
+            acquired = self.db._db._write_lock.acquire(blocking=False)
+            if acquired:
+                self.db._db._write_lock.release()
+            result.append(acquired)
+
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test_session_write_holds_the_manager_lock_until_commit(self):
+        session = get_session()
+        try:
+            session.execute(select(LogCheckpoint)).all()
+            # 読み取りだけではロックを取らない
+            self.assertTrue(self._lock_is_free())
+            session.merge(LogCheckpoint(path='a.log', inode='1', offset=10))
+            session.flush()
+            self.assertFalse(self._lock_is_free())
+            session.commit()
+            self.assertTrue(self._lock_is_free())
+        finally:
+            session.close()
+        self.assertEqual(self.db.conn.execute("SELECT offset FROM log_checkpoints").fetchall()[0][0], 10)
+
+    def test_session_closed_without_commit_rolls_back_and_releases(self):
+        session = get_session()
+        session.add(LogCheckpoint(path='a.log', inode='1', offset=10))
+        session.flush()
+        self.assertFalse(self._lock_is_free())
+        session.close()
+        self.assertTrue(self._lock_is_free())
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM log_checkpoints").fetchone()[0], 0)
+
+    def test_concurrent_session_and_manager_writes(self):
+        errors = []
+
+        def session_writer(worker):
+            session = get_session()
+            try:
+                for i in range(30):
+                    session.merge(LogCheckpoint(path=f'{worker}.log', inode='1', offset=i))
+                    session.commit()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                session.close()
+
+        def manager_writer(worker):
+            try:
+                for i in range(30):
+                    self.db.add_file_event({'id': f'{worker}-{i}', 'event_type': 'created', 'path': 'x', 'time': '2024-01-01T00:00:00'})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=session_writer, args=(f's{i}',)) for i in range(3)]
+        threads += [threading.Thread(target=manager_writer, args=(f'm{i}',)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM log_checkpoints").fetchone()[0], 3)
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM file_events").fetchone()[0], 90)
+        self.assertTrue(self._lock_is_free())
+
+
+if __name__ == '__main__':
+    unittest.main()
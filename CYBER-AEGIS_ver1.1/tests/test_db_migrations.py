@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine
+
+from src.database.models import Base
+from src.database import migrations
+from src.database.migrations import MIGRATIONS, LATEST_VERSION, get_version, migrate
+
+
+def _query_plan(conn, query):
+    params = (None,) * query.count('?')
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+class SchemaMigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'aegis.db')
+        engine = create_engine(f'sqlite:///{self.db_path}')
+        Base.metadata.create_all(engine)
+        engine.dispose()
+        self.conn = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp_dir.cleanup()
+
+    def _indexes(self):
+        return {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    def test_versions_are_sequential(self):
+        self.assertEqual([m.version for m in MIGRATIONS], list(range(1, len(MIGRATIONS) + 1)))
+
+    def test_migrate_sets_user_version_and_is_idempotent(self):
+        self.assertEqual(get_version(self.conn), 0)
+        with self.conn:
+            self.assertEqual(migrate(self.conn), LATEST_VERSION)
+        indexes = self._indexes()
+        with self.conn:
+            self.assertEqual(migrate(self.conn), LATEST_VERSION)
+        self.assertEqual(get_version(self.conn), LATEST_VERSION)
+        self.assertEqual(self._indexes(), indexes)
+
+    def test_migrate_resumes_from_stored_version(self):
+        with self.conn:
+            self.conn.execute("PRAGMA user_version = 2")
+            migrate(self.conn)
+        indexes = self._indexes()
+        self.assertNotIn('ix_sigma_matches_timestamp', indexes)
+        self.assertIn('ix_messages_conversation_id_timestamp', indexes)
+
+    def test_columns_are_added_to_a_legacy_table(self):
+        # 抑制キーなどの列を追加する前に作られた sigma_matches
+        with self.conn:
+            self.conn.execute("DROP TABLE sigma_matches")
+            self.conn.execute("CREATE TABLE sigma_matches (id INTEGER PRIMARY KEY, timestamp DATETIME, rule_title VARCHAR, "
+                              "rule_level VARCHAR, log_source TEXT, detection_details TEXT, log_entry TEXT)")
+            self.conn.execute("INSERT INTO sigma_matches (rule_title) VALUES ('old')")
+        with self.conn:
+            with self.assertLogs('src.database.migrations', level='INFO') as logs:
+                migrate(self.conn)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(sigma_matches)")]
+        for column in ('source', 'hit_count', 'first_seen', 'last_seen', 'suppression_key'):
+            self.assertIn(column, columns)
+        self.assertEqual(self.conn.execute("SELECT hit_count FROM sigma_matches").fetchall(), [(1,)])
+        self.assertIn('ix_sigma_matches_suppression_key', self._indexes())
+        self.assertEqual(len(logs.records), len(MIGRATIONS))
+
+    def test_failed_migration_is_rolled_back(self):
+        self.conn.execute("DROP TABLE messages")
+        self.conn.commit()
+        # DBManagerの書き込みトランザクションと同じく、BEGIN IMMEDIATEの中で適用する
+        self.conn.execute("BEGIN IMMEDIATE")
+        with self.assertRaises(sqlite3.OperationalError):
+            migrate(self.conn)
+        self.conn.rollback()
+        self.assertEqual(get_version(self.conn), 0)
+        self.assertNotIn('ix_sigma_matches_timestamp', self._indexes())
+
+    def test_hot_queries_use_migration_indexes(self):
+        with self.conn:
+            migrate(self.conn)
+        for migration in MIGRATIONS:
+            for query, index in migration.queries:
+                with self.subTest(version=migration.version, query=query):
+                    plan = _query_plan(self.conn, query)
+                    self.assertTrue(any(index in step for step in plan), plan)
+                    self.assertFalse(any('USE TEMP B-TREE' in step for step in plan), plan)
+
+    def test_fts_index_follows_source_rows(self):
+        with self.conn:
+            migrate(self.conn)
+        search = "SELECT rowid FROM github_leaks_fts WHERE github_leaks_fts MATCH ?"
+        with self.conn:
+            self.conn.execute("INSERT INTO github_leaks (timestamp, url, matches) VALUES ('t', 'u1', '[\"AKIAEXAMPLEKEY\"]')")
+        self.assertEqual(self.conn.execute(search, ('"AKIAEXAMPLE"',)).fetchall(), [(1,)])
+        with self.conn:
+            self.conn.execute("UPDATE github_leaks SET ai_report = '{\"summary\": \"mail.example.com\"}' WHERE id = 1")
+        self.assertEqual(self.conn.execute(search, ('"example.com"',)).fetchall(), [(1,)])
+        with self.conn:
+            self.conn.execute("DELETE FROM github_leaks WHERE id = 1")
+        self.assertEqual(self.conn.execute(search, ('"AKIAEXAMPLE"',)).fetchall(), [])
+        # 索引と元のテーブルが食い違っていれば integrity-check が例外を送出する
+        self.conn.execute("INSERT INTO github_leaks_fts (github_leaks_fts, rank) VALUES ('integrity-check', 1)")
+
+    def test_fts_index_is_skipped_without_trigram(self):
+        with mock.patch.object(migrations, 'fts_trigram_available', return_value=False):
+            with self.conn:
+                self.assertEqual(migrate(self.conn), LATEST_VERSION)
+        tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master")}
+        self.assertFalse([name for name in tables if '_fts' in name or 'trigram_probe' in name])
+        self.assertIn('ix_file_events_event_time', self._indexes())
+
+
+if __name__ == '__main__':
+    unittest.main()
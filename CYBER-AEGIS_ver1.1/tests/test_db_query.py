@@ -0,0 +1,67 @@
+import unittest
+
+from tests.db_support import TempDatabaseMixin
+
+
+class KeysetPaginationTest(TempDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # 同じ時刻の行を含め、登録順と発生時刻順が異なるようにする
+        times = ['2024-01-01T00:00:0%d' % (i % 4) for i in range(10)]
+        self.db.add_network_incident_many([
+            {'id': f'ev-{i}', 'name': 'proc.exe', 'time': time, 'threat_level': 'HIGH' if i % 2 else 'LOW'}
+            for i, time in enumerate(times)
+        ])
+        self.expected = sorted(((time, i + 1, f'ev-{i}') for i, time in enumerate(times)), reverse=True)
+
+    def _read_pages(self, limit, **kwargs):
+        pages, cursor = [], None
+        while True:
+            page = self.db.get_network_incidents_page(limit=limit, cursor=cursor, **kwargs)
+            pages.append([item['id'] for item in page['items']])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return pages
+
+    def test_pages_follow_sort_order_without_gaps_or_duplicates(self):
+        pages = self._read_pages(3, sort='event_time')
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+        self.assertEqual([event_id for page in pages for event_id in page], [e[2] for e in self.expected])
+
+    def test_id_sort_and_ascending_order(self):
+        pages = self._read_pages(4, sort='id', descending=False)
+        self.assertEqual([event_id for page in pages for event_id in page], [f'ev-{i}' for i in range(10)])
+
+    def test_filters_and_time_range(self):
+        pages = self._read_pages(2, sort='event_time', filters={'threat_level': 'HIGH'},
+                                 since='2024-01-01T00:00:01', until='2024-01-01T00:00:03')
+        expected = [e[2] for e in self.expected
+                    if int(e[2][3:]) % 2 and '2024-01-01T00:00:01' <= e[0] < '2024-01-01T00:00:03']
+        self.assertEqual([event_id for page in pages for event_id in page], expected)
+
+    def test_last_full_page_has_no_next_cursor(self):
+        page = self.db.get_network_incidents_page(limit=10)
+        self.assertEqual(len(page['items']), 10)
+        self.assertIsNone(page['next_cursor'])
+
+    def test_invalid_sort_and_filter_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.db.get_network_incidents_page(sort='destination')
+        with self.assertRaises(ValueError):
+            self.db.get_network_incidents_page(filters={'description': 'x'})
+
+    def test_get_all_trinity_simulations_reads_every_page(self):
+        for i in range(150):
+            self.db.conn.execute(
+                "INSERT INTO trinity_ai_simulations (simulation_time, white_team_report) VALUES (?, ?)",
+                ('2024-01-01T00:%02d:%02d' % (i // 60, i % 60), f'report {i}')
+            )
+        self.db.conn.commit()
+        simulations = self.db.get_all_trinity_simulations()
+        self.assertEqual([s['id'] for s in simulations], list(range(150, 0, -1)))
+        self.assertEqual(simulations[0]['white_team_report'], 'report 149')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from unittest import mock
+
+from src.database import migrations
+from tests.db_support import TempDatabaseMixin
+
+
+def _github(url, matches):
+    return {'timestamp': '2024-01-01T00:00:00', 'source': 'GitHub', 'keyword': 'example.com', 'repository': 'org/repo',
+            'file_path': 'config.py', 'url': url, 'matches': matches}
+
+
+def _tweet(url, text):
+    return {'timestamp': '2024-01-01T00:00:00', 'source': 'X', 'keyword': 'example.com', 'author': 'someone',
+            'tweet_text': text, 'url': url, 'tweet_created_at': '2024-01-01T00:00:00'}
+
+
+class _SearchTests:
+    """FTS5の索引を使う場合と LIKE で探す場合に共通の検索結果"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.add_github_leak_many([_github('https://example.com/1', ['AKIAEXAMPLEKEY', 'mail.example.com']),
+                                      _github('https://example.com/2', ['ghp_unrelated'])])
+        self.db.add_x_leak_many([_tweet('https://x.com/1', 'leaked AKIAEXAMPLEKEY 100% real'),
+                                 _tweet('https://x.com/2', 'nothing here')])
+
+    def _fts_tables(self):
+        return {row[0] for row in self.db.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%\\_fts' ESCAPE '\\'")}
+
+    def test_substring_search_across_sources(self):
+        results = self.db.search('akiaexample')
+        self.assertEqual(sorted((r['source'], r['id']) for r in results), [('github', 'gh-1'), ('x', 'x-1')])
+        snippets = {r['source']: r['snippet'] for r in results}
+        self.assertIn('[AKIAEXAMPLE]', snippets['x'])
+        self.assertEqual([r['id'] for r in self.db.search('example.com', sources=['github'])], ['gh-1'])
+
+    def test_invalid_arguments_are_rejected(self):
+        for kwargs in ({'text': 'ab'}, {'text': 'abc', 'sources': ['mail']}, {'text': 'abc', 'order': 'oldest'}):
+            with self.subTest(**kwargs), self.assertRaises(ValueError):
+                self.db.search(**kwargs)
+
+
+class FullTextSearchTest(_SearchTests, TempDatabaseMixin, unittest.TestCase):
+
+    def test_fts_index_is_used_when_trigram_is_available(self):
+        self.assertIn('github_leaks_fts', self._fts_tables())
+        results = self.db.search('AKIAEXAMPLE')
+        self.assertTrue(all(r['rank'] is not None for r in results))
+        self.assertEqual([r['id'] for r in self.db.search('"ghp_unrelated"', sources=['github'], raw=True)], ['gh-2'])
+
+
+class LikeFallbackSearchTest(_SearchTests, TempDatabaseMixin, unittest.TestCase):
+    """trigramトークナイザーの無いSQLite (3.34.0より前) では、FTS5の索引を作らずに LIKE で検索する"""
+
+    def setUp(self):
+        patcher = mock.patch.object(migrations, 'fts_trigram_available', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def test_like_search_without_fts_tables(self):
+        self.assertEqual(self._fts_tables(), set())
+        results = self.db.search('AKIAEXAMPLE', order='rank')
+        self.assertTrue(all(r['rank'] is None for r in results))
+        # LIKEの特殊文字はそのままの文字として扱う
+        self.assertEqual([r['id'] for r in self.db.search('00% r')], ['x-1'])
+        self.assertEqual(self.db.search('0_%'), [])
+        with self.assertRaises(ValueError):
+            self.db.search('"AKIAEXAMPLE"', raw=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import json
+import socket
+import threading
+import unittest
+
+from service.workers.event_listener import EventListener, _TcpProtocol, parse_event_line, parse_syslog
+
+
+class _Transport:
+    def get_extra_info(self, name):
+        return ('192.0.2.1', 50000) if name == 'peername' else None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class ParseEventLineTest(unittest.TestCase):
+
+    def test_syslog_with_structured_data_and_json_body(self):
+        line = ('<134>1 2024-01-01T00:00:00Z host app 42 ID47 [meta key="a \\"q\\" \\]"][origin ip="10.0.0.1"] '
+                '\ufeff{"winlog": {"event_id": 4625}}')
+        event = parse_syslog(line)
+        self.assertEqual(event['winlog'], {'event_id': 4625})
+        self.assertEqual(event['@timestamp'], '2024-01-01T00:00:00Z')
+        syslog = event['syslog']
+        self.assertEqual((syslog['facility'], syslog['severity'], syslog['hostname'], syslog['procid']), (16, 6, 'host', '42'))
+        self.assertEqual(syslog['structured_data'], {'meta': {'key': 'a "q" ]'}, 'origin': {'ip': '10.0.0.1'}})
+
+    def test_syslog_with_nil_fields_and_plain_message(self):
+        event = parse_syslog('<13>1 - - - - - - plain text message')
+        self.assertEqual(event['message'], 'plain text message')
+        self.assertNotIn('@timestamp', event)
+        self.assertEqual((event['syslog']['hostname'], event['syslog']['structured_data']), (None, None))
+
+    def test_event_line_formats(self):
+        self.assertEqual(parse_event_line('  {"a": 1}\r'), {'a': 1})
+        self.assertIsNone(parse_event_line('[1, 2]'))
+        self.assertIsNone(parse_event_line('{broken'))
+        self.assertIsNone(parse_event_line('not syslog'))
+        self.assertIsNone(parse_event_line('<13>not a header'))
+        self.assertEqual(parse_event_line('<13>1 - h a - - - hi')['message'], 'hi')
+
+
+class TcpFramingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.listener = EventListener(lambda events, source: self.batches.append((source, events)), batch_size=100)
+        self.protocol = _TcpProtocol(self.listener)
+        self.protocol.connection_made(_Transport())
+
+    def _events(self):
+        self.listener.flush()
+        return [event for _, events in self.batches for event in events]
+
+    def test_newline_and_octet_counted_frames_split_across_reads(self):
+        counted = '<13>1 - h a - - - line\nwith newline'.encode('utf-8')
+        stream = b'{"n": 1}\n' + str(len(counted)).encode() + b' ' + counted + b'{"n": 2}\r\n{"n": 3}'
+        for i in range(0, len(stream), 5):
+            self.protocol.data_received(stream[i:i + 5])
+        self.assertEqual(self._events()[:3], [{'n': 1}, parse_syslog('<13>1 - h a - - - line\nwith newline'), {'n': 2}])
+        # 改行で終わらない最後の行は接続が閉じたときに渡される
+        self.protocol.connection_lost(None)
+        self.assertEqual(self._events()[-1], {'n': 3})
+        self.assertEqual(self.batches[0][0], 'tcp://192.0.2.1')
+
+    def test_invalid_lines_are_counted_and_oversized_input_is_dropped(self):
+        self.listener.max_line = 16
+        self.protocol.data_received(b'{"ok": true}\nnot json\n\n')
+        self.protocol.data_received(b'x' * 32)
+        self.protocol.data_received(b'{"after": 1}\n')
+        self.assertEqual(self._events(), [{'ok': True}, {'after': 1}])
+        stats = self.listener.get_stats()
+        self.assertEqual((stats['received'], stats['invalid']), (3, 2))
+
+    def test_batches_are_emitted_per_source_at_batch_size(self):
+        self.listener.batch_size = 2
+        self.listener.receive('udp://a', [b'{"i": 1}', b'{"i": 2}', b'{"i": 3}'])
+        self.listener.receive('udp://b', [b'{"i": 4}'])
+        self.assertEqual(self.batches, [('udp://a', [{'i': 1}, {'i': 2}])])
+        self.listener.flush()
+        self.assertEqual(self.batches[1:], [('udp://a', [{'i': 3}]), ('udp://b', [{'i': 4}])])
+
+
+class EventListenerTest(unittest.TestCase):
+
+    def test_tcp_and_udp_events_reach_the_sink(self):
+        received = []
+        done = threading.Event()
+
+        def sink(events, source):
+            received.extend(events)
+            if len(received) >= 4:
+                done.set()
+
+        tcp_port, udp_port = _free_port(), _free_port()
+        listener = EventListener(sink, tcp=f'127.0.0.1:{tcp_port}', udp=f'127.0.0.1:{udp_port}', flush_interval_ms=10)
+        listener.start()
+        try:
+            with socket.create_connection(('127.0.0.1', tcp_port)) as conn:
+                conn.sendall(b'{"via": "tcp", "n": 1}\n{"via": "tcp", "n": 2}\n')
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+                udp.sendto(('{"via": "udp", "n": 3}\n' + json.dumps({'via': 'udp', 'n': 4})).encode(), ('127.0.0.1', udp_port))
+            self.assertTrue(done.wait(5))
+        finally:
+            listener.stop()
+        self.assertEqual(sorted(event['n'] for event in received), [1, 2, 3, 4])
+        self.assertEqual(listener.get_stats()['sink_errors'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
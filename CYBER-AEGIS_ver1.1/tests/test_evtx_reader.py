@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+
+from service.workers import evtx_reader
+from service.workers.evtx_reader import EvtxReader
+
+_XML = ('<Event xmlns="http://schemas.microsoft.com/win/2004/08/events/event"><System>'
+        '<Provider Name="p"/><EventID>{event_id}</EventID><EventRecordID>{record_id}</EventRecordID>'
+        '<Channel>Security</Channel></System></Event>')
+
+
+class _Record:
+    def __init__(self, xml):
+        self._xml = xml
+
+    def xml(self):
+        return self._xml
+
+
+class _Chunk:
+    def __init__(self, records):
+        self._records = records
+
+    def records(self):
+        return iter(self._records)
+
+
+class _Header:
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def chunk_count(self):
+        return self._chunks
+
+
+class _FakeEvtx:
+    """python-evtxのEvtxの代わりに、ファイル名ごとに用意したチャンクを返す"""
+    files = {}
+
+    def __init__(self, path):
+        if path not in self.files:
+            raise OSError(f"no such file: {path}")
+        self.chunks_ = self.files[path]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def get_file_header(self):
+        return _Header(len(self.chunks_))
+
+    def chunks(self):
+        return iter(self.chunks_)
+
+
+def _chunk(*event_ids, start=1):
+    return _Chunk([_Record(_XML.format(event_id=eid, record_id=start + i)) for i, eid in enumerate(event_ids)])
+
+
+class EvtxReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        _FakeEvtx.files = {
+            'a.evtx': [_chunk(4688, 4624, start=1), _chunk(4688, start=3), _Chunk([_Record('<broken')]),
+                       _chunk(4625, start=5)],
+            'b.evtx': [_chunk(4688, start=1)],
+        }
+        patcher = mock.patch.object(evtx_reader, 'Evtx', _FakeEvtx)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _read(self, paths, **kwargs):
+        reader = EvtxReader(paths, processes=0, **kwargs)
+        batches = [(path, [(e['winlog']['event_id'], e['winlog']['record_id']) for e in events])
+                   for path, events in reader.iter_batches()]
+        return reader, batches
+
+    def test_batches_follow_file_and_chunk_order(self):
+        reader, batches = self._read(['a.evtx', 'missing.evtx', 'b.evtx'], chunks_per_task=3)
+        self.assertEqual(batches, [
+            ('a.evtx', [(4688, 1), (4624, 2), (4688, 3)]),
+            ('a.evtx', [(4625, 5)]),
+            ('b.evtx', [(4688, 1)]),
+        ])
+        # 開けないファイルは飛ばし、変換できないレコードは数える
+        self.assertEqual(reader.stats, {'files': 2, 'chunks': 5, 'records': 6, 'events': 5, 'errors': 1})
+
+    def test_event_id_filter(self):
+        reader, batches = self._read(['a.evtx'], chunks_per_task=1, include_event_ids={4688})
+        self.assertEqual(batches, [('a.evtx', [(4688, 1)]), ('a.evtx', [(4688, 3)]), ('a.evtx', []), ('a.evtx', [])])
+        self.assertEqual((reader.stats['records'], reader.stats['events']), (5, 2))
+
+    def test_python_evtx_is_required(self):
+        with mock.patch.object(evtx_reader, 'Evtx', None):
+            with self.assertRaises(RuntimeError):
+                EvtxReader(['a.evtx'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import threading
+import time
+import unittest
+
+from service.workers.ingest_pipeline import IngestPipeline, PipelineStage
+
+
+class _Collector:
+    """最終段のhandler。受け取ったバッチと読み取り位置を記録する"""
+
+    def __init__(self):
+        self.batches = []
+        self.positions = []
+
+    def __call__(self, batch, position):
+        self.batches.append(list(batch))
+        self.positions.append(position)
+
+
+class IngestPipelineTest(unittest.TestCase):
+
+    def test_batches_keep_order_through_stages(self):
+        sink = _Collector()
+        pipeline = IngestPipeline([
+            PipelineStage('double', lambda batch, position: [x * 2 for x in batch]),
+            PipelineStage('sink', sink),
+        ])
+        pipeline.start()
+        for i in range(20):
+            pipeline.put([i, i + 1], position=i)
+        pipeline.stop()
+        self.assertEqual(sink.positions, list(range(20)))
+        self.assertEqual(sink.batches[3], [6, 8])
+
+    def test_failing_batch_is_dead_lettered_and_position_advances(self):
+        def parse(batch, position):
+            if position == 1:
+                raise AttributeError("'list' object has no attribute 'items'")
+            return batch
+
+        sink = _Collector()
+        parser = PipelineStage('parser', parse, retry_delay=60, max_retries=0)
+        pipeline = IngestPipeline([parser, PipelineStage('sink', sink)])
+        pipeline.start()
+        for i in range(3):
+            pipeline.put([f'line{i}'], position=i)
+        pipeline.stop()
+
+        # 失敗したバッチは中身を流さず、読み取り位置だけを次段に渡す
+        self.assertEqual(sink.positions, [0, 1, 2])
+        self.assertEqual(sink.batches, [['line0'], [], ['line2']])
+        stats = parser.get_stats()
+        self.assertEqual((stats['errors'], stats['dead_lettered']), (1, 1))
+        self.assertEqual(parser.dead_letters[0]['position'], 1)
+
+    def test_transient_error_is_retried(self):
+        calls = []
+        done = threading.Event()
+
+        def flaky(batch, position):
+            calls.append(position)
+            if len(calls) == 1:
+                raise OSError("database is locked")
+            done.set()
+
+        stage = PipelineStage('sink', flaky, retry_delay=0.01)
+        pipeline = IngestPipeline([stage])
+        pipeline.start()
+        pipeline.put(['a'], position=0)
+        self.assertTrue(done.wait(5))
+        pipeline.stop()
+        self.assertEqual(calls, [0, 0])
+        self.assertEqual(stage.get_stats()['dead_lettered'], 0)
+
+    def test_stop_aborts_retry_and_drops_later_batches(self):
+        attempts = threading.Event()
+
+        def always_fails(batch, position):
+            attempts.set()
+            raise OSError("disk full")
+
+        stage = PipelineStage('sink', always_fails, retry_delay=60)
+        pipeline = IngestPipeline([stage])
+        pipeline.start()
+        pipeline.put(['a'], position=0)
+        pipeline.put(['b'], position=1)
+        self.assertTrue(attempts.wait(5))
+        started = time.monotonic()
+        pipeline.stop()
+        # 再試行の待機(60秒)を待たずに止まり、後続のバッチも処理しない
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(stage.get_stats()['batches'], 0)
+
+    def test_full_queue_blocks_the_producer(self):
+        release = threading.Event()
+
+        def slow(batch, position):
+            release.wait(5)
+
+        stage = PipelineStage('slow', slow, maxsize=1)
+        pipeline = IngestPipeline([stage])
+        pipeline.start()
+        producer = threading.Thread(target=lambda: [pipeline.put([i], position=i) for i in range(4)])
+        producer.start()
+        producer.join(0.3)
+        # 処理中の1件とキューの1件を超えた分は、putで待たされる
+        self.assertTrue(producer.is_alive())
+        release.set()
+        producer.join(5)
+        pipeline.stop()
+        stats = stage.get_stats()
+        self.assertEqual(stats['batches'], 4)
+        self.assertGreater(stats['blocked_puts'], 0)
+
+
+class ParseLinesTest(unittest.TestCase):
+
+    def test_non_object_json_lines_are_dropped(self):
+        from service.workers.log_monitor import LogMonitorWorker
+
+        worker = LogMonitorWorker.__new__(LogMonitorWorker)
+        lines = ['{"a": 1}', '[1, 2]', '"text"', '42', 'null', 'not json', '', '{"b": {"c": 2}}']
+        self.assertEqual(worker._parse_lines(lines, verbose=False), [{'a': 1}, {'b': {'c': 2}}])
+
+
+if __name__ == '__main__':
+    unittest.main()
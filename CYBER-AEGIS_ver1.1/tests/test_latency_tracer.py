@@ -0,0 +1,138 @@
+import json
+import os
+import tempfile
+import unittest
+
+from service.workers.latency_tracer import COLLECTED_FIELD, LatencyHistogram, LatencyTracer
+
+# 2進小数で正確に表せる時刻を使い、区間の値を丸め誤差なしで比べる
+_T = 1_700_000_000.0
+
+
+def _entry(record_id, event_at, collected_at=None):
+    entry = {'@timestamp': event_at, 'winlog': {'channel': 'Security', 'event_id': 4688, 'record_id': record_id}}
+    if collected_at is not None:
+        entry[COLLECTED_FIELD] = collected_at
+    return entry
+
+
+def _summary(value_ms, count):
+    return {'count': count, 'mean_ms': value_ms, 'p50_ms': value_ms, 'p90_ms': value_ms, 'p99_ms': value_ms,
+            'max_ms': value_ms}
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_percentiles_use_bucket_upper_bounds_capped_by_max(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(50), 0.0)
+        # 1.0msは上限1.6msのバケット、50msは上限51.2msのバケットに入る
+        histogram.add(1.0, count=90)
+        histogram.add(50.0, count=10)
+        self.assertAlmostEqual(histogram.percentile(50), 1.6)
+        self.assertAlmostEqual(histogram.percentile(90), 1.6)
+        self.assertEqual(histogram.percentile(91), 50.0)
+        self.assertEqual(histogram.summary(),
+                         {'count': 100, 'mean_ms': 5.9, 'p50_ms': 1.6, 'p90_ms': 1.6, 'p99_ms': 50.0, 'max_ms': 50.0})
+
+    def test_negative_and_overflowing_values(self):
+        histogram = LatencyHistogram()
+        histogram.add(-5.0)
+        self.assertEqual((histogram.counts[0], histogram.total_ms, histogram.percentile(100)), (1, 0.0, 0.0))
+        # 最後の区切り(約56分)を超える値は最後のバケットに入り、分位点は最大値になる
+        histogram.add(10_000_000.0)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.percentile(99), 10_000_000.0)
+
+
+class LatencyTracerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _trace(self, tracer, entries):
+        trace = tracer.start_batch('a.log', read_at=_T)
+        tracer.add_events(trace, entries)
+        trace.mark('parse_start', _T + 0.0625)
+        trace.mark('parsed', _T + 0.125)
+        trace.mark('match_start', _T + 0.25)
+        trace.span('pool', 0.03125, 2)
+        trace.span('pool', 0.0625)
+        trace.mark('matched', _T + 0.5)
+        trace.mark('persist_start', _T + 0.5)
+        trace.mark('committed', _T + 1.0)
+        return trace
+
+    def test_finish_aggregates_batch_and_per_event_segments(self):
+        tracer = LatencyTracer(sample_rate=0)
+        # 書き出し時刻を持たないログは、発生時刻からの全体時間だけを数える
+        trace = self._trace(tracer, [_entry(1, _T - 1.0, _T - 0.5), _entry(2, _T - 0.25)])
+        tracer.finish(trace)
+
+        stats = tracer.get_stats()
+        self.assertEqual(stats['collect'], _summary(500.0, 1))
+        self.assertEqual(stats['poll'], _summary(500.0, 1))
+        # バッチ単位の区間はログの件数分として数える
+        self.assertEqual(stats['parse_queue'], _summary(62.5, 2))
+        self.assertEqual(stats['parse'], _summary(62.5, 2))
+        self.assertEqual(stats['match_queue'], _summary(125.0, 2))
+        self.assertEqual(stats['match'], _summary(250.0, 2))
+        self.assertEqual(stats['persist_queue'], _summary(0.0, 2))
+        self.assertEqual(stats['persist'], _summary(500.0, 2))
+        self.assertEqual((stats['pool']['count'], stats['pool']['mean_ms'], stats['pool']['max_ms']), (3, 41.67, 62.5))
+        self.assertEqual((stats['total']['count'], stats['total']['mean_ms'], stats['total']['max_ms']),
+                         (2, 1375.0, 1500.0))
+        self.assertEqual((tracer.batches, tracer.get_traces()), (1, []))
+
+    def test_marks_missing_from_a_batch_are_skipped(self):
+        tracer = LatencyTracer(sample_rate=0)
+        trace = tracer.start_batch('a.log', read_at=_T)
+        tracer.add_events(trace, [{'message': 'no timestamps'}])
+        trace.mark('parse_start', _T + 0.5)
+        tracer.finish(trace)
+        # 時刻の無いログは発生・書き出し・全体の区間に数えない
+        self.assertEqual(tracer.get_stats(), {'parse_queue': _summary(500.0, 1)})
+
+    def test_sampled_events_are_kept_and_appended_as_jsonl(self):
+        path = os.path.join(self.tmp_dir.name, 'traces.jsonl')
+        tracer = LatencyTracer(sample_rate=1.0, max_traces=2, trace_path=path)
+        entries = [_entry(1, _T - 1.0, _T - 0.5), _entry(2, _T - 0.25), _entry(3, _T - 1.0, _T - 0.5)]
+        tracer.finish(self._trace(tracer, entries))
+
+        with open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record['record_id'] for record in records], [1, 2, 3])
+        first = records[0]
+        self.assertEqual((first['source'], first['channel'], first['event_id']), ('a.log', 'Security', 4688))
+        self.assertEqual(first['segments_ms'], {
+            'collect': 500.0, 'poll': 500.0, 'parse_queue': 62.5, 'parse': 62.5, 'match_queue': 125.0,
+            'match': 250.0, 'persist_queue': 0.0, 'persist': 500.0, 'pool': 62.5, 'total': 1500.0,
+        })
+        self.assertEqual((first['stamps']['event'], first['stamps']['read'], first['stamps']['committed']),
+                         (_T - 1.0, _T, _T + 1.0))
+        self.assertNotIn('collect', records[1]['segments_ms'])
+        self.assertEqual(records[1]['segments_ms']['total'], 1250.0)
+
+        # 保持するのは新しいものから max_traces 件まで
+        self.assertEqual([record['record_id'] for record in tracer.get_traces()], [3, 2])
+        self.assertEqual([record['record_id'] for record in tracer.get_traces(limit=1)], [3])
+
+    def test_unsampled_batches_write_nothing(self):
+        path = os.path.join(self.tmp_dir.name, 'traces.jsonl')
+        tracer = LatencyTracer(sample_rate=0, trace_path=path)
+        tracer.finish(self._trace(tracer, [_entry(1, _T - 1.0, _T - 0.5)]))
+        self.assertEqual(tracer.get_traces(), [])
+        self.assertFalse(os.path.exists(path))
+
+    def test_trace_write_errors_are_logged(self):
+        tracer = LatencyTracer(sample_rate=1.0, trace_path=self.tmp_dir.name)
+        with self.assertLogs('service.workers.latency_tracer', level='ERROR'):
+            tracer.finish(self._trace(tracer, [_entry(1, _T - 1.0, _T - 0.5)]))
+        self.assertEqual(len(tracer.get_traces()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
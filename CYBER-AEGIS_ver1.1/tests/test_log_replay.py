@@ -0,0 +1,96 @@
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import unittest
+from unittest import mock
+
+from service.workers import log_monitor
+from service.workers.log_monitor import LogMonitorWorker
+from tests.db_support import TempDatabaseMixin
+from tests.test_sigma_analyzer import _write_rule
+
+_CONFIG = """
+[log_monitoring]
+rule_cache =
+rule_hot_reload = false
+latency_tracing = false
+suppression_window = 0
+writer_flush_ms = 20
+"""
+
+
+def _event(second, image):
+    return {'@timestamp': f'2024-01-01T00:00:{second:02d}Z', 'winlog': {'event_data': {'Image': image}}}
+
+
+class LogReplayTest(TempDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        with open('config.ini', 'a', encoding='utf-8') as f:
+            f.write(_CONFIG)
+        self.rule_dir = os.path.join(self.tmp_dir.name, 'rules')
+        os.mkdir(self.rule_dir)
+        _write_rule(self.rule_dir, 'whoami.yml', {'selection': {'Image|endswith': '\\whoami.exe'}, 'condition': 'selection'})
+        self.log_path = os.path.join(self.tmp_dir.name, 'events.log')
+        lines = [
+            json.dumps(_event(1, 'C:\\Windows\\System32\\whoami.exe')),
+            json.dumps(_event(2, 'C:\\Windows\\notepad.exe')),
+            'not json',
+            '[1, 2]',
+            json.dumps(_event(3, 'C:\\tools\\whoami.exe')),
+            json.dumps({'winlog': {'event_data': {'Image': 'C:\\no_time\\whoami.exe'}}}),
+        ]
+        with open(self.log_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def _images(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute("SELECT rule_title, log_entry FROM sigma_matches ORDER BY id").fetchall()
+        finally:
+            conn.close()
+        self.assertTrue(all(title == 'whoami.yml' for title, _ in rows))
+        return [json.loads(entry)['winlog']['event_data']['Image'] for _, entry in rows]
+
+    def _replay(self, **kwargs):
+        worker = LogMonitorWorker(self.log_path, self.rule_dir)
+        try:
+            return worker.replay([self.log_path], **kwargs)
+        finally:
+            worker.stop()
+
+    def test_replay_saves_matches_and_reports_counts(self):
+        stats = self._replay()
+        self.assertEqual({key: stats[key] for key in ('files', 'lines', 'events', 'filtered', 'matched_events', 'matches')},
+                         {'files': 1, 'lines': 6, 'events': 4, 'filtered': 0, 'matched_events': 3, 'matches': 3})
+        self.assertEqual(stats['end_offset'], os.path.getsize(self.log_path))
+        self.assertEqual(self._images(), ['C:\\Windows\\System32\\whoami.exe', 'C:\\tools\\whoami.exe',
+                                          'C:\\no_time\\whoami.exe'])
+
+    def test_time_range_and_offset(self):
+        # 時間範囲を指定すると、時刻を持たないログも対象外になる
+        stats = self._replay(since='2024-01-01T00:00:02Z', until='2024-01-01T00:00:10Z')
+        self.assertEqual((stats['events'], stats['filtered'], stats['matches']), (2, 2, 1))
+        self.assertEqual(self._images(), ['C:\\tools\\whoami.exe'])
+
+        # 行の途中から始めた場合は、その行の残りを読み飛ばす
+        stats = self._replay(offset=5)
+        self.assertEqual((stats['lines'], stats['events'], stats['matches']), (5, 3, 2))
+
+    def test_main_prints_the_summary(self):
+        argv = ['log_monitor.py', self.log_path, '--rules', self.rule_dir, '--since', '2024-01-01T00:00:00Z']
+        output = io.StringIO()
+        with mock.patch('sys.argv', argv), contextlib.redirect_stdout(output):
+            log_monitor.main()
+        text = output.getvalue()
+        summary = json.loads(text[text.rindex('\n{') + 1:])
+        self.assertEqual((summary['events'], summary['filtered'], summary['matches']), (3, 1, 2))
+        self.assertIn('Replayed 3 events from 1 sources', text)
+        self.assertEqual(len(self._images()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+import os
+import threading
+import tempfile
+import unittest
+
+from service.workers.log_tailer import LogTailer, MultiLogTailer
+
+
+class LogTailerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'app.log')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _append(self, text, path=None):
+        with open(path or self.path, 'a', encoding='utf-8', newline='') as f:
+            f.write(text)
+
+    def _read_all(self, tailer):
+        lines = []
+        while True:
+            batch = tailer.read_lines()
+            if not batch:
+                return lines
+            lines.extend(batch)
+
+    def test_existing_file_without_checkpoint_starts_at_end(self):
+        self._append('old 1\nold 2\n')
+        tailer = LogTailer(self.path, wakeup=threading.Event())
+        self.assertEqual(self._read_all(tailer), [])
+        self._append('new 1\n')
+        self.assertEqual(self._read_all(tailer), ['new 1'])
+        tailer.stop()
+
+    def test_file_created_after_start_is_read_from_the_beginning(self):
+        tailer = LogTailer(self.path, wakeup=threading.Event())
+        self.assertEqual(tailer.read_lines(), [])
+        self._append('first\nsecond\n')
+        self.assertEqual(self._read_all(tailer), ['first', 'second'])
+        tailer.stop()
+
+    def test_partial_line_is_held_until_newline(self):
+        tailer = LogTailer(self.path, position=(None, 0), wakeup=threading.Event())
+        self._append('complete\npart')
+        self.assertEqual(self._read_all(tailer), ['complete'])
+        self.assertEqual(tailer.position()[1], len('complete\n'))
+        self._append('ial\r\n')
+        self.assertEqual(self._read_all(tailer), ['partial'])
+        tailer.stop()
+
+    def test_resume_from_checkpoint(self):
+        self._append('a\nb\n')
+        tailer = LogTailer(self.path, position=(None, 0), wakeup=threading.Event())
+        self._read_all(tailer)
+        checkpoint = tailer.position()
+        tailer.stop()
+
+        self._append('c\n')
+        resumed = LogTailer(self.path, position=checkpoint, wakeup=threading.Event())
+        self.assertEqual(self._read_all(resumed), ['c'])
+        resumed.stop()
+
+    def test_rotation_drains_the_old_file_first(self):
+        self._append('a\n')
+        tailer = LogTailer(self.path, position=(None, 0), wakeup=threading.Event())
+        self.assertEqual(self._read_all(tailer), ['a'])
+        self._append('b\n')
+        os.rename(self.path, self.path + '.1')
+        self._append('c\n')
+        self.assertEqual(self._read_all(tailer), ['b', 'c'])
+        self.assertEqual(tailer.rotations, 1)
+        tailer.stop()
+
+    def test_rotation_while_stopped_drains_the_rotated_sibling(self):
+        self._append('a\n')
+        tailer = LogTailer(self.path, position=(None, 0), wakeup=threading.Event())
+        self._read_all(tailer)
+        checkpoint = tailer.position()
+        tailer.stop()
+
+        # 停止中に追記されてからローテーションされた
+        self._append('b\n')
+        os.rename(self.path, self.path + '.1')
+        self._append('c\n')
+        resumed = LogTailer(self.path, position=checkpoint, wakeup=threading.Event())
+        self.assertEqual(self._read_all(resumed), ['b', 'c'])
+        self.assertNotEqual(resumed.position()[0], checkpoint[0])
+        resumed.stop()
+
+    def test_truncation_restarts_from_the_beginning(self):
+        self._append('a long line\n')
+        tailer = LogTailer(self.path, position=(None, 0), wakeup=threading.Event())
+        self._read_all(tailer)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('x\n')
+        self.assertEqual(self._read_all(tailer), ['x'])
+        self.assertEqual(tailer.truncations, 1)
+        tailer.stop()
+
+
+class MultiLogTailerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pattern = os.path.join(self.tmp_dir.name, '*.log')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, name, text):
+        with open(os.path.join(self.tmp_dir.name, name), 'a', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_files_found_by_a_later_scan_are_read_from_the_beginning(self):
+        self._write('a.log', 'old\n')
+        tailer = MultiLogTailer([self.pattern], rescan_interval=0)
+        tailer.start()
+        try:
+            self.assertEqual(tailer.read_batches(), [])
+            self._write('b.log', 'b1\nb2\n')
+            self._write('a.log', 'a1\n')
+            batches = {os.path.basename(path): lines for path, lines, _ in tailer.read_batches()}
+            self.assertEqual(batches, {'a.log': ['a1'], 'b.log': ['b1', 'b2']})
+        finally:
+            tailer.stop()
+
+    def test_checkpoints_are_loaded_per_file(self):
+        self._write('a.log', 'a1\na2\n')
+        self._write('b.log', 'b1\n')
+        a_path = os.path.join(self.tmp_dir.name, 'a.log')
+        checkpoints = {a_path: (str(os.stat(a_path).st_ino), len('a1\n'))}
+        tailer = MultiLogTailer([self.pattern], checkpoint_loader=checkpoints.get)
+        tailer.start()
+        try:
+            batches = tailer.read_batches()
+            self.assertEqual([(os.path.basename(path), lines) for path, lines, _ in batches], [('a.log', ['a2'])])
+            self.assertEqual(batches[0][2][1], len('a1\na2\n'))
+        finally:
+            tailer.stop()
+
+
+    def test_glob_patterns_and_plain_paths_are_expanded(self):
+        os.mkdir(os.path.join(self.tmp_dir.name, 'dir.log'))
+        self._write('a.log', 'a\n')
+        self._write('b.log', 'b\n')
+        self._write('other.txt', 'x\n')
+        plain = os.path.join(self.tmp_dir.name, 'other.txt')
+        missing = os.path.join(self.tmp_dir.name, 'later.json')
+        tailer = MultiLogTailer([self.pattern, plain, missing])
+        tailer.start()
+        try:
+            # ディレクトリは除き、globでないパスは存在しなくても追跡する。既存のファイルは末尾から読む
+            self.assertEqual([os.path.basename(path) for path in tailer._order],
+                             ['a.log', 'b.log', 'other.txt', 'later.json'])
+            self.assertEqual(tailer.read_batches(), [])
+            self._write('later.json', 'first\n')
+            self.assertEqual([(os.path.basename(path), lines) for path, lines, _ in tailer.read_batches()],
+                             [('later.json', ['first'])])
+        finally:
+            tailer.stop()
+
+    def test_new_files_wait_for_the_rescan_interval(self):
+        tailer = MultiLogTailer([self.pattern], rescan_interval=3600)
+        tailer.start()
+        try:
+            self._write('late.log', 'l1\n')
+            self.assertEqual(tailer.read_batches(), [])
+            tailer.rescan_interval = 0
+            self.assertEqual([lines for _, lines, _ in tailer.read_batches()], [['l1']])
+        finally:
+            tailer.stop()
+
+    def test_each_file_gets_a_bounded_read_per_round(self):
+        self._write('a.log', '')
+        self._write('b.log', '')
+        tailer = MultiLogTailer([self.pattern], read_size=16, rescan_interval=3600)
+        tailer.start()
+        try:
+            self.assertEqual(tailer.read_batches(), [])
+            self._write('a.log', ''.join(f'a{i:03d}\n' for i in range(100)))
+            self._write('b.log', 'b1\nb2\n')
+            rounds = []
+            while True:
+                batches = tailer.read_batches()
+                if not batches:
+                    break
+                rounds.append([(os.path.basename(path), lines) for path, lines, _ in batches])
+            # 書き込みの多いa.logがあっても、b.logは最初の1巡で読まれる
+            self.assertEqual(rounds[0], [('b.log', ['b1', 'b2']), ('a.log', ['a000', 'a001', 'a002'])])
+            # 1巡で読むのは前回の読み残し+16バイトまでなので、5バイトの行は最大4行
+            self.assertTrue(all(len(lines) <= 4 for batches in rounds for _, lines in batches))
+            self.assertGreaterEqual(len(rounds), 100 * 5 // 16)
+            self.assertEqual([line for batches in rounds for _, lines in batches for line in lines],
+                             ['b1', 'b2'] + [f'a{i:03d}' for i in range(100)])
+        finally:
+            tailer.stop()
+
+    def test_each_round_starts_from_the_next_file(self):
+        self._write('a.log', '')
+        self._write('b.log', '')
+        tailer = MultiLogTailer([self.pattern], read_size=3, rescan_interval=3600)
+        tailer.start()
+        try:
+            # 最初の呼び出しでファイルを開いて末尾に移る。この巡はa.logから始まる
+            self.assertEqual(tailer.read_batches(), [])
+            self._write('a.log', 'a1\na2\n')
+            self._write('b.log', 'b1\nb2\n')
+            rounds = [[(os.path.basename(path), lines) for path, lines, _ in tailer.read_batches()] for _ in range(2)]
+            self.assertEqual(rounds, [[('b.log', ['b1']), ('a.log', ['a1'])], [('a.log', ['a2']), ('b.log', ['b2'])]])
+        finally:
+            tailer.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import unittest
+
+from service.workers.match_writer import SigmaMatchWriter
+from tests.db_support import TempDatabaseMixin
+
+_RULE = {'title': 'Whoami Execution', 'level': 'low', 'logsource': {'category': 'process_creation'}}
+
+
+def _matched(n, start=0):
+    return [({'winlog': {'record_id': start + i}}, [_RULE]) for i in range(n)]
+
+
+class SigmaMatchWriterTest(TempDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.writer = SigmaMatchWriter(flush_rows=1000, flush_interval_ms=50, verbose=False, max_retries=0)
+
+    def tearDown(self):
+        self.writer.stop()
+        super().tearDown()
+
+    def _query(self, sql):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+
+    def _checkpoints(self):
+        return dict((path, (inode, offset)) for path, inode, offset in
+                    self._query("SELECT path, inode, offset FROM log_checkpoints"))
+
+    def test_group_commit_writes_batches_and_checkpoint_together(self):
+        self.writer.start()
+        for i in range(10):
+            self.writer.submit(_matched(3, start=i * 3), position=('7', (i + 1) * 100), source='a.log')
+        self.assertTrue(self.writer.flush(timeout=10))
+
+        self.assertEqual(self._query("SELECT COUNT(*) FROM sigma_matches"), [(30,)])
+        self.assertEqual(self._checkpoints(), {'a.log': ('7', 1000)})
+        stats = self.writer.get_stats()
+        self.assertEqual(stats['rows_written'], 30)
+        # 10回の submit が少数のコミットにまとめられる
+        self.assertLess(stats['flushes'], 10)
+
+    def test_failed_batch_is_dropped_and_checkpoint_is_held(self):
+        self.writer.start()
+        self.writer.submit(_matched(1), position=('7', 100), source='a.log')
+        self.assertTrue(self.writer.flush(timeout=10))
+
+        self.db.conn.execute("ALTER TABLE sigma_matches RENAME TO sigma_matches_moved")
+        self.writer.submit(_matched(2), position=('7', 200), source='a.log')
+        self.assertTrue(self.writer.flush(timeout=10))
+        stats = self.writer.get_stats()
+        self.assertEqual((stats['dropped_entries'], stats['held_checkpoints']), (2, ['a.log']))
+
+        # 書き込めるようになっても、諦めたバッチのあるファイルのチェックポイントは進めない
+        self.db.conn.execute("ALTER TABLE sigma_matches_moved RENAME TO sigma_matches")
+        self.writer.submit(_matched(1), position=('7', 300), source='a.log')
+        self.writer.submit(_matched(1), position=('9', 50), source='b.log')
+        self.assertTrue(self.writer.flush(timeout=10))
+        self.assertEqual(self._checkpoints(), {'a.log': ('7', 100), 'b.log': ('9', 50)})
+        self.assertEqual(self._query("SELECT COUNT(*) FROM sigma_matches"), [(3,)])
+
+    def test_commit_failures_are_logged_without_writing_to_the_working_directory(self):
+        self.db.conn.execute("ALTER TABLE sigma_matches RENAME TO sigma_matches_moved")
+        with self.assertLogs('service.workers.match_writer', level='ERROR') as logs:
+            with self.assertRaises(Exception):
+                self.writer.write_now(_matched(1), position=('7', 100), source='a.log')
+        self.db.conn.execute("ALTER TABLE sigma_matches_moved RENAME TO sigma_matches")
+        self.assertIn('Failed to commit matches', logs.output[0])
+        self.assertIsNotNone(logs.records[0].exc_info)
+        self.assertFalse(os.path.exists('debug_db_errors.log'))
+        self.assertEqual(self.writer.get_stats()['failures'], 1)
+
+    def test_synchronous_pragma_is_set_once_per_connection(self):
+        self.writer.write_now(_matched(1), position=('7', 100), source='a.log')
+        dbapi_connection = self.writer._session.connection().connection.dbapi_connection
+        statements = []
+        dbapi_connection.set_trace_callback(statements.append)
+        for i in range(3):
+            self.writer.write_now(_matched(1, start=i + 1), position=('7', 200 + i), source='a.log')
+        self.assertTrue(any('INSERT INTO sigma_matches' in s for s in statements), statements)
+        self.assertFalse(any('PRAGMA synchronous' in s for s in statements), statements)
+        self.assertEqual(dbapi_connection.execute("PRAGMA synchronous").fetchone()[0], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
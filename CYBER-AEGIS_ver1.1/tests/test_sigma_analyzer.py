@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import yaml
+
+from src.threat_intel.sigma_analyzer import SigmaAnalyzer
+
+
+def _write_rule(rule_dir, name, detection, logsource=None):
+    rule = {'title': name, 'logsource': logsource or {'category': 'process_creation'}, 'detection': detection}
+    with open(os.path.join(rule_dir, name), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(rule, f)
+
+
+class SigmaAnalyzerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.rule_dir = self.tmp_dir.name
+        _write_rule(self.rule_dir, 'whoami.yml',
+                    {'selection': {'Image|endswith': '\\whoami.exe'}, 'condition': 'selection'})
+        _write_rule(self.rule_dir, 'no_parent.yml',
+                    {'filter': {'ParentImage|exists': True}, 'condition': 'not filter'})
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_non_mapping_entries_match_nothing(self):
+        analyzer = SigmaAnalyzer([self.rule_dir])
+        event = {'winlog': {'event_data': {'Image': 'C:\\Windows\\System32\\whoami.exe', 'ParentImage': 'x'}}}
+        results = analyzer.analyze_batch([[1, 2], 'text', None, 42, event])
+        self.assertEqual(results[:4], [[], [], [], []])
+        self.assertEqual([rule['title'] for rule in results[4]], ['whoami.yml'])
+
+        analyzer.set_profiling(True)
+        self.assertEqual(analyzer.analyze_log_entry(['not', 'a', 'mapping']), [])
+
+    def test_analyze_batch_matches_single_entry_analysis_in_order(self):
+        analyzer = SigmaAnalyzer([self.rule_dir])
+        entries = [
+            {'winlog': {'event_data': {'Image': 'C:\\Windows\\System32\\whoami.exe'}}},
+            {'winlog': {'event_data': {'Image': 'C:\\Windows\\notepad.exe', 'ParentImage': 'x'}}},
+            {'winlog': {'event_data': {'Image': 'C:\\tools\\whoami.exe', 'ParentImage': 'x'}}},
+        ]
+        batch = analyzer.analyze_batch(entries)
+        self.assertEqual(batch, [analyzer.analyze_log_entry(entry) for entry in entries])
+        self.assertEqual([[rule['title'] for rule in rules] for rules in batch],
+                         [['no_parent.yml', 'whoami.yml'], [], ['whoami.yml']])
+        ids = analyzer.analyze_batch_ids(entries)
+        self.assertEqual([[analyzer.rules_by_id[rule_id] for rule_id in rule_ids] for rule_ids in ids], batch)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from src.threat_intel.sigma_analyzer import SigmaAnalyzer
+from src.threat_intel.sigma_backtest import ColumnarChunk, SigmaBacktester, evaluate_node
+from src.threat_intel.sigma_compiler import MatchContext
+from src.threat_intel.sigma_normalizer import normalize_event
+from tests.test_sigma_analyzer import _write_rule
+
+_RULES = {
+    'contains.yml': {'selection': {'CommandLine|contains': ['-enc', 'bypass', 'iex']}, 'condition': 'selection'},
+    'contains_all.yml': {'selection': {'CommandLine|contains|all': ['-nop', 'hidden']}, 'condition': 'selection'},
+    'startswith.yml': {'selection': {'CommandLine|startswith': 'powershell'}, 'condition': 'selection'},
+    'endswith.yml': {'selection': {'Image|endswith': ['\\powershell.exe', '\\cmd.exe']},
+                     'filter': {'ParentImage|endswith': '\\explorer.exe'}, 'condition': 'selection and not filter'},
+    'wildcard.yml': {'selection': {'CommandLine': '*\\temp\\run*.ps1*'}, 'condition': 'selection'},
+    'equals.yml': {'selection': {'User': ['NT AUTHORITY\\SYSTEM', 'admin']}, 'condition': 'selection'},
+    'regex.yml': {'selection': {'CommandLine|re': r'\s-e(nc)?\s+[A-Za-z0-9+/=]{8,}'}, 'condition': 'selection'},
+    'exists.yml': {'selection': {'ParentImage|exists': False, 'Image|endswith': '.exe'}, 'condition': 'selection'},
+    'null.yml': {'selection': {'User': None}, 'condition': 'selection'},
+    'keywords.yml': {'keywords': ['mimikatz', 'sekurlsa'], 'condition': 'keywords'},
+    'one_of.yml': {'sel_a': {'Hashes|contains': 'MD5=0000'}, 'sel_b': {'Image|contains': 'tools'},
+                   'condition': '1 of sel_*'},
+}
+
+_IMAGES = ['C:\\Windows\\System32\\cmd.exe', 'C:\\Windows\\System32\\WindowsPowerShell\\v1.0\\powershell.exe',
+           'C:\\tools\\mimikatz.exe', 'C:\\Windows\\notepad.exe', 'C:\\Users\\a\\AppData\\Local\\Temp\\x.bin']
+_PARENTS = ['C:\\Windows\\explorer.exe', 'C:\\Windows\\System32\\services.exe', None]
+_COMMAND_LINES = ['powershell -nop -w hidden -enc SQBFAFgAIAAoAE4A', 'cmd /c whoami',
+                  'PowerShell -ExecutionPolicy Bypass', 'powershell -e QUFBQUFBQUFB', 'c:\\users\\a\\temp\\run.ps1 -x', 'notepad.exe readme.txt',
+                  'iex (new-object net.webclient)', 'sekurlsa::logonpasswords', '']
+_USERS = ['NT AUTHORITY\\SYSTEM', 'ADMIN', 'user', None]
+
+
+def _events(count, seed=7):
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        event_data = {'Image': rng.choice(_IMAGES), 'CommandLine': rng.choice(_COMMAND_LINES)}
+        parent = rng.choice(_PARENTS)
+        if parent is not None:
+            event_data['ParentImage'] = parent
+        user = rng.choice(_USERS)
+        if user is not None:
+            event_data['User'] = user
+        if i % 7 == 0:
+            event_data['Hashes'] = ['SHA1=1234', 'MD5=0000AAAA'] if i % 2 else ['MD5=FFFF']
+        if i % 11 == 0:
+            del event_data['Image']
+        events.append({'winlog': {'channel': 'Microsoft-Windows-Sysmon/Operational', 'event_data': event_data}})
+    return events
+
+
+class SigmaBacktesterTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        for name, detection in _RULES.items():
+            _write_rule(cls.tmp_dir.name, name, detection)
+        cls.analyzer = SigmaAnalyzer([cls.tmp_dir.name])
+        cls.events = _events(5000)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_columnar_masks_equal_per_event_evaluation(self):
+        self.assertEqual(len(self.analyzer.compiled_rules), len(_RULES))
+        normalized = [normalize_event(event) for event in self.events]
+        for literal_index in (None, self.analyzer.literal_index):
+            chunk = ColumnarChunk([event.fields for event in normalized], literal_index)
+            for compiled in self.analyzer.compiled_rules:
+                with self.subTest(rule=os.path.basename(compiled.rule_id), literal_index=literal_index is not None):
+                    expected = [compiled.matches(MatchContext(event, literal_index)) for event in normalized]
+                    self.assertEqual(evaluate_node(compiled.condition, chunk).tolist(), expected)
+
+    def test_hit_counts_equal_the_analyzer(self):
+        log_path = os.path.join(self.tmp_dir.name, 'events.jsonl')
+        with open(log_path, 'w', encoding='utf-8') as f:
+            for event in self.events:
+                f.write(json.dumps(event) + '\n')
+            f.write('not json\n[1, 2]\n')
+        expected = {}
+        for matches in self.analyzer.analyze_batch(self.events):
+            for rule in matches:
+                expected[rule['title']] = expected.get(rule['title'], 0) + 1
+
+        backtester = SigmaBacktester(self.analyzer.compiled_rules, self.analyzer.literal_index)
+        report = backtester.run([log_path], chunk_size=1500).report()
+        self.assertEqual((report['events'], report['skipped_lines']), (5000, 2))
+        self.assertEqual({rule['title']: rule['hits'] for rule in report['rules']}, expected)
+        # 全ルールがどこかで成立するデータにして、比較が空にならないようにする
+        self.assertEqual(len(expected), len(_RULES))
+
+
+if __name__ == '__main__':
+    unittest.main()
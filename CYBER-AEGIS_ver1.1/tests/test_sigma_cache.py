@@ -0,0 +1,94 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from src.threat_intel.sigma_cache import CACHE_VERSION, SigmaRuleCache
+from tests.test_sigma_analyzer import _write_rule
+
+_WHOAMI = {'selection': {'Image|endswith': '\\whoami.exe'}, 'condition': 'selection'}
+_NET = {'selection': {'Image|endswith': '\\net.exe'}, 'condition': 'selection'}
+
+
+class SigmaRuleCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.rule_dir = os.path.join(self.tmp_dir.name, 'rules')
+        os.mkdir(self.rule_dir)
+        self.cache_path = os.path.join(self.tmp_dir.name, 'cache', 'ruleset.pickle')
+        _write_rule(self.rule_dir, 'whoami.yml', _WHOAMI)
+        _write_rule(self.rule_dir, 'net.yml', _NET)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.rule_dir, name)
+
+    def _built_cache(self):
+        cache = SigmaRuleCache(self.cache_path)
+        cache.refresh([self.rule_dir])
+        cache.literal_index()
+        cache.save()
+        return cache
+
+    def test_refresh_reports_added_changed_and_removed_files(self):
+        cache = SigmaRuleCache()
+        changes = cache.refresh([self.rule_dir])
+        self.assertEqual(changes, {'added': [self._path('net.yml'), self._path('whoami.yml')], 'changed': [], 'removed': []})
+
+        _write_rule(self.rule_dir, 'net.yml', {'selection': {'Image|endswith': '\\net1.exe'}, 'condition': 'selection'})
+        os.remove(self._path('whoami.yml'))
+        _write_rule(self.rule_dir, 'new.yml', _WHOAMI)
+        changes = cache.refresh([self.rule_dir])
+        self.assertEqual(changes, {'added': [self._path('new.yml')], 'changed': [self._path('net.yml')],
+                                   'removed': [self._path('whoami.yml')]})
+        self.assertEqual(len(cache.compiled_rules()), 2)
+
+    def test_touched_file_with_same_content_is_not_reparsed(self):
+        cache = SigmaRuleCache()
+        cache.refresh([self.rule_dir])
+        compiled = cache.compiled_rules()
+        stat = os.stat(self._path('net.yml'))
+        os.utime(self._path('net.yml'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(cache.refresh([self.rule_dir]), {'added': [], 'changed': [], 'removed': []})
+        self.assertIs(cache.compiled_rules()[0], compiled[0])
+
+    def test_saved_cache_is_reused_by_a_new_instance(self):
+        built = self._built_cache()
+        loaded = SigmaRuleCache(self.cache_path)
+        self.assertEqual(set(loaded.entries), set(built.entries))
+        self.assertEqual(loaded.refresh([self.rule_dir]), {'added': [], 'changed': [], 'removed': []})
+        self.assertIsNotNone(loaded._literal_index)
+        index = loaded.literal_index()
+        self.assertIs(loaded.literal_index(), index)
+        self.assertEqual([c.rule_id for c in loaded.compiled_rules()], [c.rule_id for c in built.compiled_rules()])
+
+    def test_rule_change_rebuilds_the_literal_index(self):
+        cache = self._built_cache()
+        index = cache.literal_index()
+        _write_rule(self.rule_dir, 'net.yml', {'selection': {'CommandLine|contains': 'user /add'}, 'condition': 'selection'})
+        cache.refresh([self.rule_dir])
+        self.assertIsNot(cache.literal_index(), index)
+
+    def test_version_mismatch_and_corrupt_cache_are_rebuilt(self):
+        self._built_cache()
+        with open(self.cache_path, 'rb') as f:
+            data = pickle.load(f)
+        data['version'] = CACHE_VERSION - 1
+        with open(self.cache_path, 'wb') as f:
+            pickle.dump(data, f)
+        self.assertEqual(SigmaRuleCache(self.cache_path).entries, {})
+
+        with open(self.cache_path, 'wb') as f:
+            f.write(b'not a pickle')
+        cache = SigmaRuleCache(self.cache_path)
+        self.assertEqual(cache.entries, {})
+        self.assertEqual(len(cache.refresh([self.rule_dir])['added']), 2)
+        cache.save()
+        self.assertEqual(len(SigmaRuleCache(self.cache_path).entries), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import base64
+import os
+import tempfile
+import unittest
+
+import yaml
+
+from src.threat_intel.sigma_cache import SigmaRuleCache
+from src.threat_intel.sigma_compiler import MatchContext, SigmaCompileError, compile_rule, split_wildcards
+from src.threat_intel.sigma_index import SigmaLiteralIndex, SigmaRuleIndex
+from src.threat_intel.sigma_normalizer import normalize_event
+
+
+def _rule(detection, title='test rule'):
+    return {'title': title, 'logsource': {'category': 'process_creation'}, 'detection': detection}
+
+
+def _event(**event_data):
+    return {'winlog': {'channel': 'Microsoft-Windows-Sysmon/Operational', 'event_id': 1, 'event_data': event_data}}
+
+
+class SigmaCompilerTest(unittest.TestCase):
+
+    def assertMatches(self, detection, event, expected):
+        """リテラル索引を使う経路と使わない経路の両方で同じ結果になることを確かめる"""
+        compiled = compile_rule(_rule(detection))
+        normalized = normalize_event(event)
+        literal_index = SigmaLiteralIndex([compiled])
+        for index in (None, literal_index):
+            with self.subTest(literal_index=index is not None):
+                self.assertEqual(compiled.matches(MatchContext(normalized, index)), expected)
+
+    def test_contains_all_requires_every_value(self):
+        detection = {'selection': {'CommandLine|contains|all': ['-enc', 'hidden']}, 'condition': 'selection'}
+        self.assertMatches(detection, _event(CommandLine='powershell -enc AAAA -w hidden'), True)
+        self.assertMatches(detection, _event(CommandLine='powershell -enc AAAA'), False)
+        self.assertMatches(detection, _event(CommandLine='powershell -w hidden'), False)
+
+    def test_modifier_chain_keeps_every_modifier(self):
+        detection = {'selection': {'CommandLine|contains|all|windash': ['-s', '-d']}, 'condition': 'selection'}
+        self.assertMatches(detection, _event(CommandLine='dir /s /d'), True)
+        self.assertMatches(detection, _event(CommandLine='dir \u2013s -d'), True)
+        self.assertMatches(detection, _event(CommandLine='dir /s'), False)
+
+    def test_default_modifier_is_equality_with_wildcards(self):
+        detection = {'selection': {'Image': ['C:\\Windows\\System32\\cmd.exe', '*\\rundll32.exe']},
+                     'condition': 'selection'}
+        self.assertMatches(detection, _event(Image='c:\\windows\\system32\\CMD.EXE'), True)
+        self.assertMatches(detection, _event(Image='C:\\Temp\\rundll32.exe'), True)
+        self.assertMatches(detection, _event(Image='C:\\Windows\\System32\\cmd.exe.bak'), False)
+
+    def test_escaped_backslash_and_wildcards(self):
+        self.assertEqual(split_wildcards('\\\\Device\\*\\?x*'), [('literal', '\\Device*?x'), ('*', '*')])
+        detection = {'selection': {'FileName|startswith': '\\\\'}, 'condition': 'selection'}
+        self.assertMatches(detection, _event(FileName='\\pipe\\x'), True)
+        self.assertMatches(detection, _event(FileName='pipe'), False)
+
+    def test_null_matches_missing_or_empty_field(self):
+        detection = {'selection': {'Image|endswith': '\\cmd.exe'}, 'filter': {'ParentImage': None},
+                     'condition': 'selection and not filter'}
+        self.assertMatches(detection, _event(Image='C:\\cmd.exe', ParentImage='C:\\explorer.exe'), True)
+        self.assertMatches(detection, _event(Image='C:\\cmd.exe'), False)
+        self.assertMatches(detection, _event(Image='C:\\cmd.exe', ParentImage=''), False)
+        # 文字列の 'none' はnullではない
+        self.assertMatches(detection, _event(Image='C:\\cmd.exe', ParentImage='none'), True)
+
+    def test_exists_modifier(self):
+        detection = {'selection': {'OriginalFileName|exists': False}, 'condition': 'selection'}
+        self.assertMatches(detection, _event(Image='a.exe'), True)
+        self.assertMatches(detection, _event(Image='a.exe', OriginalFileName='a.exe'), False)
+        self.assertIsNone(compile_rule(_rule(detection)).required_keys())
+
+    def test_keyword_selection(self):
+        detection = {'keywords': ['mimikatz', 'sekurlsa::'], 'condition': 'keywords'}
+        self.assertMatches(detection, _event(CommandLine='x.exe sekurlsa::logonpasswords'), True)
+        self.assertMatches(detection, _event(CommandLine='whoami'), False)
+        self.assertIsNone(compile_rule(_rule(detection)).required_keys())
+
+    def test_base64offset_contains(self):
+        encoded = base64.b64encode(b'xx http://evil.example/payload').decode('ascii')
+        detection = {'selection': {'CommandLine|base64offset|contains': 'http://'}, 'condition': 'selection'}
+        self.assertMatches(detection, _event(CommandLine=f'powershell -enc {encoded}'), True)
+        self.assertMatches(detection, _event(CommandLine='powershell -enc AAAA'), False)
+
+    def test_cidr_numeric_and_regex_modifiers(self):
+        self.assertMatches({'selection': {'DestinationIp|cidr': '10.0.0.0/8'}, 'condition': 'selection'},
+                           _event(DestinationIp='10.1.2.3'), True)
+        self.assertMatches({'selection': {'DestinationIp|cidr': '10.0.0.0/8'}, 'condition': 'selection'},
+                           _event(DestinationIp='192.168.0.1'), False)
+        self.assertMatches({'selection': {'DestinationPort|gte': 1024}, 'condition': 'selection'},
+                           _event(DestinationPort='8080'), True)
+        self.assertMatches({'selection': {'DestinationPort|lt': 1024}, 'condition': 'selection'},
+                           _event(DestinationPort='8080'), False)
+        self.assertMatches({'selection': {'CommandLine|re': r'-e(nc)?\s'}, 'condition': 'selection'},
+                           _event(CommandLine='powershell -E AAAA'), True)
+
+    def test_unsupported_modifier_is_a_compile_error(self):
+        for key in ('TargetFilename|fieldref', 'Image|expand', 'Image|contains|cased', 'Image|contains|endswith'):
+            with self.subTest(key=key):
+                with self.assertRaises(SigmaCompileError):
+                    compile_rule(_rule({'selection': {key: 'x'}, 'condition': 'selection'}))
+
+    def test_unsupported_rule_is_skipped_and_counted(self):
+        with tempfile.TemporaryDirectory() as rule_dir:
+            for name, detection in (
+                ('ok.yml', {'selection': {'Image|endswith': '\\a.exe'}, 'condition': 'selection'}),
+                ('fieldref.yml', {'selection': {'TargetFilename|fieldref': 'Image'}, 'condition': 'selection'}),
+            ):
+                with open(os.path.join(rule_dir, name), 'w', encoding='utf-8') as f:
+                    yaml.safe_dump(_rule(detection, title=name), f)
+            cache = SigmaRuleCache()
+            cache.refresh([rule_dir])
+        self.assertEqual([c.rule['title'] for c in cache.compiled_rules()], ['ok.yml'])
+        self.assertEqual(cache.skipped_count(), 1)
+
+
+class ConditionParserTest(unittest.TestCase):
+
+    def _matches(self, detection, event):
+        return compile_rule(_rule(detection)).matches(MatchContext(normalize_event(event)))
+
+    def test_quantifier_over_wildcard_names(self):
+        detection = {
+            'selection_img': {'Image|endswith': '\\certutil.exe'},
+            'selection_cli': {'CommandLine|contains': 'urlcache'},
+            'filter': {'User|contains': 'SYSTEM'},
+            'condition': '1 of selection_* and not filter',
+        }
+        self.assertTrue(self._matches(detection, _event(Image='C:\\certutil.exe', User='alice')))
+        self.assertTrue(self._matches(detection, _event(CommandLine='x -urlcache', User='alice')))
+        self.assertFalse(self._matches(detection, _event(Image='C:\\certutil.exe', User='NT AUTHORITY\\SYSTEM')))
+        detection['condition'] = 'all of selection_*'
+        self.assertFalse(self._matches(detection, _event(Image='C:\\certutil.exe')))
+        self.assertTrue(self._matches(detection, _event(Image='C:\\certutil.exe', CommandLine='-urlcache')))
+
+    def test_all_of_them_skips_underscore_selections(self):
+        detection = {'selection': {'Image|endswith': '\\a.exe'}, '_helper': {'Image|endswith': '\\b.exe'},
+                     'condition': 'all of them'}
+        self.assertTrue(self._matches(detection, _event(Image='C:\\a.exe')))
+
+    def test_precedence_not_and_or(self):
+        detection = {
+            'a': {'Image|endswith': '\\a.exe'},
+            'b': {'User': 'alice'},
+            'c': {'User': 'bob'},
+            'condition': 'a and not b or c',
+        }
+        self.assertTrue(self._matches(detection, _event(Image='C:\\a.exe', User='carol')))
+        self.assertFalse(self._matches(detection, _event(Image='C:\\a.exe', User='alice')))
+        self.assertTrue(self._matches(detection, _event(Image='C:\\x.exe', User='bob')))
+
+    def test_not_only_rule_is_always_a_candidate(self):
+        detection = {'filter': {'Image|endswith': '\\explorer.exe'}, 'condition': 'not filter'}
+        compiled = compile_rule(_rule(detection))
+        self.assertIsNone(compiled.required_keys())
+        index = SigmaRuleIndex([compiled])
+        event = normalize_event({'winlog': {'channel': 'Security', 'event_id': 4624}})
+        self.assertEqual(index.candidates(event.fields), [compiled])
+        self.assertTrue(compiled.matches(MatchContext(event)))
+
+    def test_invalid_conditions(self):
+        for condition in ('selection and', '(selection', 'unknown', 'selection | count() > 5'):
+            with self.subTest(condition=condition):
+                with self.assertRaises(SigmaCompileError):
+                    compile_rule(_rule({'selection': {'Image': 'x'}, 'condition': condition}))
+
+
+if __name__ == '__main__':
+    unittest.main()
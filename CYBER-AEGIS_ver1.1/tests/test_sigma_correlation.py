@@ -0,0 +1,156 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from src.threat_intel.sigma_analyzer import SigmaAnalyzer
+from src.threat_intel.sigma_compiler import SigmaCompileError
+from src.threat_intel.sigma_correlation import CorrelationRule, SigmaCorrelationEngine, parse_timespan
+
+_BASE = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+_FAILED_LOGON = {'name': 'failed_logon', 'title': 'Failed Logon'}
+
+
+def _correlation(correlation_type='event_count', condition=None, timespan='5m'):
+    return {
+        'title': 'Brute Force',
+        'level': 'high',
+        'correlation': {
+            'type': correlation_type,
+            'rules': ['failed_logon'],
+            'group-by': ['TargetUserName'],
+            'timespan': timespan,
+            'condition': condition or {'gte': 3},
+        },
+    }
+
+
+def _logon(seconds, user='alice', ip='10.0.0.1'):
+    return {
+        '@timestamp': (_BASE + datetime.timedelta(seconds=seconds)).isoformat(),
+        'winlog': {'event_data': {'TargetUserName': user, 'IpAddress': ip}},
+    }
+
+
+class CorrelationRuleTest(unittest.TestCase):
+
+    def test_timespan_and_condition_are_parsed(self):
+        self.assertEqual(parse_timespan('90s'), 90)
+        self.assertEqual(parse_timespan('2h'), 7200)
+        rule = CorrelationRule(_correlation(condition={'gt': 4}))
+        self.assertEqual((rule.timespan, rule.threshold), (300, 5))
+        self.assertEqual(rule.group_keys, (('targetusername',),))
+
+    def test_unsupported_definitions_are_rejected(self):
+        for bad in (_correlation('temporal'), _correlation(condition={'lte': 3}),
+                    _correlation('value_count'), _correlation(timespan='soon')):
+            with self.subTest(correlation=bad['correlation']):
+                with self.assertRaises(SigmaCompileError):
+                    CorrelationRule(bad)
+
+
+class SigmaCorrelationEngineTest(unittest.TestCase):
+
+    def _engine(self, rule):
+        return SigmaCorrelationEngine([('brute_force.yml', rule)])
+
+    def _feed(self, engine, events):
+        return [engine.process(event, [_FAILED_LOGON]) for event in events]
+
+    def test_event_count_fires_once_per_window_and_group(self):
+        engine = self._engine(_correlation())
+        results = self._feed(engine, [_logon(0), _logon(60), _logon(90, user='bob'), _logon(120), _logon(130)])
+        self.assertEqual([len(r) for r in results], [0, 0, 0, 1, 0])
+        alert = results[3][0]
+        self.assertEqual((alert['title'], alert['level']), ('Brute Force', 'high'))
+        self.assertEqual(alert['detection']['group'], {'TargetUserName': 'alice'})
+        self.assertEqual(alert['detection']['count'], 3)
+        self.assertEqual(engine.get_stats()['groups'], 2)
+
+    def test_events_outside_the_timespan_do_not_count(self):
+        engine = self._engine(_correlation())
+        results = self._feed(engine, [_logon(0), _logon(200), _logon(400), _logon(600)])
+        self.assertEqual([len(r) for r in results], [0, 0, 0, 0])
+
+    def test_late_events_are_dropped(self):
+        engine = self._engine(_correlation())
+        self._feed(engine, [_logon(1000), _logon(0)])
+        self.assertEqual(engine.get_stats()['late_events'], 1)
+
+    def test_value_count_counts_distinct_values(self):
+        engine = self._engine(_correlation('value_count', {'gte': 3, 'field': 'IpAddress'}))
+        same_ip = self._feed(engine, [_logon(i * 10) for i in range(5)])
+        self.assertEqual(sum(len(r) for r in same_ip), 0)
+        distinct = self._feed(engine, [_logon(60, ip='10.0.0.2'), _logon(70, ip='10.0.0.3')])
+        self.assertEqual([len(r) for r in distinct], [0, 1])
+        self.assertEqual(distinct[1][0]['detection']['count'], 3)
+
+    def test_unrelated_matches_are_ignored(self):
+        engine = self._engine(_correlation())
+        for i in range(5):
+            self.assertEqual(engine.process(_logon(i), [{'name': 'other', 'title': 'Other'}]), [])
+        self.assertEqual(engine.get_stats()['groups'], 0)
+
+    def test_reload_keeps_state_of_unchanged_rules(self):
+        rule = _correlation()
+        engine = self._engine(rule)
+        self._feed(engine, [_logon(0), _logon(60)])
+        engine.load([('brute_force.yml', _correlation())])
+        self.assertEqual([len(r) for r in self._feed(engine, [_logon(120)])], [1])
+
+
+_MULTI_DOCUMENT_RULE = """\
+title: Brute Force
+level: high
+correlation:
+  type: event_count
+  rules:
+    - failed_logon
+  group-by:
+    - TargetUserName
+  timespan: 5m
+  condition:
+    gte: 3
+---
+title: Failed Logon
+name: failed_logon
+logsource:
+  product: windows
+  service: security
+detection:
+  selection:
+    EventID: 4625
+  condition: selection
+"""
+
+
+class MultiDocumentRuleFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.rule_dir = self.tmp_dir.name
+        with open(os.path.join(self.rule_dir, 'brute_force.yml'), 'w', encoding='utf-8') as f:
+            f.write(_MULTI_DOCUMENT_RULE)
+        with open(os.path.join(self.rule_dir, 'broken.yml'), 'w', encoding='utf-8') as f:
+            f.write("title: Broken\ndetection: [unclosed\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_correlation_and_base_rules_load_from_one_file(self):
+        analyzer = SigmaAnalyzer([self.rule_dir])
+        base_path = os.path.join(self.rule_dir, 'brute_force.yml')
+        self.assertEqual([rule_id for rule_id, _ in analyzer.ruleset.correlation_rules], [f'{base_path}#0'])
+        self.assertEqual([c.rule_id for c in analyzer.compiled_rules], [f'{base_path}#1'])
+
+        engine = SigmaCorrelationEngine(analyzer.ruleset.correlation_rules)
+        alerts = []
+        for i in range(3):
+            event = _logon(i * 30)
+            event['winlog']['event_id'] = 4625
+            alerts.extend(engine.process(event, analyzer.analyze_log_entry(event)))
+        self.assertEqual([alert['title'] for alert in alerts], ['Brute Force'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+
+from src.threat_intel.sigma_compiler import MatchContext, compile_rule
+from src.threat_intel.sigma_index import SigmaLiteralIndex, SigmaRuleIndex
+from src.threat_intel.sigma_normalizer import normalize_event
+
+
+def _compile(title, detection, logsource=None):
+    rule = {'title': title, 'logsource': logsource or {'category': 'process_creation'}, 'detection': detection}
+    return compile_rule(rule, rule_id=title)
+
+
+def _fields(channel='Microsoft-Windows-Sysmon/Operational', **event_data):
+    return normalize_event({'winlog': {'channel': channel, 'event_data': event_data}}).fields
+
+
+class SigmaRuleIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = [
+            _compile('image', {'selection': {'Image|endswith': '\\cmd.exe'}, 'condition': 'selection'}),
+            _compile('image_or_parent', {'a': {'Image': 'x'}, 'b': {'ParentImage': 'y'}, 'condition': 'a or b'}),
+            _compile('image_and_cmd', {'a': {'Image': 'x'}, 'b': {'CommandLine|contains': 'z'}, 'condition': 'a and b'}),
+            _compile('not_only', {'filter': {'User': 'SYSTEM'}, 'condition': 'not filter'}),
+            _compile('script', {'selection': {'ScriptBlockText|contains': 'Invoke-'}, 'condition': 'selection'},
+                     logsource={'product': 'windows', 'category': 'ps_script'}),
+        ]
+
+    def _titles(self, index, fields):
+        return [compiled.rule_id for compiled in index.candidates(fields)]
+
+    def test_candidates_follow_required_fields_in_rule_order(self):
+        index = SigmaRuleIndex(self.rules)
+        self.assertEqual(self._titles(index, _fields(Image='a')), ['image', 'image_or_parent', 'image_and_cmd', 'not_only'])
+        self.assertEqual(self._titles(index, _fields(ParentImage='a')), ['image_or_parent', 'not_only'])
+        # and の条件は Image が無ければ成立しないため、CommandLineだけのログでは候補にならない
+        self.assertEqual(self._titles(index, _fields(CommandLine='a')), ['not_only'])
+        self.assertEqual(self._titles(index, _fields(Other='a')), ['not_only'])
+
+    def test_logsource_filter_excludes_rules_for_other_channels(self):
+        index = SigmaRuleIndex(self.rules, logsource_filter=True)
+        sysmon = _fields(Image='a', ScriptBlockText='b')
+        self.assertEqual(self._titles(index, sysmon), ['image', 'image_or_parent', 'image_and_cmd', 'not_only'])
+        powershell = _fields(channel='Microsoft-Windows-PowerShell/Operational', Image='a', ScriptBlockText='b')
+        self.assertEqual(self._titles(index, powershell), ['script'])
+        # channel が無いログは絞り込まない
+        self.assertIn('script', self._titles(index, _fields(channel=None, ScriptBlockText='b')))
+
+    def test_index_never_drops_a_matching_rule(self):
+        index = SigmaRuleIndex(self.rules)
+        events = [
+            {'Image': 'x'}, {'ParentImage': 'y'}, {'Image': 'x', 'CommandLine': 'z'},
+            {'User': 'SYSTEM'}, {'ScriptBlockText': 'Invoke-Mimikatz'}, {'Image': 'C:\\cmd.exe'},
+        ]
+        for event_data in events:
+            with self.subTest(event=event_data):
+                event = normalize_event({'winlog': {'event_data': event_data}})
+                expected = [c.rule_id for c in self.rules if c.matches(MatchContext(event))]
+                candidates = index.candidates(event.fields)
+                self.assertEqual([c.rule_id for c in candidates if c.matches(MatchContext(event))], expected)
+
+    def test_stats_report_selectivity(self):
+        index = SigmaRuleIndex(self.rules)
+        index.candidates(_fields(Other='a'))
+        index.record(1, 3)
+        stats = index.get_stats()
+        self.assertEqual((stats['rules'], stats['unconstrained_rules'], stats['events']), (5, 1, 2))
+        self.assertEqual(stats['avg_candidates_per_event'], 2.0)
+
+
+class SigmaLiteralIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = [
+            _compile('contains', {'selection': {'CommandLine|contains': ['-enc', 'bypass']}, 'condition': 'selection'}),
+            _compile('startswith', {'selection': {'CommandLine|startswith': 'powershell'}, 'condition': 'selection'}),
+            _compile('endswith', {'selection': {'Image|endswith': ['\\powershell.exe', '.ps1']}, 'condition': 'selection'}),
+            _compile('mixed', {'selection': {'CommandLine|endswith': '-enc', 'Image|contains': 'shell'},
+                               'condition': 'selection'}),
+        ]
+        self.index = SigmaLiteralIndex(self.rules)
+
+    def test_scan_reports_position_aware_hits(self):
+        hits = self.index.scan('commandline', ['powershell -nop -enc aaaa'])
+        self.assertEqual(hits, {('contains', '-enc'), ('startswith', 'powershell')})
+        hits = self.index.scan('commandline', ['cmd /c x -enc'])
+        self.assertEqual(hits, {('contains', '-enc'), ('endswith', '-enc')})
+        self.assertEqual(self.index.scan('image', ['c:\\tools\\a.ps1x']), frozenset())
+        self.assertEqual(self.index.scan('unknown', ['x']), frozenset())
+        self.assertEqual(self.index.scan('commandline', None), frozenset())
+
+    def test_indexed_evaluation_agrees_with_direct_evaluation(self):
+        samples = [
+            {'CommandLine': 'powershell -enc AAAA', 'Image': 'C:\\Windows\\powershell.exe'},
+            {'CommandLine': 'cmd /c run.ps1 -ENC', 'Image': 'C:\\x\\run.ps1'},
+            {'CommandLine': 'PowerShell -ExecutionPolicy Bypass', 'Image': 'C:\\pwsh.exe'},
+            {'CommandLine': 'notepad', 'Image': 'C:\\Windows\\notepad.exe'},
+            {'Image': 'C:\\shell\\tool.exe'},
+        ]
+        for event_data in samples:
+            event = normalize_event({'winlog': {'event_data': event_data}})
+            for compiled in self.rules:
+                with self.subTest(event=event_data, rule=compiled.rule_id):
+                    self.assertEqual(compiled.matches(MatchContext(event, self.index)),
+                                     compiled.matches(MatchContext(event)))
+
+    def test_unchanged_automata_are_reused(self):
+        rules = self.rules + [_compile('other', {'selection': {'ParentImage|contains': 'x'}, 'condition': 'selection'})]
+        rebuilt = SigmaLiteralIndex(rules, previous=self.index)
+        self.assertIs(rebuilt.automata['commandline'], self.index.automata['commandline'])
+        self.assertIn('parentimage', rebuilt.automata)
+        changed = SigmaLiteralIndex(self.rules[:1], previous=self.index)
+        self.assertIsNot(changed.automata['commandline'], self.index.automata['commandline'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+
+from src.threat_intel.sigma_analyzer import SigmaAnalyzer
+from src.threat_intel.sigma_normalizer import FIELD_ALIASES, canonical_field, flatten_dict, lookup_keys, normalize_event
+from tests.test_sigma_analyzer import _write_rule
+
+
+def _security_4688(**event_data):
+    return {
+        '@timestamp': '2024-01-01T00:00:00Z',
+        'winlog': {
+            'channel': 'Security', 'event_id': 4688, 'record_id': 42, 'computer_name': 'HOST-A',
+            'event_data': dict({'NewProcessName': 'C:\\Windows\\System32\\WHOAMI.EXE',
+                                'ParentProcessName': 'C:\\Windows\\explorer.exe',
+                                'NewProcessId': '0x1a4', 'CreatorProcessId': '0x10'}, **event_data),
+        },
+    }
+
+
+class CanonicalFieldTest(unittest.TestCase):
+
+    def test_aliases_and_prefixes_map_to_sigma_names(self):
+        for name, canonical in FIELD_ALIASES.items():
+            with self.subTest(name=name):
+                self.assertEqual(canonical_field(name), canonical)
+                self.assertEqual(canonical_field(f'winlog.event_data.{name}'), canonical)
+        self.assertEqual(canonical_field('winlog.event_data.NewProcessName'), 'image')
+        self.assertEqual(canonical_field('Image'), 'image')
+        self.assertEqual(canonical_field('winlog.computer_name'), 'computer')
+        # 対応付けの無い名前は小文字化したそのままの名前になる
+        self.assertEqual(canonical_field('ScriptBlockText'), 'scriptblocktext')
+        self.assertEqual(canonical_field('syslog.hostname'), 'syslog.hostname')
+
+    def test_commandline_falls_back_to_image(self):
+        self.assertEqual(lookup_keys('CommandLine'), ('commandline', 'image'))
+        self.assertEqual(lookup_keys('winlog.event_data.commandline'), ('commandline', 'image'))
+        self.assertEqual(lookup_keys('NewProcessName'), ('image',))
+        self.assertEqual(lookup_keys('ParentCommandLine'), ('parentcommandline',))
+
+
+class NormalizeEventTest(unittest.TestCase):
+
+    def test_nested_winlog_is_flattened_into_canonical_fields(self):
+        self.assertEqual(flatten_dict({'A': {'B': {'C': 1}, 'D': [1, 2]}}), {'a.b.c': 1, 'a.d': [1, 2]})
+        event = normalize_event(_security_4688())
+        self.assertEqual(event.fields, {
+            '@timestamp': '2024-01-01T00:00:00Z',
+            'channel': 'Security',
+            'eventid': 4688,
+            'eventrecordid': 42,
+            'computer': 'HOST-A',
+            'image': 'C:\\Windows\\System32\\WHOAMI.EXE',
+            'parentimage': 'C:\\Windows\\explorer.exe',
+            'processid': '0x1a4',
+            'parentprocessid': '0x10',
+        })
+        self.assertEqual(event.get('missing', 'default'), 'default')
+
+    def test_values_are_case_folded_for_matching_only(self):
+        event = normalize_event({'winlog': {'event_data': {'Image': 'C:\\Tools\\PsExec.EXE', 'Hashes': ['MD5=AB', 'SHA1=CD'],
+                                                           'IntegrityLevel': None}}})
+        self.assertEqual(event.fields['image'], 'C:\\Tools\\PsExec.EXE')
+        self.assertEqual(event.lowered['image'], ['c:\\tools\\psexec.exe'])
+        self.assertEqual(event.lowered['hashes'], ['md5=ab', 'sha1=cd'])
+        self.assertEqual(normalize_event({'EventID': 1}).lowered['eventid'], ['1'])
+        # 値がNoneのフィールドは存在しないものとして扱う
+        self.assertNotIn('integritylevel', event.fields)
+
+    def test_event_data_takes_priority_over_other_sources(self):
+        entry = {'computer': 'top-level', 'winlog': {'computer_name': 'winlog', 'event_data': {'Computer': 'event-data'}}}
+        self.assertEqual(normalize_event(entry).fields['computer'], 'event-data')
+        del entry['winlog']['event_data']
+        self.assertEqual(normalize_event(entry).fields['computer'], 'winlog')
+        # 優先度の高い値がNoneなら次の値を使う
+        entry['winlog']['computer_name'] = None
+        self.assertEqual(normalize_event(entry).fields['computer'], 'top-level')
+
+
+class CommandLineFallbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        _write_rule(self.tmp_dir.name, 'whoami_cmdline.yml',
+                    {'selection': {'CommandLine|contains': 'whoami'}, 'condition': 'selection'})
+        self.analyzer = SigmaAnalyzer([self.tmp_dir.name])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_image_is_used_only_when_commandline_is_missing(self):
+        self.assertEqual(len(self.analyzer.analyze_log_entry(_security_4688())), 1)
+        # コマンドラインが記録されていれば、そちらだけで判定する
+        self.assertEqual(self.analyzer.analyze_log_entry(_security_4688(CommandLine='"C:\\w.exe" /all')), [])
+        self.assertEqual(len(self.analyzer.analyze_log_entry(_security_4688(CommandLine='cmd /c WHOAMI'))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from service.workers.sigma_pool import SigmaProcessPool
+from src.threat_intel.sigma_analyzer import SigmaAnalyzer
+from tests.test_sigma_analyzer import _write_rule
+
+
+def _entries(count=50):
+    entries = []
+    for i in range(count):
+        image = 'C:\\Windows\\whoami.exe' if i % 3 == 0 else 'C:\\Windows\\cmd.exe'
+        command_line = 'powershell -enc AAAA' if i % 5 == 0 else 'cmd /c dir'
+        entries.append({'winlog': {'event_data': {'Image': image, 'CommandLine': command_line}}})
+    return entries
+
+
+def _broken_executor():
+    # 起動直後に終了するワーカーしか持たないプール
+    return ProcessPoolExecutor(max_workers=1, initializer=os._exit, initargs=(1,))
+
+
+class SigmaProcessPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.rule_dir = os.path.join(self.tmp_dir.name, 'rules')
+        os.mkdir(self.rule_dir)
+        _write_rule(self.rule_dir, 'whoami.yml',
+                    {'selection': {'Image|endswith': '\\whoami.exe'}, 'condition': 'selection'})
+        _write_rule(self.rule_dir, 'encoded.yml',
+                    {'selection': {'CommandLine|contains': ' -enc '}, 'condition': 'selection'})
+        self.cache_path = os.path.join(self.tmp_dir.name, 'ruleset.pickle')
+        self.analyzer = SigmaAnalyzer([self.rule_dir], cache_path=self.cache_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_pool_results_match_the_analyzer_in_input_order(self):
+        entries = _entries() + ['not a mapping']
+        expected = self.analyzer.analyze_batch(entries)
+
+        pool = SigmaProcessPool(self.analyzer, processes=2, chunk_size=7)
+        try:
+            self.assertEqual(pool.analyze_batch(entries), expected)
+        finally:
+            pool.shutdown()
+        # ワーカー側で評価した件数も親の索引の集計に加わる
+        self.assertEqual(self.analyzer.get_index_stats()['events'], 100)
+
+    def test_killed_worker_is_replaced_and_the_next_batch_still_matches(self):
+        entries = _entries()
+        expected = self.analyzer.analyze_batch(entries)
+        pool = SigmaProcessPool(self.analyzer, processes=2, chunk_size=7)
+        try:
+            self.assertEqual(pool.analyze_batch(entries), expected)
+            process = next(iter(pool.executor._processes.values()))
+            process.kill()
+            process.join(5)
+            deadline = time.monotonic() + 5
+            while not pool.executor._broken and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            self.assertEqual(pool.analyze_batch(entries), expected)
+            self.assertEqual((pool.restarts, pool.fallbacks), (1, 0))
+        finally:
+            pool.shutdown()
+
+    def test_pool_that_keeps_failing_falls_back_to_the_parent_analyzer(self):
+        entries = _entries()
+        expected = self.analyzer.analyze_batch(entries)
+        pool = SigmaProcessPool(self.analyzer, processes=1)
+        try:
+            pool.executor.shutdown()
+            pool._create_executor = _broken_executor
+            pool.executor = _broken_executor()
+            self.assertEqual(pool.analyze_batch(entries), expected)
+            self.assertEqual((pool.restarts, pool.fallbacks), (1, 1))
+        finally:
+            pool.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
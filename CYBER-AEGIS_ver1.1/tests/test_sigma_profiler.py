@@ -0,0 +1,152 @@
+import json
+import os
+import pickle
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from src.threat_intel.sigma_analyzer import SigmaAnalyzer
+from src.threat_intel.sigma_compiler import CompiledRule
+from src.threat_intel.sigma_profiler import SORT_KEYS, SigmaRuleProfiler
+from tests.test_sigma_analyzer import _write_rule
+
+
+def _profiler(samples):
+    profiler = SigmaRuleProfiler()
+    for rule_id, elapsed_ns, matched in samples:
+        profiler.record(rule_id, elapsed_ns, matched)
+    return profiler
+
+
+class SigmaRuleProfilerTest(unittest.TestCase):
+
+    def test_report_is_sorted_by_each_key(self):
+        profiler = _profiler([
+            # slow: 1回で9ms、マッチなし
+            ('slow', 9_000_000, False),
+            # busy: 4回で計4ms、1回マッチ
+            ('busy', 1_000_000, True), ('busy', 1_000_000, False), ('busy', 1_000_000, False), ('busy', 1_000_000, False),
+            # hit: 3回で計2.7ms、3回ともマッチ
+            ('hit', 600_000, True), ('hit', 1_500_000, True), ('hit', 600_000, True),
+        ])
+        profiler.record('slow', 0, False, ValueError('bad value'))
+        expected = {
+            'total_ms': ['slow', 'busy', 'hit'],
+            'avg_us': ['slow', 'busy', 'hit'],
+            'max_us': ['slow', 'hit', 'busy'],
+            'calls': ['busy', 'hit', 'slow'],
+            'matches': ['hit', 'busy', 'slow'],
+            'hit_rate': ['hit', 'busy', 'slow'],
+            'errors': ['slow', 'busy', 'hit'],
+        }
+        self.assertEqual(set(expected), set(SORT_KEYS))
+        for key, order in expected.items():
+            with self.subTest(sort=key):
+                self.assertEqual([row['rule_id'] for row in profiler.report(sort=key)], order)
+
+        rows = profiler.report({'hit': {'title': 'Hit Rule', 'level': 'high'}}, sort='calls', top=2)
+        self.assertEqual([row['rule_id'] for row in rows], ['busy', 'hit'])
+        self.assertEqual((rows[1]['title'], rows[1]['level'], rows[1]['avg_us'], rows[1]['max_us'], rows[1]['hit_rate']),
+                         ('Hit Rule', 'high', 900.0, 1500.0, 1.0))
+        slow = profiler.report(sort='errors')[0]
+        self.assertEqual((slow['calls'], slow['total_ms'], slow['errors'], slow['last_error']),
+                         (2, 9.0, 1, 'ValueError: bad value'))
+
+    def test_unknown_sort_key_is_rejected(self):
+        with self.assertRaises(ValueError):
+            SigmaRuleProfiler().report(sort='name')
+
+    def test_worker_deltas_are_taken_and_merged(self):
+        worker_a = _profiler([('r1', 100, True), ('r1', 300, False)])
+        worker_a.record('r2', 50, False, RuntimeError('first'))
+        worker_b = _profiler([('r1', 200, True), ('r3', 10, False)])
+        worker_b.record('r2', 70, False, RuntimeError('second'))
+
+        parent = _profiler([('r1', 50, False)])
+        for worker in (worker_a, worker_b):
+            # ワーカーからの差分はプロセス間で受け渡される
+            delta = pickle.loads(pickle.dumps(worker.take()))
+            self.assertEqual(worker.get_stats()['calls'], 0)
+            parent.merge(delta)
+        # ワーカーが次に記録しても、親に加えた集計は変わらない
+        worker_b.record('r3', 999, True)
+
+        rows = {row['rule_id']: row for row in parent.report()}
+        self.assertEqual((rows['r1']['calls'], rows['r1']['matches'], rows['r1']['max_us']), (4, 2, 0.3))
+        self.assertEqual((rows['r2']['calls'], rows['r2']['errors'], rows['r2']['last_error']),
+                         (2, 2, 'RuntimeError: second'))
+        self.assertEqual((rows['r3']['calls'], rows['r3']['matches']), (1, 0))
+        self.assertEqual(parent.get_stats()['calls'], 7)
+
+        parent.reset()
+        self.assertEqual((parent.report(), parent.get_stats()['rules']), ([], 0))
+
+    def test_records_from_another_thread_are_not_lost_while_taking(self):
+        profiler = SigmaRuleProfiler()
+        threads, per_thread = 4, 5000
+
+        def run():
+            for i in range(per_thread):
+                profiler.record(f'r{i % 3}', 1, False)
+
+        workers = [threading.Thread(target=run) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        taken = 0
+        while any(worker.is_alive() for worker in workers):
+            rules, _ = profiler.take()
+            taken += sum(stats[0] for stats in rules.values())
+        for worker in workers:
+            worker.join()
+        self.assertEqual(taken + profiler.get_stats()['calls'], threads * per_thread)
+
+    def test_dump_writes_summary_and_rows(self):
+        profiler = _profiler([('r1', 2_000_000, True)])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'profile', 'rules.json')
+            profiler.dump(path, {'r1': {'title': 'Rule 1'}})
+            with open(path, encoding='utf-8') as f:
+                report = json.load(f)
+            self.assertFalse(os.path.exists(path + '.tmp'))
+        self.assertEqual((report['summary']['calls'], report['summary']['total_ms']), (1, 2.0))
+        self.assertEqual(report['rules'][0]['title'], 'Rule 1')
+
+
+class ProfiledMatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        _write_rule(self.tmp_dir.name, 'whoami.yml',
+                    {'selection': {'Image|endswith': '\\whoami.exe'}, 'condition': 'selection'})
+        _write_rule(self.tmp_dir.name, 'cmd.yml',
+                    {'selection': {'Image|endswith': '\\cmd.exe'}, 'condition': 'selection'})
+        self.analyzer = SigmaAnalyzer([self.tmp_dir.name], profiling=True)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_rule_errors_are_counted_and_do_not_stop_other_rules(self):
+        matches = CompiledRule.matches
+
+        def failing(compiled, ctx):
+            if compiled.rule['title'] == 'cmd.yml':
+                raise RuntimeError('boom')
+            return matches(compiled, ctx)
+
+        entries = [{'winlog': {'event_data': {'Image': 'C:\\Windows\\System32\\whoami.exe'}}},
+                   {'winlog': {'event_data': {'Image': 'C:\\Windows\\System32\\cmd.exe'}}}]
+        with mock.patch.object(CompiledRule, 'matches', failing):
+            results = self.analyzer.analyze_batch(entries)
+        self.assertEqual([[rule['title'] for rule in rules] for rules in results], [['whoami.yml'], []])
+
+        rows = {row['title']: row for row in self.analyzer.get_rule_profile(sort='errors')}
+        self.assertEqual((rows['cmd.yml']['calls'], rows['cmd.yml']['errors'], rows['cmd.yml']['matches']), (2, 2, 0))
+        self.assertEqual(rows['cmd.yml']['last_error'], 'RuntimeError: boom')
+        self.assertEqual((rows['whoami.yml']['calls'], rows['whoami.yml']['errors'], rows['whoami.yml']['matches']),
+                         (2, 0, 1))
+        self.assertEqual(self.analyzer.profiler.get_stats()['errors'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import datetime
+import sqlite3
+import unittest
+
+from service.workers.match_writer import SigmaMatchWriter
+from src.threat_intel.sigma_normalizer import normalize_event
+from src.threat_intel.sigma_suppression import SigmaSuppressor
+from tests.db_support import TempDatabaseMixin
+
+_RULE = {'title': 'Whoami Execution', 'id': 'rule-1', 'level': 'low', 'logsource': {'category': 'process_creation'}}
+_BASE = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _entry(seconds, image='C:\\Windows\\System32\\whoami.exe', computer='host-a'):
+    return {
+        '@timestamp': (_BASE + datetime.timedelta(seconds=seconds)).isoformat(),
+        'winlog': {'computer_name': computer, 'event_data': {'Image': image, 'CommandLine': 'whoami /all'}},
+    }
+
+
+class SigmaSuppressorTest(unittest.TestCase):
+
+    def _observe(self, suppressor, entry, rule=_RULE):
+        return suppressor.observe(rule, normalize_event(entry))
+
+    def test_repeats_within_the_window_are_suppressed(self):
+        suppressor = SigmaSuppressor(window=60)
+        first = self._observe(suppressor, _entry(0))
+        self.assertTrue(first[3])
+        repeat = self._observe(suppressor, _entry(30))
+        self.assertEqual((repeat[0], repeat[1], repeat[3]), (first[0], first[1], False))
+        self.assertEqual(repeat[2] - repeat[1], 30)
+        # ウィンドウを過ぎたら新しいウィンドウとして保存させる
+        later = self._observe(suppressor, _entry(61))
+        self.assertEqual((later[0], later[3]), (first[0], True))
+        self.assertEqual((suppressor.new_keys, suppressor.suppressed), (2, 1))
+
+    def test_key_depends_on_rule_and_fields(self):
+        suppressor = SigmaSuppressor(window=60)
+        keys = {
+            self._observe(suppressor, _entry(0))[0],
+            self._observe(suppressor, _entry(1, computer='host-b'))[0],
+            self._observe(suppressor, _entry(2, image='C:\\tools\\whoami.exe'))[0],
+            self._observe(suppressor, _entry(3), rule=dict(_RULE, id='rule-2'))[0],
+        }
+        self.assertEqual(len(keys), 4)
+        host_only = SigmaSuppressor(window=60, fields=('Computer',))
+        self.assertEqual(self._observe(host_only, _entry(0))[0],
+                         self._observe(host_only, _entry(1, image='C:\\tools\\whoami.exe'))[0])
+
+    def test_keys_are_bounded(self):
+        suppressor = SigmaSuppressor(window=60, max_keys=2)
+        for i in range(5):
+            self._observe(suppressor, _entry(i, computer=f'host-{i}'))
+        stats = suppressor.get_stats()
+        self.assertEqual((stats['active_keys'], stats['evicted']), (2, 3))
+        # 追い出されたキーは次に来たときに新規として扱われる
+        self.assertTrue(self._observe(suppressor, _entry(5, computer='host-0'))[3])
+
+
+class SuppressedMatchWriterTest(TempDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.writer = SigmaMatchWriter(flush_rows=1000, flush_interval_ms=50, verbose=False, max_retries=0,
+                                       suppressor=SigmaSuppressor(window=60))
+
+    def tearDown(self):
+        self.writer.stop()
+        super().tearDown()
+
+    def _rows(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(
+                "SELECT hit_count, first_seen, last_seen FROM sigma_matches ORDER BY id").fetchall()
+        finally:
+            conn.close()
+
+    def test_repeats_collapse_into_one_row_within_and_across_flushes(self):
+        self.writer.write_now([(_entry(0), [_RULE]), (_entry(10), [_RULE]), (_entry(5, computer='host-b'), [_RULE])])
+        self.writer.write_now([(_entry(20), [_RULE]), (_entry(15), [_RULE])])
+        self.writer.write_now([(_entry(90), [_RULE])])
+
+        rows = self._rows()
+        self.assertEqual([row[0] for row in rows], [4, 1, 1])
+        first_seen, last_seen = (datetime.datetime.fromisoformat(v) for v in rows[0][1:])
+        self.assertEqual((last_seen - first_seen).total_seconds(), 20)
+        self.assertEqual(self.writer.get_stats()['suppressed'], 3)
+
+    def test_windows_opened_by_a_dropped_batch_are_forgotten(self):
+        self.writer.write_now([(_entry(0, computer='host-b'), [_RULE])])
+        self.db.conn.execute("ALTER TABLE sigma_matches RENAME TO sigma_matches_moved")
+        self.writer.start()
+        self.writer.submit([(_entry(0), [_RULE]), (_entry(5, computer='host-b'), [_RULE])], source='a.log')
+        self.assertTrue(self.writer.flush(timeout=10))
+        self.assertEqual(self.writer.get_stats()['dropped_entries'], 2)
+        self.db.conn.execute("ALTER TABLE sigma_matches_moved RENAME TO sigma_matches")
+
+        # 保存されなかったhost-aのウィンドウは新しい行になり、保存済みのhost-bの行は引き続き集約される
+        self.writer.submit([(_entry(10), [_RULE]), (_entry(20), [_RULE]), (_entry(30, computer='host-b'), [_RULE])],
+                           source='b.log')
+        self.assertTrue(self.writer.flush(timeout=10))
+        self.assertEqual([row[0] for row in self._rows()], [2, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
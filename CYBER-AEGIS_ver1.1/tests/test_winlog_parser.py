@@ -0,0 +1,64 @@
+import unittest
+
+from src.threat_intel.winlog_parser import parse_event_xml
+
+_EVENT = """<Event xmlns="http://schemas.microsoft.com/win/2004/08/events/event">
+  <System>
+    <Provider Name="Microsoft-Windows-Security-Auditing" Guid="{54849625-5478-4994-a5ba-3e3b0328c30d}"/>
+    <EventID>{event_id}</EventID>
+    <TimeCreated SystemTime="2024-01-01T00:00:00.000000Z"/>
+    <EventRecordID>42</EventRecordID>
+    <Channel>Security</Channel>
+  </System>
+  {body}
+</Event>"""
+
+
+def _xml(body='', event_id='4688'):
+    return _EVENT.replace('{event_id}', event_id).replace('{body}', body)
+
+
+class ParseEventXmlTest(unittest.TestCase):
+
+    def test_event_data_is_keyed_by_data_name(self):
+        event = parse_event_xml(_xml(
+            '<EventData><Data Name="NewProcessName">C:\\Windows\\System32\\whoami.exe</Data>'
+            '<Data Name="CommandLine">whoami /all</Data><Data Name="Empty"/><Data>unnamed</Data></EventData>'))
+        self.assertEqual(event['@timestamp'], '2024-01-01T00:00:00.000000Z')
+        self.assertEqual(event['winlog'], {
+            'channel': 'Security',
+            'provider_name': 'Microsoft-Windows-Security-Auditing',
+            'event_id': 4688,
+            'record_id': 42,
+            'event_data': {'NewProcessName': 'C:\\Windows\\System32\\whoami.exe', 'CommandLine': 'whoami /all',
+                           'Empty': None},
+        })
+
+    def test_user_data_elements_are_flattened_by_local_name(self):
+        event = parse_event_xml(_xml(
+            '<UserData><LogFileCleared xmlns="http://manifests.microsoft.com/win/2004/08/windows/eventlog">'
+            '<SubjectUserName>admin</SubjectUserName><SubjectDomainName>CORP</SubjectDomainName>'
+            '</LogFileCleared></UserData>', event_id='1102'))
+        self.assertEqual(event['winlog']['event_id'], 1102)
+        # 要素の入れ子は保たず、UserData自身を含む全要素を名前空間を除いた名前で並べる
+        self.assertEqual(event['winlog']['event_data'], {'UserData': None, 'LogFileCleared': None,
+                                                         'SubjectUserName': 'admin', 'SubjectDomainName': 'CORP'})
+
+    def test_channel_argument_overrides_the_xml_channel(self):
+        self.assertEqual(parse_event_xml(_xml(), channel='Live')['winlog']['channel'], 'Live')
+        no_channel = _xml().replace('<Channel>Security</Channel>', '')
+        self.assertIsNone(parse_event_xml(no_channel)['winlog']['channel'])
+
+    def test_missing_optional_and_required_fields(self):
+        event = parse_event_xml(_xml().replace('<TimeCreated SystemTime="2024-01-01T00:00:00.000000Z"/>', ''))
+        self.assertIsNone(event['@timestamp'])
+        self.assertEqual(event['winlog']['event_data'], {})
+        # EventIDやEventRecordIDが無いもの、名前空間の異なるもの、壊れたXMLは変換しない
+        self.assertIsNone(parse_event_xml(_xml().replace('<EventRecordID>42</EventRecordID>', '')))
+        self.assertIsNone(parse_event_xml(_xml(event_id='not a number')))
+        self.assertIsNone(parse_event_xml(_xml().replace(' xmlns="http://schemas.microsoft.com/win/2004/08/events/event"', '')))
+        self.assertIsNone(parse_event_xml('<Event><System>'))
+
+
+if __name__ == '__main__':
+    unittest.main()